@@ -1,9 +1,10 @@
 from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
 from django.urls import reverse
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 
-from .models import Category, Question, Tag, AttachedFile, Task, TaskNote, SearchQuery
+from .models import Category, Question, Tag, AttachedFile, Task, TaskNote, SearchQuery, SearchTermDaily, StatCounter
+from .visitors import daily_unique_visitors
 
 
 # ----------------------------
@@ -99,15 +100,15 @@ class TagAdmin(admin.ModelAdmin):
 class QuestionAdmin(admin.ModelAdmin):
     list_display = (
         'title', 'category', 'author', 'created_at',
-        'is_published', 'has_answer', 'views'
+        'is_published', 'is_answered', 'word_count', 'views', 'unique_visitors'
     )
     list_filter = (
-        'is_published', 'category', 'created_at', 'tags',
+        'is_published', 'is_answered', 'category', 'created_at', 'tags',
         'author'
     )
     search_fields = ('title', 'content', 'answer', 'tags__name', 'author__username')
     list_editable = ('is_published',)
-    readonly_fields = ('created_at', 'updated_at', 'views')
+    readonly_fields = ('created_at', 'updated_at', 'answered_at', 'views', 'unique_visitors', 'visitors_by_day')
     filter_horizontal = ('tags',)
     inlines = [AttachedFileInline]
     ordering = ('-created_at',)
@@ -120,19 +121,22 @@ class QuestionAdmin(admin.ModelAdmin):
             'fields': ('title', 'content', 'category', 'tags')
         }),
         ('Ответ', {
-            'fields': ('answer',),
+            'fields': ('answer', 'answered_at'),
             'classes': ('collapse',)
         }),
         ('Метаданные', {
-            'fields': ('author', 'is_published', 'views', 'created_at', 'updated_at'),
+            'fields': ('author', 'is_published', 'views', 'unique_visitors', 'visitors_by_day', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
-    def has_answer(self, obj):
-        return bool(obj.answer and obj.answer.strip())
-    has_answer.boolean = True
-    has_answer.short_description = "Есть ответ"
+    def visitors_by_day(self, obj):
+        # Оценки HyperLogLog по дням за неделю (qa_app.visitors)
+        days = daily_unique_visitors(obj.pk, days=7) if obj.pk else []
+        if not days:
+            return "-"
+        return format_html_join(', ', '{}: {}', ((day.strftime('%d.%m'), count) for day, count in days))
+    visitors_by_day.short_description = "Уникальные посетители по дням"
 
 
 # ----------------------------
@@ -191,7 +195,7 @@ class TaskAdmin(admin.ModelAdmin):
 
 @admin.register(TaskNote)
 class TaskNoteAdmin(admin.ModelAdmin):
-    list_display = ('task', 'title_preview', 'author', 'created_at', 'order')
+    list_display = ('task', 'title_preview', 'author', 'created_at', 'word_count', 'order')
     list_filter = ('task', 'author', 'created_at')
     search_fields = ('content', 'title', 'task__title')
     readonly_fields = ('created_at', 'updated_at', 'author')
@@ -265,4 +269,19 @@ class SearchQueryAdmin(admin.ModelAdmin):
     list_display = ['term', 'user', 'ip_address', 'created_at']
     list_filter = ['created_at', 'user']
     search_fields = ['term', 'ip_address']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+
+
+@admin.register(SearchTermDaily)
+class SearchTermDailyAdmin(admin.ModelAdmin):
+    list_display = ['term', 'date', 'count']
+    list_filter = ['date']
+    search_fields = ['term']
+    date_hierarchy = 'date'
+
+
+@admin.register(StatCounter)
+class StatCounterAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'object_id', 'value']
+    list_filter = ['kind']
+    readonly_fields = ['kind', 'object_id', 'value']
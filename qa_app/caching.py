@@ -0,0 +1,107 @@
+"""
+Кэширование дорогих вычислений без "лавины" (cache stampede).
+
+get_or_compute(key, compute, timeout) хранит значение в конверте
+{'value', 'delta', 'expires', 'version'} и защищает его тремя способами:
+
+- single-flight: пересчитывает только процесс, захвативший блокировку
+  (cache.add ключа key + ':lock'), остальные не дублируют работу;
+- вероятностное раннее обновление (XFetch): незадолго до истечения TTL
+  значение пересчитывается с вероятностью, растущей по мере приближения
+  к сроку и пропорциональной времени вычисления delta;
+- stale-while-revalidate: истёкшее (или устаревшее по версии) значение
+  хранится ещё STALE_GRACE секунд и отдаётся, пока его пересчитывает
+  владелец блокировки.
+
+Если значения нет совсем, запросы без блокировки недолго ждут результат
+владельца и только потом считают сами.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+
+STALE_GRACE = 60 * 10  # сколько хранить значение после истечения TTL
+LOCK_TIMEOUT = 30  # блокировка снимается сама, если владелец упал
+WAIT_TIMEOUT = 2.0  # сколько ждать чужого пересчёта при пустом кэше
+WAIT_STEP = 0.05
+BETA = 1.0  # > 1 — обновлять раньше, < 1 — позже
+
+_MISSING = object()
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def _store(key, compute, timeout, version):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    envelope = {
+        'value': value,
+        'delta': delta,
+        'expires': time.time() + timeout,
+        'version': version,
+    }
+    cache.set(key, envelope, timeout + STALE_GRACE)
+    return value
+
+
+def should_refresh(envelope, version, beta=BETA):
+    """Пора ли пересчитать значение из конверта (другая версия или XFetch)."""
+    if envelope['version'] != version:
+        return True
+    # XFetch: now - delta * beta * ln(rand) >= expires
+    return time.time() - envelope['delta'] * beta * math.log(random.random() or 1e-12) >= envelope['expires']
+
+
+def get_or_compute(key, compute, timeout, version=None, beta=BETA):
+    """
+    Значение из кэша по key или результат compute() (см. описание модуля).
+    version — текущая версия данных: значение другой версии считается
+    устаревшим, но отдаётся, пока его пересчитывает другой запрос.
+    """
+    envelope = cache.get(key)
+    if envelope is not None and not should_refresh(envelope, version, beta):
+        return envelope['value']
+
+    if cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+        try:
+            return _store(key, compute, timeout, version)
+        finally:
+            cache.delete(lock_key(key))
+
+    if envelope is not None:
+        # Пересчитывает другой запрос — отдаём то, что есть
+        return envelope['value']
+
+    value = _wait_for(key, version)
+    if value is not _MISSING:
+        return value
+    # Владелец блокировки не успел (или упал) — считаем сами
+    return _store(key, compute, timeout, version)
+
+
+def refresh(key, compute, timeout, version=None):
+    """Пересчитывает и сохраняет значение сразу, не дожидаясь истечения TTL."""
+    return _store(key, compute, timeout, version)
+
+
+def _wait_for(key, version):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        locked = cache.get(lock_key(key)) is not None
+        envelope = cache.get(key)
+        if envelope is not None and envelope['version'] == version:
+            return envelope['value']
+        if not locked:
+            break
+    return _MISSING
+
+
+def invalidate(*keys):
+    cache.delete_many(list(keys))
@@ -0,0 +1,76 @@
+"""
+Условные GET-запросы (ETag) для страниц вопросов и задач.
+
+Представление сначала считает валидаторы — один дешёвый запрос (максимум
+updated_at показываемых объектов) и версии из кэша: версию сайдбара и
+версии суррогатных ключей страницы (qa_app.pagecache), которые сигналы
+увеличивают при изменении связанных задач, записей, файлов и похожих
+вопросов. Если клиент прислал совпадающий If-None-Match, ответ 304
+отдаётся без построения контекста и рендеринга шаблона.
+
+Last-Modified не отправляется: изменения, которые учитывают только версии
+(записи и файлы задач, похожие вопросы, сайдбар), не сдвигают updated_at,
+и по If-Modified-Since клиент получал бы устаревшую страницу.
+
+ETag слабый (W/"..."): HTML может отличаться CSRF-токеном, но страница
+та же. В него входит и пользователь — у вошедших и сотрудников страницы
+разные. Если у посетителя есть непоказанные сообщения, проверка не
+выполняется: 304 их бы потерял.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .pagecache import SIDEBAR_KEY, key_namespace
+from .versioning import get_version
+
+
+def latest(*values):
+    """Максимум из дат, пропуская None."""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def make_etag(request, last_modified, keys):
+    user = request.user
+    parts = [
+        f'user:{user.pk if user.is_authenticated else 0}:{int(user.is_staff)}',
+        last_modified.isoformat() if last_modified else '',
+        *(f'{key}={get_version(key_namespace(key))}' for key in sorted(set(keys) | {SIDEBAR_KEY})),
+    ]
+    return 'W/' + quote_etag(hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 на условный GET до построения контекста.
+
+    get_validators() возвращает (last_modified, keys) — дату последнего
+    изменения показываемых объектов и суррогатные ключи страницы — или None,
+    если объекта нет (тогда представление отработает как обычно, например 404).
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def not_modified(self, request):
+        """Вызывается перед ответом 304 (например, чтобы засчитать просмотр)."""
+
+    def get(self, request, *args, **kwargs):
+        validators = None if len(get_messages(request)) else self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        last_modified, keys = validators
+        etag = make_etag(request, last_modified, keys)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            self.not_modified(request)
+            return response
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
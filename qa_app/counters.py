@@ -0,0 +1,199 @@
+"""
+Счётчики опубликованных вопросов для сайдбара и главной страницы.
+
+Вместо COUNT(*) по вопросам и обхода всех вопросов с тегами на каждый
+промах кэша счётчики хранятся в таблице StatCounter и меняются на +-1
+сигналами Question (save/delete) и Question.tags (m2m_changed), см.
+qa_app.signals. Вклад вопроса в счётчики:
+
+    total                — опубликован;
+    answered             — опубликован и answer не пустой;
+    category:<id>        — опубликован и относится к категории;
+    tag:<id>             — опубликован и помечен тегом.
+
+При расхождениях (массовые update() в обход сигналов, ручные правки в БД)
+счётчики пересчитываются командой `manage.py recount`.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .versioning import SIDEBAR_COUNTERS, bump_sidebar
+
+
+KIND_TOTAL = 'total'
+KIND_ANSWERED = 'answered'
+KIND_CATEGORY = 'category'
+KIND_TAG = 'tag'
+
+# Поля вопроса, от которых зависят счётчики
+COUNTED_FIELDS = {'is_published', 'answer', 'is_answered', 'category'}
+
+
+# ----------------------------
+# Состояние вопроса и его вклад
+# ----------------------------
+
+def question_state(question):
+    """(опубликован, есть ответ, id категории) для объекта Question."""
+    return question.is_published, question.is_answered, question.category_id
+
+
+def stored_question_state(pk):
+    """То же, но по строке в БД (без загрузки текста ответа)."""
+    from .models import Question
+
+    row = (
+        Question.objects.filter(pk=pk)
+        .values_list('is_published', 'is_answered', 'category_id')
+        .first()
+    )
+    return tuple(row) if row else None
+
+
+def contribution(state, tag_ids=()):
+    """Вклад вопроса с состоянием state в счётчики: Counter {(kind, object_id): 1}."""
+    deltas = Counter()
+    if state is None:
+        return deltas
+    published, answered, category_id = state
+    if not published:
+        return deltas
+    deltas[(KIND_TOTAL, 0)] += 1
+    if answered:
+        deltas[(KIND_ANSWERED, 0)] += 1
+    if category_id:
+        deltas[(KIND_CATEGORY, category_id)] += 1
+    for tag_id in tag_ids:
+        deltas[(KIND_TAG, tag_id)] += 1
+    return deltas
+
+
+def state_deltas(old_state, new_state, tag_ids=()):
+    """Изменения счётчиков при переходе вопроса из old_state в new_state."""
+    deltas = Counter(contribution(new_state, tag_ids))
+    deltas.subtract(contribution(old_state, tag_ids))
+    return deltas
+
+
+# ----------------------------
+# Запись
+# ----------------------------
+
+def apply_deltas(deltas):
+    """Прибавляет deltas {(kind, object_id): n} к счётчикам в одной транзакции."""
+    from .models import StatCounter
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (kind, object_id), delta in sorted(deltas.items()):
+            rows = StatCounter.objects.filter(kind=kind, object_id=object_id).update(value=F('value') + delta)
+            if rows:
+                continue
+            try:
+                with transaction.atomic():
+                    StatCounter.objects.create(kind=kind, object_id=object_id, value=delta)
+            except IntegrityError:
+                # Строку успел создать другой процесс
+                StatCounter.objects.filter(kind=kind, object_id=object_id).update(value=F('value') + delta)
+    # Блоки и фрагменты сайдбара, построенные по старым значениям, больше не читаются
+    transaction.on_commit(lambda: bump_sidebar(SIDEBAR_COUNTERS))
+
+
+def tag_deltas(tag_ids, sign):
+    return Counter({(KIND_TAG, tag_id): sign for tag_id in tag_ids})
+
+
+def drop(kind, object_id):
+    """Удаляет счётчик удалённой категории или тега."""
+    from .models import StatCounter
+
+    StatCounter.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+# ----------------------------
+# Чтение
+# ----------------------------
+
+def question_totals():
+    """{'total': ..., 'answered': ..., 'unanswered': ...} по опубликованным вопросам."""
+    from .models import StatCounter
+
+    values = dict(
+        StatCounter.objects.filter(kind__in=(KIND_TOTAL, KIND_ANSWERED), object_id=0)
+        .values_list('kind', 'value')
+    )
+    total = values.get(KIND_TOTAL, 0)
+    answered = values.get(KIND_ANSWERED, 0)
+    return {'total': total, 'answered': answered, 'unanswered': total - answered}
+
+
+def categories_with_counts():
+    """Категории по имени с атрибутом question_count."""
+    from .models import Category, StatCounter
+
+    counts = dict(StatCounter.objects.filter(kind=KIND_CATEGORY).values_list('object_id', 'value'))
+    categories = list(Category.objects.order_by('name'))
+    for category in categories:
+        category.question_count = counts.get(category.pk, 0)
+    return categories
+
+
+def popular_tags(limit=10):
+    """Топ тегов по числу опубликованных вопросов: [{'name': ..., 'count': ...}]."""
+    from .models import StatCounter, Tag
+
+    top = list(
+        StatCounter.objects.filter(kind=KIND_TAG, value__gt=0)
+        .order_by('-value', 'object_id')
+        .values_list('object_id', 'value')[:limit]
+    )
+    tags = Tag.objects.in_bulk([tag_id for tag_id, _ in top])
+    return [{'name': tags[tag_id].name, 'count': value} for tag_id, value in top if tag_id in tags]
+
+
+# ----------------------------
+# Полный пересчёт
+# ----------------------------
+
+def compute_all():
+    """Считает все счётчики заново по таблицам вопросов: {(kind, object_id): value}."""
+    from .models import Question
+
+    published = Question.objects.filter(is_published=True)
+    values = {
+        (KIND_TOTAL, 0): published.count(),
+        (KIND_ANSWERED, 0): published.filter(is_answered=True).count(),
+    }
+    for row in published.filter(category__isnull=False).values('category_id').annotate(n=Count('id')).order_by():
+        values[(KIND_CATEGORY, row['category_id'])] = row['n']
+    tag_rows = (
+        Question.tags.through.objects.filter(question__is_published=True)
+        .values('tag_id').annotate(n=Count('id')).order_by()
+    )
+    for row in tag_rows:
+        values[(KIND_TAG, row['tag_id'])] = row['n']
+    return values
+
+
+def recount():
+    """Перезаписывает таблицу счётчиков; возвращает число исправленных счётчиков."""
+    from .models import StatCounter
+
+    with transaction.atomic():
+        values = compute_all()
+        current = {
+            (kind, object_id): value
+            for kind, object_id, value in StatCounter.objects.select_for_update().values_list('kind', 'object_id', 'value')
+        }
+        fixed = sum(1 for key in values.keys() | current.keys() if values.get(key, 0) != current.get(key, 0))
+        StatCounter.objects.all().delete()
+        StatCounter.objects.bulk_create(
+            [StatCounter(kind=kind, object_id=object_id, value=value) for (kind, object_id), value in values.items()],
+            batch_size=1000,
+        )
+    bump_sidebar(SIDEBAR_COUNTERS)
+    return fixed
@@ -0,0 +1,117 @@
+"""
+Подсчёт строк для пагинации и счётчиков списков на больших таблицах.
+
+count(queryset) возвращает CountResult — int с флагом is_exact:
+
+- сначала COUNT по выборке с LIMIT EXACT_THRESHOLD + 1: его стоимость
+  ограничена порогом, и для небольших выборок число точное;
+- если строк больше порога — на PostgreSQL оценка планировщика
+  (EXPLAIN, 'Plan Rows'), иначе (или при STRATEGY = 'cached') — точный
+  COUNT из кэша. Истёкшее значение отдаётся сразу, а пересчитывается
+  в фоновом потоке, одном на запрос (блокировка как в qa_app.caching).
+
+В шаблонах приблизительные числа выводятся фильтром approx_count ("≈ 12000").
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+from .caching import LOCK_TIMEOUT, STALE_GRACE, lock_key
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'EXACT_THRESHOLD': 1000,
+    'STRATEGY': 'estimate',  # 'estimate' (только PostgreSQL) или 'cached'
+    'CACHE_TIMEOUT': 60 * 5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'QA_COUNTS', {}).get(name, DEFAULTS[name])
+
+
+class CountResult(int):
+    """Число строк; is_exact = False для оценки или значения из кэша."""
+
+    def __new__(cls, value, is_exact=True):
+        result = super().__new__(cls, value)
+        result.is_exact = is_exact
+        return result
+
+
+def count(queryset):
+    queryset = queryset.order_by()
+    threshold = get_setting('EXACT_THRESHOLD')
+    bounded = queryset[:threshold + 1].count()
+    if bounded <= threshold:
+        return CountResult(bounded)
+
+    if get_setting('STRATEGY') == 'estimate' and connections[queryset.db].vendor == 'postgresql':
+        estimate = planner_estimate(queryset)
+        if estimate is not None:
+            # Строк точно больше порога, даже если планировщик считает иначе
+            return CountResult(max(estimate, threshold + 1), is_exact=False)
+    return cached_count(queryset)
+
+
+# ----------------------------
+# Оценка планировщика (PostgreSQL)
+# ----------------------------
+
+def planner_estimate(queryset):
+    sql, params = queryset.query.sql_with_params()
+    try:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+    except DatabaseError as e:
+        logger.warning('Counts: EXPLAIN не выполнен (%s)', e)
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# ----------------------------
+# Точный COUNT из кэша с фоновым обновлением
+# ----------------------------
+
+def count_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{queryset.db}:{sql}:{params!r}'.encode('utf-8')).hexdigest()
+    return f'qa:count:{digest}'
+
+
+def _store(queryset, key):
+    value = queryset.count()
+    timeout = get_setting('CACHE_TIMEOUT')
+    cache.set(key, {'value': value, 'expires': time.time() + timeout}, timeout + STALE_GRACE)
+    return value
+
+
+def _refresh(queryset, key):
+    try:
+        _store(queryset, key)
+    except DatabaseError as e:
+        logger.warning('Counts: фоновый пересчёт не удался (%s)', e)
+    finally:
+        cache.delete(lock_key(key))
+        connections[queryset.db].close()
+
+
+def cached_count(queryset):
+    key = count_key(queryset)
+    entry = cache.get(key)
+    if entry is None:
+        return CountResult(_store(queryset, key))
+    if entry['expires'] <= time.time() and cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+        threading.Thread(target=_refresh, args=(queryset.all(), key), name='count-refresh', daemon=True).start()
+    return CountResult(entry['value'], is_exact=False)
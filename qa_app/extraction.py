@@ -0,0 +1,180 @@
+"""
+Извлечение текста из прикреплённых файлов для поиска (search_in='files').
+
+Текст извлекается в пуле потоков сразу после загрузки файла (после
+коммита транзакции), нормализуется (пробелы схлопываются, длина
+ограничена MAX_TEXT_LENGTH) и сохраняется в AttachedFile.extracted_text.
+При поиске читается только этот текст — файлы на диске не трогаются.
+
+Поддерживаются .txt, .docx и .xlsx (стандартная библиотека) и .pdf
+(пакет pypdf из requirements.txt; без него PDF пропускаются с записью в лог).
+Части архивов .docx/.xlsx больше MAX_MEMBER_SIZE не распаковываются:
+размер проверяется по заголовку до чтения и ещё раз при распаковке.
+"""
+import codecs
+import logging
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+MAX_TEXT_LENGTH = 100_000
+MAX_MEMBER_SIZE = 20 * 1024 * 1024  # распакованный XML внутри .docx/.xlsx
+WHITESPACE_RE = re.compile(r'\s+')
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+# ----------------------------
+# Извлечение по типам файлов
+# ----------------------------
+
+def read_member(archive, name):
+    """Читает файл из zip-архива, отказываясь распаковывать больше MAX_MEMBER_SIZE."""
+    info = archive.getinfo(name)
+    if info.file_size > MAX_MEMBER_SIZE:
+        raise ValueError(f'{name}: {info.file_size} байт после распаковки')
+    # Заголовок может врать — читаем не больше лимита
+    with archive.open(info) as member:
+        data = member.read(MAX_MEMBER_SIZE + 1)
+    if len(data) > MAX_MEMBER_SIZE:
+        raise ValueError(f'{name}: больше {MAX_MEMBER_SIZE} байт после распаковки')
+    return data
+
+
+def extract_txt(fileobj):
+    data = fileobj.read(MAX_TEXT_LENGTH * 4)
+    try:
+        # final=False: символ, разрезанный границей чтения, отбрасывается, а не считается ошибкой
+        return codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+    except UnicodeDecodeError:
+        pass
+    try:
+        return data.decode('cp1251')
+    except UnicodeDecodeError:
+        return data.decode('utf-8', errors='ignore')
+
+
+def extract_docx(fileobj):
+    with zipfile.ZipFile(fileobj) as archive:
+        root = ElementTree.fromstring(read_member(archive, 'word/document.xml'))
+    paragraphs = []
+    for paragraph in root.iter(f'{WORD_NS}p'):
+        paragraphs.append(''.join(node.text or '' for node in paragraph.iter(f'{WORD_NS}t')))
+    return '\n'.join(paragraphs)
+
+
+def extract_xlsx(fileobj):
+    parts = []
+    with zipfile.ZipFile(fileobj) as archive:
+        names = archive.namelist()
+        if 'xl/sharedStrings.xml' in names:
+            root = ElementTree.fromstring(read_member(archive, 'xl/sharedStrings.xml'))
+            for item in root.iter(f'{SHEET_NS}si'):
+                parts.append(''.join(node.text or '' for node in item.iter(f'{SHEET_NS}t')))
+        # Строки, записанные прямо в ячейках (inlineStr)
+        for name in names:
+            if name.startswith('xl/worksheets/') and name.endswith('.xml'):
+                root = ElementTree.fromstring(read_member(archive, name))
+                for cell in root.iter(f'{SHEET_NS}is'):
+                    parts.append(''.join(node.text or '' for node in cell.iter(f'{SHEET_NS}t')))
+    return '\n'.join(parts)
+
+
+def extract_pdf(fileobj):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.info('pypdf не установлен, текст из PDF не извлекается')
+        return ''
+    reader = PdfReader(fileobj)
+    parts = []
+    length = 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_TEXT_LENGTH:
+            break
+    return '\n'.join(parts)
+
+
+EXTRACTORS = {
+    '.txt': extract_txt,
+    '.docx': extract_docx,
+    '.xlsx': extract_xlsx,
+    '.pdf': extract_pdf,
+}
+
+
+def normalize_text(text):
+    return WHITESPACE_RE.sub(' ', text).strip()[:MAX_TEXT_LENGTH]
+
+
+def extract_text(field_file):
+    """Извлекает текст из FieldFile; для неподдерживаемых типов — пустая строка."""
+    extractor = EXTRACTORS.get(Path(field_file.name).suffix.lower())
+    if extractor is None:
+        return ''
+    try:
+        with field_file.open('rb') as fileobj:
+            return normalize_text(extractor(fileobj))
+    except Exception as e:
+        logger.warning('Не удалось извлечь текст из %s: %s', field_file.name, e)
+        return ''
+
+
+# ----------------------------
+# Пул обработчиков
+# ----------------------------
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'QA_EXTRACTION_WORKERS', 2),
+            thread_name_prefix='attachment-extract',
+        )
+    return _executor
+
+
+def process_attachment(file_id):
+    """Извлекает и сохраняет текст файла, обновляет индекс файлов."""
+    from .models import AttachedFile
+    from .search import publish_changes
+
+    try:
+        attached_file = AttachedFile.objects.select_related('content_type').get(pk=file_id)
+    except AttachedFile.DoesNotExist:
+        return
+    text = extract_text(attached_file.file) if attached_file.file else ''
+    extracted_at = timezone.now()
+    AttachedFile.objects.filter(pk=file_id).update(extracted_text=text, text_extracted_at=extracted_at)
+    # Индексы файлов процессов дочитают текст по журналу изменений
+    publish_changes(file_ids=[file_id])
+
+
+def _run(file_id):
+    try:
+        process_attachment(file_id)
+    except Exception:
+        logger.exception('Attachment extraction failed for file %s', file_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_extraction(file_id):
+    """Ставит извлечение текста в пул после коммита текущей транзакции."""
+    transaction.on_commit(lambda: get_executor().submit(_run, file_id))
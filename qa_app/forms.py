@@ -191,7 +191,7 @@ class SearchForm(forms.Form):
             ('content', 'В описании'),
             ('answer', 'В ответе'),
             ('tags', 'В тегах'),
-            ('files', 'В названиях файлов'),
+            ('files', 'В файлах'),
         ],
         widget=forms.Select(attrs={'class': 'form-control'}),
         required=False
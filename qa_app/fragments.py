@@ -0,0 +1,93 @@
+"""
+Кэш отрисованных фрагментов шаблонов (сайдбар, блоки категорий и тегов).
+
+Фрагмент — результат рендеринга include-шаблона. Ключ включает имя шаблона
+и значения, от которых зависит разметка (например, slug текущей категории),
+а вместе с HTML хранится версия SIDEBAR (её увеличивают сигналы при
+изменении категорий, тегов, вопросов и задач). При попадании готовый HTML
+отдаётся без рендеринга; устаревший фрагмент перерисовывает один запрос
+(qa_app.caching), остальные пока получают прежний HTML.
+
+Для каждого фрагмента считаются попадания, промахи и суммарное время
+рендеринга (см. fragment_stats() и `manage.py fragment_cache_stats`).
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from .caching import get_or_compute
+from .versioning import SIDEBAR, get_version
+
+
+# Устаревший по данным фрагмент сбрасывает не TTL, а версия SIDEBAR: HTML другой
+# версии перерисовывается при первом же обращении (qa_app.caching). TTL ограничивает
+# только давность того, что версией не отслеживается, — популярных запросов.
+FRAGMENT_TIMEOUT = 60 * 5
+STATS_KEY = 'qa:fragment_stats'
+STAT_NAMES = ('hits', 'misses', 'render_us')
+
+
+def fragment_key(name, vary_on=()):
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode('utf-8')).hexdigest()
+    return f'qa:fragment:{name}:{digest}'
+
+
+def _stat_key(name, stat):
+    return f'{STATS_KEY}:{name}:{stat}'
+
+
+def _count(key, value=1):
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+def _register(name):
+    names = cache.get(STATS_KEY) or set()
+    if name not in names:
+        cache.set(STATS_KEY, names | {name}, timeout=None)
+
+
+def cached_fragment(name, vary_on, render, timeout=FRAGMENT_TIMEOUT):
+    """Возвращает HTML фрагмента из кэша или вызывает render() и кэширует результат."""
+    rendered = False
+
+    def compute():
+        nonlocal rendered
+        started = time.perf_counter()
+        html = render()
+        elapsed_us = int((time.perf_counter() - started) * 1_000_000)
+        rendered = True
+        _register(name)
+        _count(_stat_key(name, 'misses'))
+        _count(_stat_key(name, 'render_us'), elapsed_us)
+        return html
+
+    html = get_or_compute(fragment_key(name, vary_on), compute, timeout, version=get_version(SIDEBAR))
+    if not rendered:
+        _count(_stat_key(name, 'hits'))
+    return html
+
+
+def fragment_stats():
+    """{имя фрагмента: {'hits', 'misses', 'hit_ratio', 'avg_render_ms'}}."""
+    stats = {}
+    for name in sorted(cache.get(STATS_KEY) or ()):
+        values = cache.get_many([_stat_key(name, stat) for stat in STAT_NAMES])
+        hits, misses, render_us = (values.get(_stat_key(name, stat)) or 0 for stat in STAT_NAMES)
+        total = hits + misses
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+            'avg_render_ms': render_us / misses / 1000 if misses else 0.0,
+        }
+    return stats
+
+
+def reset_fragment_stats():
+    names = cache.get(STATS_KEY) or ()
+    cache.delete_many([_stat_key(name, stat) for name in names for stat in STAT_NAMES] + [STATS_KEY])
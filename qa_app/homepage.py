@@ -0,0 +1,98 @@
+"""
+Готовые данные главной страницы (read model).
+
+Все блоки главной — последние вопросы, популярные вопросы с ответами,
+последние задачи с числом записей и файлов, счётчики — собираются
+build_snapshot() в один словарь из простых значений и хранятся в общем
+кэше одним ключом. Снимок помечен версиями данных, от которых зависит:
+SIDEBAR и версиями ключей страниц 'questions' и 'tasks' (qa_app.pagecache),
+которые сигналы увеличивают при изменении вопросов, задач, записей и
+файлов. Поэтому get_snapshot() на прогретом кэше — один cache.get_many()
+(снимок и версии), без запросов к БД.
+
+Устаревший снимок пересобирает один процесс (qa_app.caching), остальные
+отдают предыдущий. `manage.py rebuild_home` пересобирает его сразу — например,
+по cron, чтобы после истечения TTL первый посетитель не ждал пересборки.
+"""
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import caching, counters
+from .pagecache import key_namespace
+from .versioning import SIDEBAR, get_version, version_key
+
+
+SNAPSHOT_KEY = 'qa:home:snapshot'
+SNAPSHOT_TIMEOUT = 60 * 5
+RECENT_QUESTIONS = 6
+ANSWERED_QUESTIONS = 6
+RECENT_TASKS = 5
+
+# Пространства версий, при изменении которых снимок пересобирается
+VERSION_NAMESPACES = (SIDEBAR, key_namespace('questions'), key_namespace('tasks'))
+
+
+def current_version():
+    return tuple(get_version(namespace) for namespace in VERSION_NAMESPACES)
+
+
+# ----------------------------
+# Сборка
+# ----------------------------
+
+def build_snapshot():
+    from django.contrib.contenttypes.models import ContentType
+    from .models import AttachedFile, Category, Question, Task, TaskNote
+
+    published = Question.objects.filter(is_published=True)
+    recent_questions = published.order_by('-created_at').values(
+        'pk', 'title', 'created_at', 'views', 'is_answered'
+    )[:RECENT_QUESTIONS]
+    # Популярные сейчас отвеченные вопросы (индекс qa_app_question_ans_trending)
+    answered_questions = published.filter(is_answered=True).order_by('-trending_score', '-id').values(
+        'pk', 'title', 'answered_at', 'updated_at', 'views'
+    )[:ANSWERED_QUESTIONS]
+    # Число записей и файлов — коррелированные подзапросы (как в TaskListView),
+    # а не JOIN двух таблиц с COUNT(DISTINCT) по всем задачам
+    notes = TaskNote.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    files = AttachedFile.objects.filter(
+        content_type=ContentType.objects.get_for_model(Task), object_id=OuterRef('pk')
+    ).order_by().values('object_id')
+    recent_tasks = Task.objects.order_by('-created_at').values(
+        'pk', 'title', 'created_at', 'author__username'
+    ).annotate(
+        notes=Coalesce(Subquery(notes.annotate(n=Count('pk')).values('n')), 0),
+        files=Coalesce(Subquery(files.annotate(n=Count('pk')).values('n')), 0),
+    )[:RECENT_TASKS]
+    totals = counters.question_totals()
+
+    return {
+        'recent_questions': list(recent_questions),
+        'answered_questions': list(answered_questions),
+        'recent_tasks': list(recent_tasks),
+        'question_count': totals['total'],
+        'answered_count': totals['answered'],
+        'total_tasks': Task.objects.count(),
+        'category_count': Category.objects.count(),
+    }
+
+
+def rebuild():
+    """Пересобирает снимок сразу (cron, после массовых изменений)."""
+    return caching.refresh(SNAPSHOT_KEY, build_snapshot, SNAPSHOT_TIMEOUT, version=current_version())
+
+
+# ----------------------------
+# Чтение
+# ----------------------------
+
+def get_snapshot():
+    """Снимок главной: одно обращение к кэшу, если он свежий."""
+    keys = [SNAPSHOT_KEY, *(version_key(namespace) for namespace in VERSION_NAMESPACES)]
+    values = cache.get_many(keys)
+    envelope = values.get(SNAPSHOT_KEY)
+    version = tuple(values.get(key) for key in keys[1:])
+    if envelope is not None and None not in version and not caching.should_refresh(envelope, version):
+        return envelope['value']
+    return caching.get_or_compute(SNAPSHOT_KEY, build_snapshot, SNAPSHOT_TIMEOUT, version=current_version())
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from qa_app import counters, pagecache
+from qa_app.models import Question, answer_has_text
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает признак ответа (is_answered, answered_at) по тексту ответов и счётчики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            rows = list(
+                Question.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'answer', 'is_answered', 'answered_at', 'updated_at')[:batch_size]
+            )
+            if not rows:
+                break
+            changed = []
+            for pk, answer, is_answered, answered_at, updated_at in rows:
+                has_text = answer_has_text(answer)
+                if has_text != is_answered:
+                    # Точное время ответа неизвестно — берём последнее изменение вопроса
+                    changed.append(Question(pk=pk, is_answered=has_text, answered_at=updated_at if has_text else None))
+                elif has_text and answered_at is None:
+                    changed.append(Question(pk=pk, is_answered=True, answered_at=updated_at))
+            with transaction.atomic():
+                Question.objects.bulk_update(changed, ['is_answered', 'answered_at'])
+            checked += len(rows)
+            fixed += len(changed)
+            last_id = rows[-1][0]
+
+        counters.recount()
+        if fixed:
+            pagecache.purge('questions')
+        self.stdout.write(self.style.SUCCESS(f'Проверено вопросов: {checked}, исправлено: {fixed}'))
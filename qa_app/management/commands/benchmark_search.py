@@ -0,0 +1,40 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from qa_app.search import SEARCH_BACKENDS, get_index, search_question_ids
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время ответа поисковых бэкендов на одном наборе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='+', help='Поисковые запросы')
+        parser.add_argument('--search-in', default='all')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--backend', action='append', choices=sorted(SEARCH_BACKENDS),
+                            help='Бэкенд (можно указать несколько раз); по умолчанию — все')
+
+    def handle(self, *args, **options):
+        backends = options['backend'] or sorted(SEARCH_BACKENDS)
+        if 'memory' in backends:
+            started = time.perf_counter()
+            index = get_index()
+            self.stdout.write(
+                f'memory: индекс построен за {(time.perf_counter() - started) * 1000:.1f} мс, '
+                f'документов: {len(index)}'
+            )
+
+        for query in options['queries']:
+            for backend in backends:
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    ids = search_question_ids(query, options['search_in'], backend=backend)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'{backend:>8} | {query!r}: найдено {len(ids)}, '
+                    f'медиана {statistics.median(timings):.2f} мс, макс {max(timings):.2f} мс, '
+                    f'top-5 {ids[:5]}'
+                )
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+
+from qa_app.models import Question
+from qa_app.snippets import build_snippets
+
+# Прежняя цепочка фильтров из search_results.html
+FILTER_CHAIN = Template(
+    '{% load html_filters %}'
+    '{% for question in questions %}'
+    '{{ question.title|highlight_search:query }}'
+    '{{ question.content|striptags|truncatewords_html:40|highlight_search:query }}'
+    '{% if query and question.answer and query|lower in question.answer|lower %}'
+    '{{ question.answer|striptags|truncatewords_html:20|highlight_search:query }}'
+    '{% endif %}'
+    '{% endfor %}'
+)
+
+SNIPPETS = Template(
+    '{% for question in questions %}'
+    '{{ question.snippet.title }}{{ question.snippet.content }}'
+    '{% if question.snippet.answer %}{{ question.snippet.answer }}{% endif %}'
+    '{% endfor %}'
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает построение фрагментов поиска с прежней цепочкой шаблонных фильтров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('query')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        query = options['query']
+        questions = list(Question.objects.filter(is_published=True)[:options['page_size']])
+        repeat = options['repeat']
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            FILTER_CHAIN.render(Context({'questions': questions, 'query': query}))
+        old_ms = (time.perf_counter() - started) * 1000 / repeat
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            snippets = build_snippets(questions, query)
+            for question in questions:
+                question.snippet = snippets[question.pk]
+            SNIPPETS.render(Context({'questions': questions}))
+        new_ms = (time.perf_counter() - started) * 1000 / repeat
+
+        self.stdout.write(f'Вопросов на странице: {len(questions)}, повторов: {repeat}')
+        self.stdout.write(f'Цепочка фильтров: {old_ms:.2f} мс на страницу')
+        self.stdout.write(f'qa_app.snippets:  {new_ms:.2f} мс на страницу')
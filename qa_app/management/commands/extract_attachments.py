@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from qa_app.extraction import process_attachment
+from qa_app.models import AttachedFile
+
+
+class Command(BaseCommand):
+    help = 'Извлекает текст из прикреплённых файлов для поиска (по умолчанию — только необработанные)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Обработать заново все файлы')
+
+    def handle(self, *args, **options):
+        files = AttachedFile.objects.all()
+        if not options['all']:
+            files = files.filter(text_extracted_at__isnull=True)
+
+        count = 0
+        for file_id in files.values_list('pk', flat=True).iterator():
+            process_attachment(file_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано файлов: {count}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import search_log
+
+
+class Command(BaseCommand):
+    help = 'Переносит поисковые запросы из spool-файла в БД и показывает статистику буфера'
+
+    def handle(self, *args, **options):
+        replayed = search_log.replay_spool()
+        self.stdout.write(f'Перенесено из spool: {replayed}')
+
+        stats = search_log.shared_stats()
+        self.stdout.write(
+            f"Всего записано: {stats['flushed']}, отброшено: {stats['dropped']}, "
+            f"выгружено в spool: {stats['spilled']}, перенесено из spool: {stats['replayed']}"
+        )
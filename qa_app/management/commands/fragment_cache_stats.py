@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from qa_app.fragments import fragment_stats, reset_fragment_stats
+from qa_app.versioning import SIDEBAR, get_version
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику кэша фрагментов шаблонов (попадания / промахи / время рендеринга)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики')
+
+    def handle(self, *args, **options):
+        stats = fragment_stats()
+        if not stats:
+            self.stdout.write('Фрагменты ещё не кэшировались')
+        for name, values in stats.items():
+            self.stdout.write(
+                f"{name}: попаданий {values['hits']}, промахов {values['misses']}, "
+                f"доля попаданий {values['hit_ratio']:.1%}, рендеринг в среднем {values['avg_render_ms']:.2f} мс"
+            )
+        self.stdout.write(f'Версия сайдбара: {get_version(SIDEBAR)}')
+        if options['reset']:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены'))
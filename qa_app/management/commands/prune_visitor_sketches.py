@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import visitors
+
+
+class Command(BaseCommand):
+    help = 'Удаляет дневные скетчи уникальных посетителей старше заданного числа дней'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=None,
+                            help='Сколько дней хранить (по умолчанию — QA_VISITORS_WINDOW_DAYS)')
+
+    def handle(self, *args, **options):
+        keep_days = options['keep_days'] or visitors.window_days()
+        deleted = visitors.prune(keep_days)
+        self.stdout.write(self.style.SUCCESS(f'Удалено скетчей: {deleted} (хранятся последние {keep_days} дн.)'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import homepage
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает снимок данных главной страницы в кэше (можно запускать по cron)'
+
+    def handle(self, *args, **options):
+        snapshot = homepage.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Снимок главной пересобран: вопросов {snapshot['question_count']}, задач {snapshot['total_tasks']}"
+        ))
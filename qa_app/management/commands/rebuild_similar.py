@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import similarity
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает MinHash-сигнатуры вопросов и списки похожих вопросов'
+
+    def handle(self, *args, **options):
+        questions, links = similarity.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Вопросов с сигнатурой: {questions}, связей "похожий вопрос": {links}'))
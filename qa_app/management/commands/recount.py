@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики вопросов (всего, с ответом, по категориям и тегам) по данным в БД'
+
+    def handle(self, *args, **options):
+        fixed = counters.recount()
+        totals = counters.question_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f"Вопросов: {totals['total']}, с ответом: {totals['answered']}; исправлено счётчиков: {fixed}"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import similarity
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие вопросы для изменённых вопросов из очереди (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Вопросов за один пересчёт')
+
+    def handle(self, *args, **options):
+        processed, recomputed = similarity.process_queue(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Вопросов из очереди: {processed}, пересчитано списков похожих: {recomputed}'
+        ))
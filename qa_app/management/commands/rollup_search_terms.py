@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from qa_app.models import SearchQuery, SearchTermDaily
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневную свёртку поисковых запросов (SearchTermDaily) по таблице SearchQuery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Пересчитать только последние N дней (по умолчанию — всю историю)')
+
+    def handle(self, *args, **options):
+        queries = SearchQuery.objects.all()
+        rollups = SearchTermDaily.objects.all()
+        if options['days'] is not None:
+            since = timezone.localdate() - timedelta(days=options['days'])
+            queries = queries.filter(created_at__date__gte=since)
+            rollups = rollups.filter(date__gte=since)
+
+        rows = (
+            queries.annotate(date=TruncDate('created_at'))
+            .values('term', 'date')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+
+        with transaction.atomic():
+            rollups.delete()
+            created = SearchTermDaily.objects.bulk_create(
+                [SearchTermDaily(term=row['term'], date=row['date'], count=row['count']) for row in rows.iterator()],
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS(f'Строк свёртки: {len(created)}'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from qa_app.search import reset_search_cache_stats, search_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику кэша результатов поиска (попадания / промахи)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счётчики')
+
+    def handle(self, *args, **options):
+        stats = search_cache_stats()
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"доля попаданий: {stats['hit_ratio']:.1%}, версия содержимого: {stats['version']}"
+        )
+        if options['reset']:
+            reset_search_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from qa_app.models import Question
+from qa_app.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает полнотекстовые векторы (Question.search_vector) для PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Полнотекстовые векторы поддерживаются только для PostgreSQL.')
+
+        batch_size = options['batch_size']
+        ids = list(Question.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            update_search_vectors(ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено векторов: {len(ids)}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает популярность вопросов "сейчас" по просмотрам последних дней (запускать по cron)'
+
+    def handle(self, *args, **options):
+        updated = trending.update_scores()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено оценок популярности: {updated}'))
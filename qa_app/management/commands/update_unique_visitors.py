@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from qa_app import visitors
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает уникальных посетителей вопросов по скетчам за окно (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько вопросов оценивать за один запрос к скетчам')
+
+    def handle(self, *args, **options):
+        updated = visitors.update_unique_visitors(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено оценок посетителей: {updated}'))
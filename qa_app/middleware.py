@@ -1,6 +1,8 @@
 from django.contrib import messages
 from django.utils.deprecation import MiddlewareMixin
 
+from . import pagecache
+
 
 class LoginRequiredMiddleware(MiddlewareMixin):
     """Проверяет, авторизован ли пользователь для определенных страниц"""
@@ -23,4 +25,25 @@ class LoginRequiredMiddleware(MiddlewareMixin):
                 messages.error(request, 'Для доступа к этой странице необходимо войти в систему.')
                 return redirect(f'{reverse("qa_app:login")}?next={request.path}')
 
-        return None
\ No newline at end of file
+        return None
+
+
+class PageCacheMiddleware(MiddlewareMixin):
+    """
+    Кэш страниц для анонимных GET-запросов (см. qa_app.pagecache).
+    Стоит после CsrfViewMiddleware и MessageMiddleware: первый выставляет
+    cookie с CSRF-токеном, подставленным в страницу из кэша.
+    """
+
+    def process_request(self, request):
+        if not pagecache.is_cacheable_request(request):
+            return None
+        response = pagecache.get_cached_response(request)
+        if response is None:
+            pagecache.start_tagging(request)
+        return response
+
+    def process_response(self, request, response):
+        if getattr(request, '_surrogate_keys', None) is not None:
+            pagecache.store_response(request, response)
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0003_question_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTermDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=255, verbose_name='Поисковый запрос')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Поисковый запрос за день',
+                'verbose_name_plural': 'Поисковые запросы по дням',
+                'ordering': ['-date', '-count'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'term'), name='qa_app_searchtermdaily_date_term')],
+            },
+        ),
+    ]
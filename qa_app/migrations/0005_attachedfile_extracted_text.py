@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0004_searchtermdaily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachedfile',
+            name='extracted_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Извлечённый текст'),
+        ),
+        migrations.AddField(
+            model_name='attachedfile',
+            name='text_extracted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Текст извлечён'),
+        ),
+    ]
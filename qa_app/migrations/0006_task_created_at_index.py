@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0005_attachedfile_extracted_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['-created_at'], name='qa_app_task_created_086dfd_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Question = apps.get_model('qa_app', 'Question')
+    StatCounter = apps.get_model('qa_app', 'StatCounter')
+    published = Question.objects.filter(is_published=True)
+    counters = [
+        StatCounter(kind='total', object_id=0, value=published.count()),
+        StatCounter(kind='answered', object_id=0, value=published.exclude(answer='').count()),
+    ]
+    for row in published.filter(category__isnull=False).values('category_id').annotate(n=Count('id')).order_by():
+        counters.append(StatCounter(kind='category', object_id=row['category_id'], value=row['n']))
+    tag_rows = (
+        Question.tags.through.objects.filter(question__is_published=True)
+        .values('tag_id').annotate(n=Count('id')).order_by()
+    )
+    for row in tag_rows:
+        counters.append(StatCounter(kind='tag', object_id=row['tag_id'], value=row['n']))
+    StatCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0006_task_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('total', 'Всего вопросов'), ('answered', 'С ответом'), ('category', 'В категории'), ('tag', 'С тегом')], max_length=20, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(default=0, verbose_name='ID категории/тега')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик',
+                'verbose_name_plural': 'Счётчики',
+                'indexes': [models.Index(fields=['kind', '-value'], name='qa_app_stat_kind_875449_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='qa_app_statcounter_kind_object')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
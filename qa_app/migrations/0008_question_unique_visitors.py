@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0007_statcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='unique_visitors',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уникальные посетители'),
+        ),
+        migrations.CreateModel(
+            name='QuestionVisitorsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('sketch', models.BinaryField(verbose_name='Скетч HyperLogLog')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visitor_days', to='qa_app.question', verbose_name='Вопрос')),
+            ],
+            options={
+                'verbose_name': 'Посетители вопроса за день',
+                'verbose_name_plural': 'Посетители вопросов по дням',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('question', 'date'), name='qa_app_questionvisitorsdaily_question_date')],
+            },
+        ),
+    ]
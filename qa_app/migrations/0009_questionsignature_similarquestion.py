@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0008_question_unique_visitors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='qa_app.question', verbose_name='Вопрос')),
+                ('signature', models.BinaryField(verbose_name='Сигнатура MinHash')),
+            ],
+            options={
+                'verbose_name': 'Сигнатура вопроса',
+                'verbose_name_plural': 'Сигнатуры вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='qa_app.question', verbose_name='Вопрос')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='qa_app.question', verbose_name='Похожий вопрос')),
+            ],
+            options={
+                'verbose_name': 'Похожий вопрос',
+                'verbose_name_plural': 'Похожие вопросы',
+                'indexes': [models.Index(fields=['question', '-score'], name='qa_app_simi_questio_7fe5cd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('question', 'similar'), name='qa_app_similarquestion_question_similar')],
+            },
+        ),
+    ]
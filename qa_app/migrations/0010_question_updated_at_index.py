@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0009_questionsignature_similarquestion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['is_published', '-updated_at'], name='qa_app_ques_is_publ_86dc55_idx'),
+        ),
+    ]
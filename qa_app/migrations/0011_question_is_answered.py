@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:40
+
+import html
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+
+def fill_is_answered(apps, schema_editor):
+    Question = apps.get_model('qa_app', 'Question')
+    answered = []
+    for pk, answer, updated_at in Question.objects.exclude(answer='').values_list('pk', 'answer', 'updated_at').iterator():
+        if html.unescape(strip_tags(answer)).strip():
+            answered.append(Question(pk=pk, is_answered=True, answered_at=updated_at))
+    Question.objects.bulk_update(answered, ['is_answered', 'answered_at'], batch_size=500)
+
+    # Счётчик "с ответом" считал непустой answer — пересчитываем по новому признаку
+    StatCounter = apps.get_model('qa_app', 'StatCounter')
+    StatCounter.objects.update_or_create(
+        kind='answered', object_id=0,
+        defaults={'value': Question.objects.filter(is_published=True, is_answered=True).count()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0010_question_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answered_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата ответа'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='is_answered',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Есть ответ'),
+        ),
+        migrations.RunPython(fill_is_answered, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['is_published', 'is_answered', '-created_at'], name='qa_app_question_answered'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', 'is_answered', '-created_at'], name='qa_app_question_cat_answered'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_answered', True), ('is_published', True)), fields=['-views'], name='qa_app_question_answered_views'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:25
+
+import html
+import re
+
+from django.db import migrations, models
+
+
+EXCERPT_LENGTH = 300
+TAG_RE = re.compile(r'<[^>]*>')
+
+
+def text_excerpt(value):
+    # Копия qa_app.models.text_excerpt (и snippets.plain_text) на момент миграции
+    text = ' '.join(html.unescape(TAG_RE.sub(' ', value or '')).split())
+    if len(text) <= EXCERPT_LENGTH:
+        return text, len(text.split())
+    cut = text.rfind(' ', 0, EXCERPT_LENGTH)
+    return text[:cut if cut > 0 else EXCERPT_LENGTH - 1].rstrip() + '…', len(text.split())
+
+
+def fill_excerpts(apps, schema_editor):
+    for model_name in ('Question', 'TaskNote'):
+        model = apps.get_model('qa_app', model_name)
+        rows = []
+        for pk, content in model.objects.values_list('pk', 'content').iterator():
+            excerpt, word_count = text_excerpt(content)
+            rows.append(model(pk=pk, excerpt=excerpt, word_count=word_count))
+        model.objects.bulk_update(rows, ['excerpt', 'word_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0011_question_is_answered'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Выдержка'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Слов'),
+        ),
+        migrations.AddField(
+            model_name='tasknote',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Выдержка'),
+        ),
+        migrations.AddField(
+            model_name='tasknote',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Слов'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0012_excerpt_word_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionViewsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+            ],
+            options={
+                'verbose_name': 'Просмотры вопроса за день',
+                'verbose_name_plural': 'Просмотры вопросов по дням',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность сейчас'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-trending_score', '-id'], name='qa_app_question_trending'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_answered', True), ('is_published', True)), fields=['-trending_score', '-id'], name='qa_app_question_ans_trending'),
+        ),
+        migrations.AddField(
+            model_name='questionviewsdaily',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_days', to='qa_app.question', verbose_name='Вопрос'),
+        ),
+        migrations.AddIndex(
+            model_name='questionviewsdaily',
+            index=models.Index(fields=['date'], name='qa_app_ques_date_29b09a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionviewsdaily',
+            constraint=models.UniqueConstraint(fields=('question', 'date'), name='qa_app_questionviewsdaily_question_date'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('qa_app', '0013_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachedfile',
+            index=models.Index(fields=['content_type', 'object_id'], name='qa_app_atta_content_714a34_idx'),
+        ),
+    ]
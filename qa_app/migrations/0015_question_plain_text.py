@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-17 19:05
+
+import html
+import re
+
+from django.db import migrations, models
+
+
+TAG_RE = re.compile(r'<[^>]*>')
+
+
+def plain_text(value):
+    # Копия qa_app.snippets.plain_text на момент миграции
+    return ' '.join(html.unescape(TAG_RE.sub(' ', value or '')).split())
+
+
+def fill_plain_text(apps, schema_editor):
+    Question = apps.get_model('qa_app', 'Question')
+    rows = []
+    for pk, content, answer in Question.objects.values_list('pk', 'content', 'answer').iterator():
+        rows.append(Question(pk=pk, content_text=plain_text(content), answer_text=plain_text(answer)))
+    Question.objects.bulk_update(rows, ['content_text', 'answer_text'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0014_attachedfile_object_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answer_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст ответа'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='content_text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст вопроса'),
+        ),
+        migrations.RunPython(fill_plain_text, migrations.RunPython.noop),
+    ]
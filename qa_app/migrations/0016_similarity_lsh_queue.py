@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-17 19:40
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BANDS = 64
+BAND_WIDTH = 8  # байт: две позиции uint32 сигнатуры
+
+
+def band_buckets(data):
+    # Копия qa_app.similarity.band_buckets на момент миграции
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + data[band * BAND_WIDTH:(band + 1) * BAND_WIDTH], digest_size=8).digest(),
+            'big', signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def fill_buckets(apps, schema_editor):
+    QuestionSignature = apps.get_model('qa_app', 'QuestionSignature')
+    SignatureBucket = apps.get_model('qa_app', 'SignatureBucket')
+    rows = []
+    for question_id, data in QuestionSignature.objects.values_list('question_id', 'signature').iterator():
+        rows.extend(SignatureBucket(question_id=question_id, bucket=bucket) for bucket in band_buckets(bytes(data)))
+    SignatureBucket.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0015_question_plain_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_id', models.IntegerField(verbose_name='Вопрос')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Добавлено')),
+            ],
+            options={
+                'verbose_name': 'Пересчёт похожих вопросов',
+                'verbose_name_plural': 'Очередь пересчёта похожих вопросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='SignatureBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(verbose_name='Корзина')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='qa_app.question', verbose_name='Вопрос')),
+            ],
+            options={
+                'verbose_name': 'Корзина сигнатуры',
+                'verbose_name_plural': 'Корзины сигнатур',
+                'indexes': [models.Index(fields=['bucket', 'question'], name='qa_app_sign_bucket_0be72f_idx')],
+            },
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:10
+
+from django.conf import settings
+from django.db import migrations
+
+
+# Ответ переехал из веса C в D: пересчитываем векторы по сохранённому тексту
+# (копия qa_app.search.search_vector_expression на момент миграции)
+UPDATE_VECTORS = '''
+UPDATE qa_app_question q SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, coalesce(q.title, '')), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(t.name, ' ')
+        FROM qa_app_question_tags qt JOIN qa_app_tag t ON t.id = qt.tag_id
+        WHERE qt.question_id = q.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, q.content_text), 'C')
+    || setweight(to_tsvector(%(config)s::regconfig, q.answer_text), 'D')
+'''
+
+
+def update_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    config = getattr(settings, 'QA_SEARCH_CONFIG', 'russian')
+    schema_editor.execute(UPDATE_VECTORS, {'config': config})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0016_similarity_lsh_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(update_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa_app', '0017_search_vector_answer_weight'),
+    ]
+
+    operations = [
+        # Блок "популярные отвеченные" на главной сортируется по trending_score
+        # (индекс qa_app_question_ans_trending), индекс по всем просмотрам не нужен
+        migrations.RemoveIndex(
+            model_name='question',
+            name='qa_app_question_answered_views',
+        ),
+    ]
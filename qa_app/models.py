@@ -6,11 +6,17 @@ from django.dispatch import receiver
 from django.urls import reverse
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.html import strip_tags
 from pathlib import Path
+import html
 import os
 
+from .snippets import plain_text
+
 
 # ----------------------------
 # Валидаторы
@@ -29,6 +35,33 @@ def validate_file_type(value):
         raise ValidationError(f'Тип файла {ext} не поддерживается.')
 
 
+def answer_has_text(answer):
+    """Есть ли в HTML ответа видимый текст (<p></p> и &nbsp; — это не ответ)."""
+    if not answer:
+        return False
+    return bool(html.unescape(strip_tags(answer)).strip())
+
+
+EXCERPT_LENGTH = 300
+
+
+def text_excerpt(value, length=EXCERPT_LENGTH):
+    """
+    (выдержка, число слов) для HTML-текста: выдержка — простой текст
+    не длиннее length символов, обрезанный по границе слова.
+    """
+    return plain_excerpt(plain_text(value), length)
+
+
+def plain_excerpt(text, length=EXCERPT_LENGTH):
+    """То же, что text_excerpt, для уже очищенного от HTML текста (plain_text)."""
+    word_count = len(text.split())
+    if len(text) <= length:
+        return text, word_count
+    cut = text.rfind(' ', 0, length)
+    return text[:cut if cut > 0 else length - 1].rstrip() + '…', word_count
+
+
 # ----------------------------
 # Теги
 # ----------------------------
@@ -104,11 +137,18 @@ class AttachedFile(models.Model):
         null=True,
         verbose_name="Загрузил"
     )
+    # Текст, извлечённый из файла для поиска (см. qa_app.extraction)
+    extracted_text = models.TextField(blank=True, editable=False, verbose_name="Извлечённый текст")
+    text_extracted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Текст извлечён")
 
     class Meta:
         verbose_name = "Прикреплённый файл"
         verbose_name_plural = "Прикреплённые файлы"
         ordering = ['-uploaded_at']
+        indexes = [
+            # Файлы объекта и их число в списке задач (GenericRelation)
+            models.Index(fields=['content_type', 'object_id']),
+        ]
 
     def __str__(self):
         return self.name or Path(self.file.name).name
@@ -176,8 +216,25 @@ class Question(models.Model):
     )
     tags = models.ManyToManyField(Tag, blank=True, verbose_name="Теги")
     views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    # Оценка уникальных посетителей за последние дни (HyperLogLog, см. qa_app.visitors)
+    unique_visitors = models.PositiveIntegerField(default=0, editable=False, verbose_name="Уникальные посетители")
+    # Просмотры последних дней с затуханием; пересчитывается пачкой (qa_app.trending)
+    trending_score = models.FloatField(default=0, editable=False, verbose_name="Популярность сейчас")
+    # Считаются при сохранении по тексту ответа (answer_has_text), см. save()
+    is_answered = models.BooleanField(default=False, editable=False, verbose_name="Есть ответ")
+    answered_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Дата ответа")
+    # Простой текст начала content для списков (text_excerpt), см. save()
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False, verbose_name="Выдержка")
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Слов")
+    # Простой текст content и answer (plain_text) для фрагментов в поиске, см. save()
+    content_text = models.TextField(blank=True, editable=False, verbose_name="Текст вопроса")
+    answer_text = models.TextField(blank=True, editable=False, verbose_name="Текст ответа")
     attachedfile_set = GenericRelation(AttachedFile)
 
+    # Полнотекстовый вектор (PostgreSQL): title — A, теги — B, content_text — C, answer_text — D.
+    # Пересчитывается после коммита изменений, см. qa_app.search.update_search_vectors
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         verbose_name = "Вопрос"
         verbose_name_plural = "Вопросы"
@@ -188,6 +245,27 @@ class Question(models.Model):
             models.Index(fields=['category']),
             models.Index(fields=['is_published', '-created_at']),
             models.Index(fields=['category', 'is_published', '-created_at']),
+            # Валидатор условного GET списка: max(updated_at) (qa_app.conditional)
+            models.Index(fields=['is_published', '-updated_at']),
+            # Фильтр "с ответом / без ответа" в списке и счётчики по нему
+            models.Index(fields=['is_published', 'is_answered', '-created_at'], name='qa_app_question_answered'),
+            models.Index(
+                fields=['category', 'is_answered', '-created_at'],
+                condition=models.Q(is_published=True),
+                name='qa_app_question_cat_answered',
+            ),
+            # Сортировка "Популярные сейчас" и популярные отвеченные на главной
+            models.Index(
+                fields=['-trending_score', '-id'],
+                condition=models.Q(is_published=True),
+                name='qa_app_question_trending',
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                condition=models.Q(is_published=True, is_answered=True),
+                name='qa_app_question_ans_trending',
+            ),
+            GinIndex(fields=['search_vector']),
         ]
 
     def __str__(self):
@@ -196,15 +274,37 @@ class Question(models.Model):
     def get_absolute_url(self):
         return reverse('qa_app:question_detail', kwargs={'pk': self.pk})
 
-    def increment_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+    def save(self, *args, **kwargs):
+        # Отложенные поля (списки загружают вопросы через defer) не перечитываем
+        deferred = self.get_deferred_fields()
+        # Признак ответа считается один раз при записи, а не в каждом шаблоне
+        if 'answer' not in deferred:
+            is_answered = answer_has_text(self.answer)
+            if is_answered != self.is_answered:
+                self.is_answered = is_answered
+                self.answered_at = timezone.now() if is_answered else None
+            self.answer_text = plain_text(self.answer)
+        # Списки показывают выдержку, поиск — фрагменты простого текста; HTML целиком не читается
+        if 'content' not in deferred:
+            self.content_text = plain_text(self.content)
+            self.excerpt, self.word_count = plain_excerpt(self.content_text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'answer' in update_fields:
+                update_fields |= {'is_answered', 'answered_at', 'answer_text'}
+            if 'content' in update_fields:
+                update_fields |= {'content_text', 'excerpt', 'word_count'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def increment_views(self, visitor=None):
+        """Засчитывает просмотр; запись в БД буферизуется (qa_app.view_counter)"""
+        from .view_counter import record_view
+        record_view(self.pk, visitor=visitor)
 
     def has_answer(self):
-        if not self.answer:
-            return False
-        clean_text = strip_tags(self.answer).strip()
-        return bool(clean_text)
+        return self.is_answered
 
 
 # ----------------------------
@@ -232,6 +332,9 @@ class Task(models.Model):
         verbose_name = "Задача (запись)"
         verbose_name_plural = "Задачи (записи)"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
 
     def __str__(self):
         return self.title
@@ -259,6 +362,8 @@ class TaskNote(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Автор")
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False, verbose_name="Выдержка")
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Слов")
 
     class Meta:
         verbose_name = "Запись по задаче"
@@ -268,6 +373,14 @@ class TaskNote(models.Model):
     def __str__(self):
         return f"{self.title or 'Запись'} — {self.task.title}"
 
+    def save(self, *args, **kwargs):
+        if 'content' not in self.get_deferred_fields():
+            self.excerpt, self.word_count = text_excerpt(self.content)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'excerpt', 'word_count'}
+        super().save(*args, **kwargs)
+
     # Прямая ссылка на прикреплённые файлы
     attachedfile_set = GenericRelation(AttachedFile)
 
@@ -325,4 +438,175 @@ class SearchQuery(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.term} ({self.created_at.strftime('%d.%m.%Y %H:%M')})"
\ No newline at end of file
+        return f"{self.term} ({self.created_at.strftime('%d.%m.%Y %H:%M')})"
+
+
+class SearchTermDaily(models.Model):
+    """
+    Дневная свёртка поисковых запросов: сколько раз искали term за дату.
+    Пополняется при сбросе буфера SearchQuery (qa_app.search_log), пересчитывается
+    командой rollup_search_terms. "Популярные запросы" читаются отсюда.
+    """
+    term = models.CharField(max_length=255, verbose_name="Поисковый запрос")
+    date = models.DateField(verbose_name="Дата")
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Поисковый запрос за день"
+        verbose_name_plural = "Поисковые запросы по дням"
+        ordering = ['-date', '-count']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'term'], name='qa_app_searchtermdaily_date_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.date:%d.%m.%Y}): {self.count}"
+
+
+class QuestionVisitorsDaily(models.Model):
+    """
+    Скетч HyperLogLog уникальных посетителей вопроса за день (4 КБ на строку).
+    Скетчи сливаются поэлементным максимумом (qa_app.hll, qa_app.visitors).
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='visitor_days', verbose_name="Вопрос")
+    date = models.DateField(verbose_name="Дата")
+    sketch = models.BinaryField(verbose_name="Скетч HyperLogLog")
+
+    class Meta:
+        verbose_name = "Посетители вопроса за день"
+        verbose_name_plural = "Посетители вопросов по дням"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'date'], name='qa_app_questionvisitorsdaily_question_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id} ({self.date:%d.%m.%Y})"
+
+
+class QuestionViewsDaily(models.Model):
+    """
+    Просмотры вопроса за день. Пополняется при сбросе буфера просмотров
+    (qa_app.view_counter), по ним считается Question.trending_score.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='view_days', verbose_name="Вопрос")
+    date = models.DateField(verbose_name="Дата")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+
+    class Meta:
+        verbose_name = "Просмотры вопроса за день"
+        verbose_name_plural = "Просмотры вопросов по дням"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'date'], name='qa_app_questionviewsdaily_question_date'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id} ({self.date:%d.%m.%Y}): {self.views}"
+
+
+class StatCounter(models.Model):
+    """
+    Счётчик опубликованных вопросов: всего, с ответом, по категории, по тегу.
+    Поддерживается сигналами (qa_app.counters), пересчитывается командой recount.
+    """
+    KIND_CHOICES = [
+        ('total', 'Всего вопросов'),
+        ('answered', 'С ответом'),
+        ('category', 'В категории'),
+        ('tag', 'С тегом'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Тип")
+    object_id = models.PositiveIntegerField(default=0, verbose_name="ID категории/тега")
+    value = models.IntegerField(default=0, verbose_name="Значение")
+
+    class Meta:
+        verbose_name = "Счётчик"
+        verbose_name_plural = "Счётчики"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='qa_app_statcounter_kind_object'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', '-value']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}: {self.value}"
+
+
+class QuestionSignature(models.Model):
+    """
+    MinHash-сигнатура вопроса (заголовок, теги, текст) для поиска похожих.
+    Пересчитывается при изменении вопроса (qa_app.similarity).
+    """
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name='signature', verbose_name="Вопрос"
+    )
+    signature = models.BinaryField(verbose_name="Сигнатура MinHash")
+
+    class Meta:
+        verbose_name = "Сигнатура вопроса"
+        verbose_name_plural = "Сигнатуры вопросов"
+
+    def __str__(self):
+        return f"Сигнатура вопроса {self.question_id}"
+
+
+class SignatureBucket(models.Model):
+    """
+    LSH-корзина сигнатуры: хеш одной полосы MinHash-сигнатуры (qa_app.similarity).
+    Вопросы с общей корзиной — кандидаты в похожие.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+', verbose_name="Вопрос")
+    bucket = models.BigIntegerField(verbose_name="Корзина")
+
+    class Meta:
+        verbose_name = "Корзина сигнатуры"
+        verbose_name_plural = "Корзины сигнатур"
+        indexes = [
+            models.Index(fields=['bucket', 'question']),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id}: {self.bucket}"
+
+
+class SimilarityRefresh(models.Model):
+    """
+    Очередь пересчёта похожих вопросов: строка добавляется в транзакции
+    изменения вопроса, обрабатывает её `manage.py refresh_similar` (qa_app.similarity).
+    """
+    # Без внешнего ключа: удалённый вопрос тоже нужно обработать
+    question_id = models.IntegerField(verbose_name="Вопрос")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Добавлено")
+
+    class Meta:
+        verbose_name = "Пересчёт похожих вопросов"
+        verbose_name_plural = "Очередь пересчёта похожих вопросов"
+
+    def __str__(self):
+        return f"Вопрос {self.question_id} ({self.created_at:%d.%m.%Y %H:%M})"
+
+
+class SimilarQuestion(models.Model):
+    """Заранее посчитанный похожий вопрос (top-k соседей по сходству сигнатур)."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='similar_links', verbose_name="Вопрос")
+    similar = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+', verbose_name="Похожий вопрос")
+    score = models.FloatField(verbose_name="Сходство")
+
+    class Meta:
+        verbose_name = "Похожий вопрос"
+        verbose_name_plural = "Похожие вопросы"
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'similar'], name='qa_app_similarquestion_question_similar'),
+        ]
+        indexes = [
+            models.Index(fields=['question', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id} → {self.similar_id} ({self.score:.2f})"
@@ -0,0 +1,189 @@
+"""
+Кэш целых страниц для анонимных посетителей с инвалидацией по суррогатным ключам.
+
+Представление помечает страницу ключами тех данных, из которых она собрана
+(add_surrogate_keys: 'question:42', 'category:django', 'questions'),
+ключ 'sidebar' добавляется ко всем страницам. Каждому ключу соответствует
+версия (qa_app.versioning); закэшированная страница хранит версии своих
+ключей, запомненные до чтения данных, и отдаётся, только пока ни одна из
+них не изменилась. purge() увеличивает версии — сигналы сбрасывают ровно те
+страницы, которые зависят от изменённых объектов. Ключ 'sidebar' — это
+версия SIDEBAR, которую уже увеличивают сигналы и счётчики.
+
+Кэшируются только GET/HEAD без cookie сессии и сообщений (то есть
+анонимные, без сообщений и персональных данных) и только ответы 200 без
+установленных cookie. CSRF-токены в HTML заменяются заглушкой, при отдаче
+из кэша подставляется токен текущего посетителя (его cookie выставит
+CsrfViewMiddleware) — чужой токен никогда не попадает в ответ.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import _unmask_cipher_token, get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from .versioning import SIDEBAR, bump_version, get_version, version_key
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TIMEOUT': 60 * 5,
+}
+
+SIDEBAR_KEY = 'sidebar'
+CSRF_PLACEHOLDER = b'{qa:csrf-token}'
+CSRF_TOKEN_RE = re.compile(rb'(?<![A-Za-z0-9])[A-Za-z0-9]{64}(?![A-Za-z0-9])')
+
+# Заголовки, которые не сохраняются вместе со страницей
+SKIP_HEADERS = {'content-length', 'set-cookie', 'surrogate-key', 'x-page-cache'}
+
+
+def get_setting(name):
+    return getattr(settings, 'QA_PAGE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def key_namespace(key):
+    return SIDEBAR if key == SIDEBAR_KEY else f'page:{key}'
+
+
+def page_key(request):
+    digest = hashlib.md5(f'{request.get_host()}{request.get_full_path()}'.encode('utf-8')).hexdigest()
+    return f'qa:page:{digest}'
+
+
+# ----------------------------
+# Разметка страниц (вызывается из представлений)
+# ----------------------------
+
+def add_surrogate_keys(request, *keys):
+    """
+    Помечает ответ на request суррогатными ключами (страница кэшируется только с ними).
+    Версия ключа запоминается в момент вызова, поэтому помечать лучше до чтения данных:
+    изменение, случившееся во время рендеринга, сделает запись устаревшей.
+    """
+    tagged = getattr(request, '_surrogate_keys', None)
+    if tagged is None:
+        return  # запрос не кэшируется
+    for key in keys:
+        if key not in tagged:
+            tagged[key] = get_version(key_namespace(key))
+
+
+def count_view_on_hit(request, question_id):
+    """При отдаче страницы из кэша всё равно засчитать просмотр вопроса."""
+    request._page_cache_views = getattr(request, '_page_cache_views', []) + [question_id]
+
+
+def purge(*keys):
+    """Сбрасывает все страницы, помеченные любым из keys."""
+    for key in set(keys):
+        bump_version(key_namespace(key))
+
+
+def purge_on_commit(*keys):
+    """
+    purge() после коммита: если сбросить раньше, параллельный запрос успеет
+    закэшировать страницу со старыми данными под новой версией ключа.
+    """
+    if keys:
+        transaction.on_commit(lambda: purge(*keys))
+
+
+# ----------------------------
+# Чтение и запись (PageCacheMiddleware)
+# ----------------------------
+
+def is_cacheable_request(request):
+    if not get_setting('ENABLED') or request.method not in ('GET', 'HEAD'):
+        return False
+    # Cookie сессии есть у вошедших пользователей; сообщения — тоже персональные
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and CookieStorage.cookie_name not in request.COOKIES
+
+
+def start_tagging(request):
+    """Включает разметку ключами для кэшируемого запроса; сайдбар есть на всех страницах."""
+    request._surrogate_keys = {SIDEBAR_KEY: get_version(SIDEBAR)}
+
+
+def _current_versions(keys):
+    values = cache.get_many([version_key(key_namespace(key)) for key in keys])
+    return {key: values.get(version_key(key_namespace(key))) for key in keys}
+
+
+def get_cached_response(request):
+    """Ответ из кэша, если страница есть и версии её ключей не изменились."""
+    entry = cache.get(page_key(request))
+    if entry is None:
+        return None
+    versions = entry['versions']
+    if None in versions.values() or _current_versions(versions) != versions:
+        return None
+
+    content = entry['content']
+    if entry['csrf']:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii'))
+    response = HttpResponse(content, status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    response['Surrogate-Key'] = ' '.join(sorted(versions))
+    response['X-Page-Cache'] = 'HIT'
+
+    if entry['views']:
+        from .view_counter import record_view
+        from .visitors import visitor_id
+
+        visitor = visitor_id(request)
+        for question_id in entry['views']:
+            record_view(question_id, visitor=visitor)
+
+    # Валидаторы страницы (qa_app.conditional) сохранены вместе с ней
+    if response.has_header('ETag'):
+        last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+        return get_conditional_response(request, etag=response['ETag'], last_modified=last_modified, response=response)
+    return response
+
+
+def store_response(request, response):
+    """Кэширует ответ, если представление пометило его ключами и он не персональный."""
+    versions = getattr(request, '_surrogate_keys', None)
+    if not versions or set(versions) == {SIDEBAR_KEY}:
+        return
+    response['Surrogate-Key'] = ' '.join(sorted(versions))
+    patch_vary_headers(response, ('Cookie',))
+
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return
+    cache_control = response.get('Cache-Control', '')
+    if 'private' in cache_control or 'no-store' in cache_control:
+        return
+    session = getattr(request, 'session', None)
+    if session is not None and session.modified:
+        return
+    if len(get_messages(request)):
+        return
+
+    content = response.content
+    csrf_secret = request.META.get('CSRF_COOKIE') if request.META.get('CSRF_COOKIE_NEEDS_UPDATE') else None
+    if csrf_secret:
+        # Все токены на странице — маскированный секрет этого посетителя
+        content = CSRF_TOKEN_RE.sub(
+            lambda match: CSRF_PLACEHOLDER if _unmask_cipher_token(match.group().decode('ascii')) == csrf_secret else match.group(),
+            content,
+        )
+
+    cache.set(page_key(request), {
+        'content': content,
+        'status': response.status_code,
+        'headers': [(name, value) for name, value in response.items() if name.lower() not in SKIP_HEADERS],
+        'versions': versions,
+        'csrf': bool(csrf_secret),
+        'views': getattr(request, '_page_cache_views', []),
+    }, get_setting('TIMEOUT'))
+    response['X-Page-Cache'] = 'MISS'
@@ -0,0 +1,210 @@
+"""
+Курсорная (keyset) пагинация.
+
+Вместо OFFSET и COUNT(*) страница выбирается условием по ключу сортировки
+последней показанной строки:
+WHERE created_at <= :created_at AND (created_at < :created_at OR
+(created_at = :created_at AND id < :id)) ORDER BY created_at DESC, id DESC
+LIMIT n + 1. Первое условие — граница диапазона по ведущей колонке, по ней
+планировщик начинает проход по индексу (-created_at) с нужного места, поэтому
+запрос стоит одинаково на первой и на тысячной странице.
+
+Курсор в ссылках непрозрачен: значения ключа подписываются и кодируются
+django.core.signing, поэтому подделать или разобрать его нельзя.
+"""
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.functional import cached_property
+
+from . import counting
+
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'qa_app.pagination'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    return ['v', value]
+
+
+def _load_value(item):
+    kind, value = item
+    if kind == 'dt':
+        return parse_datetime(value)
+    if kind == 'd':
+        return parse_date(value)
+    return value
+
+
+def encode_cursor(values, direction):
+    return signing.dumps(
+        {'v': [_dump_value(value) for value in values], 'd': direction},
+        salt=CURSOR_SALT, compress=True,
+    )
+
+
+def decode_cursor(cursor):
+    try:
+        payload = signing.loads(cursor, salt=CURSOR_SALT)
+        return [_load_value(item) for item in payload['v']], payload['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(str(e))
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Условие "строго после values" для сортировки ordering
+    (последнее поле должно быть уникальным, обычно id):
+    k1 >= v1 AND ((k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...).
+    Само OR-условие индекс использовать не даёт; избыточная граница
+    k1 >= v1 делает его диапазонным по ведущей колонке индекса.
+    """
+    condition = Q()
+    equal = Q()
+    bound = None
+    for field, value in zip(ordering, values):
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        if bound is None:
+            bound = Q(**{f'{name}__{lookup}e': value})
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    if len(ordering) > 1:
+        condition = bound & condition
+    return condition
+
+
+class CursorPage:
+    """Страница курсорной пагинации (интерфейс близок к django Page)."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """
+    ordering — кортеж полей сортировки; последнее поле должно делать
+    порядок однозначным (id).
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    @cached_property
+    def count(self):
+        """Число строк (считается, только если его показывает шаблон; см. qa_app.counting)."""
+        return counting.count(self.queryset)
+
+    def _values(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def page(self, cursor=None):
+        direction = 'next'
+        queryset = self.queryset
+        if cursor:
+            values, direction = decode_cursor(cursor)
+            if len(values) != len(self.ordering):
+                raise InvalidCursor('cursor does not match ordering')
+            queryset = queryset.filter(keyset_filter(self.ordering, values, forward=direction == 'next'))
+
+        if direction == 'next':
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            reverse = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+            rows = list(queryset.order_by(*reverse)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next, has_previous = True, has_more
+
+        next_cursor = encode_cursor(self._values(rows[-1]), 'next') if rows and has_next else None
+        previous_cursor = encode_cursor(self._values(rows[0]), 'prev') if rows and has_previous else None
+        return CursorPage(rows, self, has_next, has_previous, next_cursor, previous_cursor)
+
+
+class CountingPaginator(Paginator):
+    """Paginator, который считает строки через qa_app.counting (точно — только до порога)."""
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            return counting.count(self.object_list)
+        return counting.CountResult(len(self.object_list))
+
+
+def pagination_mode():
+    """'cursor' (по умолчанию) или 'offset' — обычный Paginator с номерами страниц."""
+    return getattr(settings, 'QA_PAGINATION_MODE', 'cursor')
+
+
+class CursorPaginationMixin:
+    """
+    Курсорная пагинация для ListView. Порядок берётся из get_cursor_ordering();
+    при пустом/битом курсоре показывается первая страница.
+    """
+    cursor_ordering = ('-created_at', '-id')
+    paginator_class = CountingPaginator
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        if pagination_mode() != 'cursor':
+            return super().paginate_queryset(queryset.order_by(*self.get_cursor_ordering()), page_size)
+        paginator = CursorPaginator(queryset, page_size, self.get_cursor_ordering())
+        try:
+            page = paginator.page(self.request.GET.get(CURSOR_PARAM))
+        except InvalidCursor:
+            page = paginator.page()
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_window'] = elided_page_range(context.get('page_obj'))
+        return context
+
+
+def elided_page_range(page, on_each_side=2, on_ends=1):
+    """Номера страниц с многоточиями для обычного Paginator."""
+    if page is None or getattr(page, 'is_cursor', False):
+        return []
+    return list(page.paginator.get_elided_page_range(page.number, on_each_side=on_each_side, on_ends=on_ends))
@@ -0,0 +1,663 @@
+"""
+Поисковый движок по вопросам.
+
+Два бэкенда, выбираются настройкой QA_SEARCH_BACKEND:
+
+* 'memory' — индекс в памяти процесса (ниже);
+* 'postgres' — полнотекстовый поиск PostgreSQL по Question.search_vector.
+
+Бэкенд 'memory' держит в памяти процесса инвертированный индекс (postings
+по термам отдельно для каждого поля: title / content / answer / tags)
+и ранжирует результаты по BM25. Индекс строится лениво при первом запросе.
+
+Стоимость запроса зависит от длины postings для термов запроса,
+а не от общего числа вопросов в базе.
+
+Индекс живёт в памяти каждого процесса, поэтому изменения публикуются
+через общий кэш: после коммита сигналы (publish_changes) увеличивают
+версию содержимого CONTENT и записывают под её номером id изменённых
+вопросов и файлов. Перед поиском процесс сверяет версию своего индекса
+с общей и дочитывает из БД только изменённые объекты; если журнал
+изменений неполон (вытеснен из кэша, слишком большое отставание),
+индекс перестраивается целиком. Так все воркеры ранжируют по одним данным.
+
+Поверх обоих бэкендов — кэш ранжированных списков id по нормализованному
+запросу (cached_search_question_ids), инвалидируемый версией содержимого.
+"""
+import hashlib
+import html
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+from django.utils.html import strip_tags
+
+from .versioning import CONTENT, bump_version, get_version
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Поля индекса и их веса при ранжировании
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'tags': 2.0,
+    'content': 1.0,
+    'answer': 1.0,
+}
+
+# Какие поля участвуют в поиске для каждого режима SearchForm.search_in
+SEARCH_FIELDS = {
+    'all': ('title', 'content', 'answer', 'tags'),
+    'title': ('title',),
+    'content': ('content', 'answer'),
+    'answer': ('answer',),
+    'tags': ('tags',),
+}
+
+# Сколько термов словаря максимум подставлять вместо префикса последнего слова
+MAX_PREFIX_EXPANSION = 50
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Разбивает текст (в т.ч. HTML) на нормализованные токены."""
+    if not text:
+        return []
+    text = html.unescape(strip_tags(text)).lower().replace('ё', 'е')
+    return TOKEN_RE.findall(text)
+
+
+def question_fields(question, tag_names=None):
+    """Собирает токены полей вопроса для индексации."""
+    if tag_names is None:
+        tag_names = [tag.name for tag in question.tags.all()]
+    return {
+        'title': tokenize(question.title),
+        'content': tokenize(question.content),
+        'answer': tokenize(question.answer),
+        'tags': tokenize(' '.join(tag_names)),
+    }
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс с BM25-ранжированием.
+
+    postings[field][term] -> {doc_id: tf}
+    doc_lengths[field][doc_id] -> длина поля в токенах
+    """
+
+    def __init__(self, field_weights=None, search_fields=None):
+        self._lock = threading.RLock()
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.search_fields = search_fields or SEARCH_FIELDS
+        self.postings = {field: {} for field in self.field_weights}
+        self.doc_lengths = {field: {} for field in self.field_weights}
+        self.total_lengths = {field: 0 for field in self.field_weights}
+        self.doc_terms = {}
+        self._vocabulary = []
+        self._term_refs = Counter()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_terms
+
+    # ----------------------------
+    # Обновление
+    # ----------------------------
+
+    def add(self, doc_id, fields):
+        """Добавляет (или заменяет) документ. fields: {поле: [токены]}"""
+        with self._lock:
+            self._remove(doc_id)
+            term_counts = {}
+            for field in self.field_weights:
+                tokens = fields.get(field) or []
+                counts = Counter(tokens)
+                term_counts[field] = counts
+                self.doc_lengths[field][doc_id] = len(tokens)
+                self.total_lengths[field] += len(tokens)
+                postings = self.postings[field]
+                for term, tf in counts.items():
+                    postings.setdefault(term, {})[doc_id] = tf
+                    self._ref_term(term)
+            self.doc_terms[doc_id] = term_counts
+
+    def update_field(self, doc_id, field, tokens):
+        """Переиндексирует одно поле уже проиндексированного документа."""
+        with self._lock:
+            term_counts = self.doc_terms.get(doc_id)
+            if term_counts is None:
+                return
+            fields = {name: list(counts.elements()) for name, counts in term_counts.items()}
+            fields[field] = tokens
+            self.add(doc_id, fields)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        term_counts = self.doc_terms.pop(doc_id, None)
+        if term_counts is None:
+            return
+        for field, counts in term_counts.items():
+            self.total_lengths[field] -= self.doc_lengths[field].pop(doc_id, 0)
+            postings = self.postings[field]
+            for term in counts:
+                docs = postings.get(term)
+                if docs is not None:
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del postings[term]
+                self._unref_term(term)
+
+    def _ref_term(self, term):
+        if self._term_refs[term] == 0:
+            insort(self._vocabulary, term)
+        self._term_refs[term] += 1
+
+    def _unref_term(self, term):
+        self._term_refs[term] -= 1
+        if self._term_refs[term] <= 0:
+            del self._term_refs[term]
+            pos = bisect_left(self._vocabulary, term)
+            if pos < len(self._vocabulary) and self._vocabulary[pos] == term:
+                del self._vocabulary[pos]
+
+    # ----------------------------
+    # Поиск
+    # ----------------------------
+
+    def expand_prefix(self, prefix, limit=MAX_PREFIX_EXPANSION):
+        """Возвращает термы словаря, начинающиеся с prefix."""
+        terms = []
+        pos = bisect_left(self._vocabulary, prefix)
+        while pos < len(self._vocabulary) and len(terms) < limit:
+            term = self._vocabulary[pos]
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+            pos += 1
+        return terms
+
+    def search(self, query, search_in='all', limit=None):
+        """
+        Возвращает id документов, отсортированные по убыванию BM25.
+
+        Документ должен содержать каждое слово запроса хотя бы в одном
+        из полей режима search_in; последнее слово ищется по префиксу,
+        чтобы поиск «по мере набора» находил недописанные слова.
+        """
+        fields = self.search_fields.get(search_in, self.search_fields['all'])
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            # Для каждого слова запроса — набор термов-кандидатов
+            groups = [[term] for term in terms[:-1]]
+            last = terms[-1]
+            last_group = self.expand_prefix(last)
+            if last not in last_group:
+                last_group.insert(0, last)
+            groups.append(last_group)
+
+            scores = None
+            for group in groups:
+                group_scores = {}
+                for term in group:
+                    for field in fields:
+                        self._score_term(term, field, group_scores)
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {
+                        doc_id: score + group_scores[doc_id]
+                        for doc_id, score in scores.items()
+                        if doc_id in group_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [doc_id for doc_id, _ in ranked]
+
+    def _score_term(self, term, field, scores):
+        docs = self.postings[field].get(term)
+        if not docs:
+            return
+        total_docs = len(self.doc_terms)
+        df = len(docs)
+        idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+        avg_len = (self.total_lengths[field] / total_docs) or 1.0
+        lengths = self.doc_lengths[field]
+        weight = self.field_weights[field] * idf
+        for doc_id, tf in docs.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avg_len)
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf * (BM25_K1 + 1) / (tf + norm)
+
+
+# ----------------------------
+# Индекс процесса
+# ----------------------------
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def build_index():
+    """Строит индекс по всем опубликованным вопросам."""
+    index = InvertedIndex()
+    _add_questions(index, None)
+    return index
+
+
+def _add_questions(index, question_ids):
+    """Загружает вопросы (все или question_ids) в индекс; снятые с публикации и удалённые убирает."""
+    from .models import Question
+
+    questions = Question.objects.filter(is_published=True).only(
+        'id', 'title', 'content', 'answer'
+    ).prefetch_related('tags')
+    if question_ids is not None:
+        questions = questions.filter(pk__in=question_ids)
+    found = set()
+    for question in questions.iterator(chunk_size=2000):
+        index.add(question.pk, question_fields(question))
+        found.add(question.pk)
+    for question_id in set(question_ids or ()) - found:
+        index.remove(question_id)
+
+
+def get_index(version=None):
+    """
+    Индекс процесса, синхронизированный с версией содержимого version
+    (по умолчанию — текущей): при необходимости строится или дочитывает изменения.
+    """
+    global _index, _index_version
+    version = get_version(CONTENT) if version is None else version
+    if _index is not None and is_synced(_index_version, version):
+        return _index
+    with _index_lock:
+        if _index is not None and not is_synced(_index_version, version):
+            changes = pending_changes(_index_version, version)
+            if changes is None:
+                _index = None
+            elif changes['questions']:
+                _add_questions(_index, changes['questions'])
+            _index_version = version
+        if _index is None:
+            # Версия прочитана до построения: изменения, закоммиченные
+            # во время построения, будут дочитаны при следующей сверке
+            _index = build_index()
+            _index_version = version
+    return _index
+
+
+def reset_index():
+    """Сбрасывает индексы; они будут перестроены при следующем поиске."""
+    global _index, _index_version, _file_index, _file_index_version
+    with _index_lock:
+        _index = _index_version = None
+        _file_index = _file_index_version = None
+
+
+# ----------------------------
+# Журнал изменений (синхронизация индексов процессов)
+# ----------------------------
+
+CHANGES_TIMEOUT = 60 * 60
+MAX_CATCHUP = 500  # при большем отставании дешевле перестроить индекс
+
+
+def changes_key(version):
+    return f'qa:search:changes:{version}'
+
+
+def is_synced(index_version, version):
+    """
+    Индекс версии index_version годится для запроса версии version: он не старее
+    (другой поток мог уже дочитать более новые изменения). Слишком большой
+    разрыв означает, что счётчик версий был вытеснен и начат заново.
+    """
+    return index_version is not None and 0 <= index_version - version <= MAX_CATCHUP
+
+
+def publish_changes(question_ids=(), file_ids=(), tag_ids=()):
+    """
+    После коммита пересчитывает векторы PostgreSQL изменённых вопросов,
+    увеличивает версию CONTENT и записывает под ней изменённые вопросы,
+    файлы и теги. До коммита изменения не видны другим процессам, поэтому
+    раньше нельзя: они дочитали бы старые данные под новой версией.
+    """
+    question_ids, file_ids, tag_ids = sorted(set(question_ids)), sorted(set(file_ids)), sorted(set(tag_ids))
+    if question_ids or file_ids or tag_ids:
+        transaction.on_commit(lambda: _publish(question_ids, file_ids, tag_ids))
+
+
+def _publish(question_ids, file_ids, tag_ids=()):
+    # Векторы PostgreSQL — до новой версии, иначе под ней закэшируется старый результат
+    update_search_vectors(question_ids)
+    version = bump_version(CONTENT)
+    cache.set(changes_key(version), {
+        'questions': question_ids, 'files': file_ids, 'tags': list(tag_ids),
+    }, CHANGES_TIMEOUT)
+
+
+def pending_changes(since, until):
+    """
+    Объединённые изменения версий (since, until]: {'questions': set, 'files': set,
+    'tags': set} или None, если журнал за этот промежуток восстановить нельзя.
+    """
+    if since is None or until < since or until - since > MAX_CATCHUP:
+        return None
+    keys = [changes_key(version) for version in range(since + 1, until + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys):
+        return None
+    changes = {'questions': set(), 'files': set(), 'tags': set()}
+    for entry in entries.values():
+        changes['questions'].update(entry['questions'])
+        changes['files'].update(entry['files'])
+        changes['tags'].update(entry.get('tags', ()))
+    return changes
+
+
+# ----------------------------
+# Индекс файлов (search_in='files')
+# ----------------------------
+
+# Название файла и извлечённый из него текст (AttachedFile.extracted_text)
+FILE_FIELD_WEIGHTS = {
+    'name': 2.0,
+    'content': 1.0,
+}
+FILE_SEARCH_FIELDS = {
+    'all': ('name', 'content'),
+}
+
+_file_index = None
+_file_index_version = None
+_file_owners = {}  # id файла -> ('question' | 'task', id владельца)
+
+
+def file_fields(name, text):
+    return {'name': tokenize(name), 'content': tokenize(text)}
+
+
+def file_owner(model, object_id, note_tasks):
+    """Владелец файла для выдачи: вопрос или задача (для записи — её задача)."""
+    if model == 'tasknote':
+        task_id = note_tasks.get(object_id)
+        return ('task', task_id) if task_id else None
+    if model in ('question', 'task'):
+        return (model, object_id)
+    return None
+
+
+def _add_files(index, owners, file_ids):
+    """Загружает файлы (все или file_ids) в индекс; удалённые и без владельца убирает."""
+    from .models import AttachedFile, TaskNote
+
+    files = AttachedFile.objects.values_list('id', 'name', 'extracted_text', 'content_type__model', 'object_id')
+    notes = TaskNote.objects.all()
+    if file_ids is not None:
+        files = files.filter(pk__in=file_ids)
+        notes = notes.filter(pk__in=files.filter(content_type__model='tasknote').values('object_id'))
+    note_tasks = dict(notes.values_list('id', 'task_id'))
+    found = set()
+    for pk, name, text, model, object_id in files.iterator(chunk_size=500):
+        owner = file_owner(model, object_id, note_tasks)
+        if owner is None:
+            continue
+        owners[pk] = owner
+        index.add(pk, file_fields(name, text))
+        found.add(pk)
+    for file_id in set(file_ids or ()) - found:
+        index.remove(file_id)
+        owners.pop(file_id, None)
+
+
+def build_file_index():
+    index = InvertedIndex(FILE_FIELD_WEIGHTS, FILE_SEARCH_FIELDS)
+    owners = {}
+    _add_files(index, owners, None)
+    return index, owners
+
+
+def get_file_index(version=None):
+    """Индекс файлов процесса, синхронизированный так же, как get_index()."""
+    global _file_index, _file_index_version, _file_owners
+    version = get_version(CONTENT) if version is None else version
+    if _file_index is not None and is_synced(_file_index_version, version):
+        return _file_index
+    with _index_lock:
+        if _file_index is not None and not is_synced(_file_index_version, version):
+            changes = pending_changes(_file_index_version, version)
+            if changes is None:
+                _file_index = None
+            elif changes['files']:
+                _add_files(_file_index, _file_owners, changes['files'])
+            _file_index_version = version
+        if _file_index is None:
+            _file_index, _file_owners = build_file_index()
+            _file_index_version = version
+    return _file_index
+
+
+def search_file_owners(query, version=None):
+    """
+    Ищет по названиям и содержимому файлов. Возвращает
+    {'question': [id, ...], 'task': [id, ...]} в порядке релевантности
+    лучшего файла владельца. Диск при этом не читается.
+    """
+    index = get_file_index(version)
+    owners = {'question': [], 'task': []}
+    seen = set()
+    for file_id in index.search(query):
+        owner = _file_owners.get(file_id)
+        if owner is not None and owner not in seen:
+            seen.add(owner)
+            owners[owner[0]].append(owner[1])
+    return owners
+
+
+# ----------------------------
+# PostgreSQL: tsvector + GIN
+# ----------------------------
+
+# Ограничение по весам tsvector для каждого режима search_in
+SEARCH_WEIGHTS = {
+    'all': '',
+    'title': 'A',
+    'tags': 'B',
+    'content': 'CD',
+    'answer': 'D',
+}
+
+# Веса ts_rank в порядке D, C, B, A: ответ (D) весит как текст вопроса (C),
+# как и в индексе в памяти (FIELD_WEIGHTS)
+RANK_WEIGHTS = [0.2, 0.2, 0.4, 1.0]
+
+
+def search_config():
+    return getattr(settings, 'QA_SEARCH_CONFIG', 'russian')
+
+
+def build_tsquery(query, search_in='all'):
+    """
+    Строит текст для to_tsquery: слова через &, последнее — по префиксу,
+    с ограничением по весу для выбранного режима. Токены состоят только
+    из букв, цифр и подчёркиваний, поэтому экранирование не требуется.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return ''
+    weights = SEARCH_WEIGHTS.get(search_in, '')
+    parts = [f'{term}:{weights}' if weights else term for term in terms[:-1]]
+    parts.append(f'{terms[-1]}:*{weights}')
+    return ' & '.join(parts)
+
+
+def postgres_search_ids(query, search_in='all', version=None):
+    """
+    Ранжированный (ts_rank) список id опубликованных вопросов.
+    version не нужна: запрос читает закоммиченные данные напрямую.
+    """
+    from .models import Question
+
+    raw_query = build_tsquery(query, search_in)
+    if not raw_query:
+        return []
+    ts_query = SearchQuery(raw_query, search_type='raw', config=search_config())
+    # Режим задаётся весом в самом tsquery, поэтому хватает GIN-индекса по search_vector
+    questions = Question.objects.filter(is_published=True, search_vector=ts_query)
+    return list(
+        questions.annotate(rank=SearchRank(F('search_vector'), ts_query, weights=RANK_WEIGHTS))
+        .order_by('-rank', '-created_at')
+        .values_list('id', flat=True)
+    )
+
+
+def search_vector_expression():
+    """
+    Выражение для Question.search_vector по сохранённому простому тексту:
+    title — A, теги — B, content_text — C, answer_text — D.
+    """
+    from .models import Tag
+
+    config = search_config()
+    tag_names = Tag.objects.filter(question=OuterRef('pk')).order_by().values('question').annotate(
+        names=StringAgg('name', delimiter=' ')
+    ).values('names')
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector(Coalesce(Subquery(tag_names), Value(''), output_field=TextField()), weight='B', config=config)
+        + SearchVector('content_text', weight='C', config=config)
+        + SearchVector('answer_text', weight='D', config=config)
+    )
+
+
+def update_search_vectors(question_ids):
+    """Пересчитывает Question.search_vector для указанных вопросов одним UPDATE."""
+    from .models import Question
+
+    if connection.vendor != 'postgresql' or not question_ids:
+        return
+    Question.objects.filter(pk__in=question_ids).update(search_vector=search_vector_expression())
+
+
+# ----------------------------
+# Выбор бэкенда
+# ----------------------------
+
+def memory_search_ids(query, search_in='all', version=None):
+    return get_index(version).search(query, search_in)
+
+
+def file_search_question_ids(query, search_in='files', version=None):
+    from .models import Question
+
+    ids = search_file_owners(query, version)['question']
+    published = set(Question.objects.filter(pk__in=ids, is_published=True).values_list('id', flat=True))
+    return [pk for pk in ids if pk in published]
+
+
+SEARCH_BACKENDS = {
+    'memory': memory_search_ids,
+    'postgres': postgres_search_ids,
+}
+
+
+def search_question_ids(query, search_in='all', backend=None, version=None):
+    """
+    Ранжированный список id опубликованных вопросов по запросу.
+    Режим 'files' всегда обслуживается индексом файлов. Индексы в памяти
+    синхронизируются не ниже версии содержимого version (по умолчанию — текущей).
+    """
+    backend = backend or getattr(settings, 'QA_SEARCH_BACKEND', 'memory')
+    if search_in == 'files':
+        return file_search_question_ids(query, version=version)
+    return SEARCH_BACKENDS.get(backend, memory_search_ids)(query, search_in, version=version)
+
+
+# ----------------------------
+# Кэш результатов
+# ----------------------------
+
+SEARCH_CACHE_TIMEOUT = 60 * 60 * 24  # только для вытеснения: актуальность даёт версия
+SEARCH_CACHE_HITS_KEY = 'qa:search_cache:hits'
+SEARCH_CACHE_MISSES_KEY = 'qa:search_cache:misses'
+
+
+def normalize_query(query):
+    return ' '.join(tokenize(query))
+
+
+def search_cache_key(query, search_in, backend, version=None):
+    version = get_version(CONTENT) if version is None else version
+    digest = hashlib.md5(normalize_query(query).encode('utf-8')).hexdigest()
+    return f'qa:search:{version}:{backend}:{search_in}:{digest}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def cached_search_question_ids(query, search_in='all', backend=None):
+    """
+    То же, что search_question_ids, но ранжированный список id кэшируется
+    по нормализованной паре (запрос, search_in). Ключ включает версию
+    содержимого, которую сигналы увеличивают после коммита изменений вопросов,
+    тегов и файлов. Версия читается один раз: индекс процесса дочитывает
+    изменения до неё до поиска, поэтому под ключом версии не может оказаться
+    результат более старого индекса.
+    """
+    backend = backend or getattr(settings, 'QA_SEARCH_BACKEND', 'memory')
+    version = get_version(CONTENT)
+    key = search_cache_key(query, search_in, backend, version)
+    ids = cache.get(key)
+    if ids is not None:
+        _count(SEARCH_CACHE_HITS_KEY)
+        return ids
+    _count(SEARCH_CACHE_MISSES_KEY)
+    ids = search_question_ids(query, search_in, backend=backend, version=version)
+    cache.set(key, ids, SEARCH_CACHE_TIMEOUT)
+    return ids
+
+
+def search_cache_stats():
+    hits = cache.get(SEARCH_CACHE_HITS_KEY) or 0
+    misses = cache.get(SEARCH_CACHE_MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+        'version': get_version(CONTENT),
+    }
+
+
+def reset_search_cache_stats():
+    cache.delete_many([SEARCH_CACHE_HITS_KEY, SEARCH_CACHE_MISSES_KEY])
@@ -0,0 +1,314 @@
+"""
+Буферизованная запись поисковых запросов (SearchQuery).
+
+Вместо INSERT на каждый поиск запись кладётся в кольцевой буфер процесса,
+а фоновый поток сбрасывает её в БД одним bulk_create — каждые BATCH_SIZE
+записей или FLUSH_INTERVAL секунд, а также при завершении процесса.
+
+Если БД недоступна, пачка дописывается в spool-файл (JSON lines) и
+переигрывается при следующем успешном сбросе или командой
+`manage.py flush_search_log`. При переполнении буфера самые старые
+записи отбрасываются; счётчики отброшенных и выгруженных в spool
+записей доступны через stats() и общий кэш (shared_stats()).
+
+Вместе с записями SearchQuery в той же транзакции пополняется дневная
+свёртка SearchTermDaily, из которой читаются "Популярные запросы".
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import Counter, deque
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 5.0,
+    'CAPACITY': 10000,
+    'SPOOL_PATH': None,
+}
+
+STAT_NAMES = ('flushed', 'dropped', 'spilled', 'replayed')
+
+
+def get_setting(name):
+    return getattr(settings, 'QA_SEARCH_LOG', {}).get(name, DEFAULTS[name])
+
+
+def spool_path():
+    path = get_setting('SPOOL_PATH') or Path(settings.BASE_DIR) / 'var' / 'search_queries.spool'
+    return Path(path)
+
+
+def _shared_stat_key(name):
+    return f'qa:search_log:{name}'
+
+
+def shared_stats():
+    """Счётчики всех процессов (накапливаются в общем кэше при сбросе)."""
+    return {name: cache.get(_shared_stat_key(name)) or 0 for name in STAT_NAMES}
+
+
+def _add_shared_stat(name, value):
+    if not value:
+        return
+    key = _shared_stat_key(name)
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+class SearchLogBuffer:
+
+    def __init__(self, capacity=None, batch_size=None, flush_interval=None):
+        self.capacity = capacity or get_setting('CAPACITY')
+        self.batch_size = batch_size or get_setting('BATCH_SIZE')
+        self.flush_interval = flush_interval or get_setting('FLUSH_INTERVAL')
+        self._records = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.counters = dict.fromkeys(STAT_NAMES, 0)
+
+    # ----------------------------
+    # Запись
+    # ----------------------------
+
+    def add(self, record):
+        self._ensure_started()
+        with self._lock:
+            if len(self._records) >= self.capacity:
+                self._records.popleft()
+                self.counters['dropped'] += 1
+                _add_shared_stat('dropped', 1)
+            self._records.append(record)
+            full = len(self._records) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        # После fork() поток родителя в дочернем процессе не существует
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='search-log-flusher', daemon=True)
+            self._thread.start()
+
+    # ----------------------------
+    # Сброс
+    # ----------------------------
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Search log flush failed')
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Сбрасывает весь буфер пачками; возвращает число записанных в БД записей."""
+        written = 0
+        with self._flush_lock:
+            if self._records:
+                replay_spool(self)
+            while True:
+                with self._lock:
+                    batch = [self._records.popleft() for _ in range(min(self.batch_size, len(self._records)))]
+                if not batch:
+                    break
+                try:
+                    self._write(batch)
+                except DatabaseError as e:
+                    logger.warning('Search log: БД недоступна (%s), %d записей выгружено в spool', e, len(batch))
+                    self._spill(batch)
+                    # Остаток тоже в spool: повторять недоступную БД в цикле нет смысла
+                    with self._lock:
+                        rest = list(self._records)
+                        self._records.clear()
+                    if rest:
+                        self._spill(rest)
+                    break
+                written += len(batch)
+                self.counters['flushed'] += len(batch)
+                _add_shared_stat('flushed', len(batch))
+        return written
+
+    def _write(self, records):
+        from .models import SearchQuery
+
+        with transaction.atomic():
+            SearchQuery.objects.bulk_create(
+                [SearchQuery(**record) for record in records],
+                batch_size=self.batch_size,
+            )
+            record_term_counts(records)
+
+    def _spill(self, records):
+        path = spool_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as spool:
+            for record in records:
+                spool.write(json.dumps(record, default=str, ensure_ascii=False) + '\n')
+        self.counters['spilled'] += len(records)
+        _add_shared_stat('spilled', len(records))
+
+    # ----------------------------
+    # Остановка и статистика
+    # ----------------------------
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {'buffered': len(self._records), **self.counters}
+
+
+def replay_spool(buffer=None):
+    """
+    Переносит записи из spool-файла в БД. Файл сначала атомарно
+    переименовывается, поэтому параллельные процессы не прочитают его дважды.
+    """
+    path = spool_path()
+    if not path.exists():
+        return 0
+    replaying = path.with_name(f'{path.name}.{os.getpid()}.replay')
+    try:
+        os.replace(path, replaying)
+    except FileNotFoundError:
+        return 0
+
+    records = []
+    with open(replaying, encoding='utf-8') as spool:
+        for line in spool:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            record['created_at'] = parse_datetime(record['created_at']) if record.get('created_at') else timezone.now()
+            records.append(record)
+
+    writer = buffer or _buffer
+    try:
+        writer._write(records)
+    except DatabaseError:
+        # БД всё ещё недоступна — возвращаем записи в spool
+        with open(replaying, encoding='utf-8') as spool, open(path, 'a', encoding='utf-8') as target:
+            target.write(spool.read())
+        os.remove(replaying)
+        return 0
+
+    os.remove(replaying)
+    writer.counters['replayed'] += len(records)
+    _add_shared_stat('replayed', len(records))
+    return len(records)
+
+
+# ----------------------------
+# Дневная свёртка (SearchTermDaily)
+# ----------------------------
+
+TERM_COUNTS_BATCH = 300  # по три параметра на строку: в пределах лимита SQLite
+
+
+def record_term_counts(records):
+    """
+    Прибавляет записи к счётчикам SearchTermDaily (term, дата) одним
+    INSERT ... ON CONFLICT DO UPDATE на пачку: существующие строки
+    увеличиваются на месте, без чтения и гонки между процессами.
+    """
+    from .models import SearchTermDaily
+
+    counts = Counter(
+        (timezone.localdate(record['created_at']), record['term'])
+        for record in records
+    )
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    table = quote(SearchTermDaily._meta.db_table)
+    rows = [(date, term, count) for (date, term), count in counts.items()]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), TERM_COUNTS_BATCH):
+            batch = rows[start:start + TERM_COUNTS_BATCH]
+            cursor.execute(
+                f'INSERT INTO {table} ({quote("date")}, {quote("term")}, {quote("count")}) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT ({quote("date")}, {quote("term")}) '
+                f'DO UPDATE SET {quote("count")} = {table}.{quote("count")} + EXCLUDED.{quote("count")}',
+                [value for row in batch for value in row],
+            )
+
+
+def popular_searches(days=30, limit=10):
+    """Топ запросов за последние days дней, включая сегодня: [{'term': ..., 'count': ...}]."""
+    from .models import SearchTermDaily
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return list(
+        SearchTermDaily.objects.filter(date__gte=since)
+        .values('term')
+        .annotate(count=Sum('count'))
+        .order_by('-count', 'term')[:limit]
+    )
+
+
+# ----------------------------
+# Буфер процесса
+# ----------------------------
+
+_buffer = SearchLogBuffer()
+
+
+def log_search(term, user=None, ip_address=None, user_agent=''):
+    """Ставит поисковый запрос в очередь на запись (не блокирует запрос)."""
+    _buffer.add({
+        'term': term[:255],
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'ip_address': ip_address,
+        'user_agent': (user_agent or '')[:255],
+        'created_at': timezone.now(),
+    })
+
+
+def flush():
+    return _buffer.flush()
+
+
+def stats():
+    return _buffer.stats()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        _buffer.stop()
+    except Exception:
+        logger.exception('Search log flush on shutdown failed')
@@ -0,0 +1,156 @@
+"""
+Единый источник данных сайдбара.
+
+Сайдбар состоит из независимых блоков (категории, статистика вопросов,
+популярные теги, задачи, популярные запросы). Каждый блок:
+
+- вычисляется только при первом обращении из шаблона или кода;
+- запоминается на время запроса (повторные обращения бесплатны);
+- хранится в общем кэше со своим TTL, поэтому на прогретом кэше
+  сайдбар не делает ни одного запроса к БД. Блоки, зависящие от
+  содержимого, хранятся вместе с версиями своих источников (категории,
+  теги, счётчики, задачи — см. qa_app.versioning): блок пересчитывается
+  сразу после изменения своих источников, остальные блоки остаются в кэше.
+  Пересчёт защищён от лавины запросов (qa_app.caching): считает один
+  процесс, остальные получают предыдущее значение.
+
+В контекст шаблона попадают не значения, а методы провайдера: шаблонизатор
+Django вызывает их сам при обращении к переменной, так что блок, который
+шаблон не использует, не вычисляется вовсе.
+"""
+from django.core.cache import cache
+
+from . import counters
+from .caching import get_or_compute
+from .versioning import SIDEBAR_CATEGORIES, SIDEBAR_COUNTERS, SIDEBAR_TAGS, SIDEBAR_TASKS, get_version
+
+
+CACHE_PREFIX = 'qa:sidebar'
+
+
+# ----------------------------
+# Блоки
+# ----------------------------
+
+def build_categories():
+    return counters.categories_with_counts()
+
+
+def build_question_stats():
+    return counters.question_totals()
+
+
+def build_popular_tags():
+    return counters.popular_tags(limit=10)
+
+
+def build_tasks():
+    from .models import Task
+
+    return {
+        'total': Task.objects.count(),
+        'recent': list(Task.objects.select_related('author').order_by('-created_at')[:5]),
+    }
+
+
+def build_popular_searches():
+    from .search_log import popular_searches
+
+    return popular_searches(days=30, limit=10)
+
+
+# Имя блока -> (функция, TTL в секундах, источники, от версий которых он зависит)
+BLOCKS = {
+    'categories': (build_categories, 60 * 15, (SIDEBAR_CATEGORIES, SIDEBAR_COUNTERS)),
+    'question_stats': (build_question_stats, 60 * 5, (SIDEBAR_COUNTERS,)),
+    'popular_tags': (build_popular_tags, 60 * 15, (SIDEBAR_TAGS, SIDEBAR_COUNTERS)),
+    'tasks': (build_tasks, 60 * 5, (SIDEBAR_TASKS,)),
+    'popular_searches': (build_popular_searches, 60 * 60, ()),
+}
+
+
+def block_key(name):
+    return f'{CACHE_PREFIX}:{name}'
+
+
+def invalidate(*names):
+    """Сбрасывает блоки в общем кэше (без аргументов — все)."""
+    cache.delete_many([block_key(name) for name in names or BLOCKS])
+
+
+# ----------------------------
+# Провайдер
+# ----------------------------
+
+class SidebarProvider:
+    """Ленивые блоки сайдбара, запомненные на время одного запроса."""
+
+    def __init__(self):
+        self._blocks = {}
+
+    def block(self, name):
+        if name not in self._blocks:
+            build, timeout, sources = BLOCKS[name]
+            version = tuple(get_version(source) for source in sources) or None
+            self._blocks[name] = get_or_compute(block_key(name), build, timeout, version=version)
+        return self._blocks[name]
+
+    # Отдельные значения (вызываются шаблоном лениво)
+
+    def categories(self):
+        return self.block('categories')
+
+    def question_count(self):
+        return self.block('question_stats')['total']
+
+    def answered_count(self):
+        return self.block('question_stats')['answered']
+
+    def unanswered_count(self):
+        return self.block('question_stats')['unanswered']
+
+    def popular_tags(self):
+        return self.block('popular_tags')
+
+    def total_tasks(self):
+        return self.block('tasks')['total']
+
+    def recent_tasks(self):
+        return self.block('tasks')['recent']
+
+    def popular_searches(self):
+        return self.block('popular_searches')
+
+    def context(self):
+        """Переменные для шаблонов со сайдбаром (_sidebar_content.html)."""
+        return {
+            'categories': self.categories,
+            'question_count': self.question_count,
+            'answered_count': self.answered_count,
+            'unanswered_count': self.unanswered_count,
+            'popular_tags': self.popular_tags,
+            'sidebar_total_tasks': self.total_tasks,
+            'sidebar_recent_tasks': self.recent_tasks,
+        }
+
+    def global_context(self):
+        """Переменные для всех шаблонов (categories_sidebar.html, base.html)."""
+        return {
+            'sidebar': self,
+            'sidebar_categories': self.categories,
+            'sidebar_question_count': self.question_count,
+            'sidebar_answered_count': self.answered_count,
+            'sidebar_unanswered_count': self.unanswered_count,
+            'sidebar_popular_tags': self.popular_tags,
+            'sidebar_total_tasks': self.total_tasks,
+            'sidebar_recent_tasks': self.recent_tasks,
+            'popular_searches': self.popular_searches,
+        }
+
+
+def get_sidebar(request):
+    """Провайдер сайдбара текущего запроса (один на запрос)."""
+    provider = getattr(request, '_sidebar', None)
+    if provider is None:
+        provider = request._sidebar = SidebarProvider()
+    return provider
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_delete
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save, m2m_changed
 from django.dispatch import receiver
 import os
-from .models import AttachedFile
+from .models import AttachedFile, Category, Question, SimilarQuestion, Tag, Task, TaskNote
+from . import counters, extraction, pagecache, search, similarity
+from .versioning import SIDEBAR_CATEGORIES, SIDEBAR_TAGS, SIDEBAR_TASKS, bump_sidebar
 
 
 @receiver(post_delete, sender=AttachedFile)
@@ -18,4 +21,303 @@ def delete_file_on_delete(sender, instance, **kwargs):
         else:
             print(f"⚠️ Файл не существует на диске: {file_path}")
     else:
-        print("⚠️ У объекта нет файла для удаления")
\ No newline at end of file
+        print("⚠️ У объекта нет файла для удаления")
+
+
+# ----------------------------
+# Поисковый индекс, подсказки и версия содержимого (кэш поиска)
+# ----------------------------
+
+@receiver(post_save, sender=Question)
+def index_question_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'content', 'answer', 'is_published'} & set(update_fields):
+        return  # например, save(update_fields=['views']) — текст не менялся
+    search.publish_changes(question_ids=[instance.pk])
+
+
+@receiver(pre_delete, sender=Question)
+def remember_question_tags(sender, instance, **kwargs):
+    # Связи удалятся каскадом — веса этих тегов в подсказках нужно пересчитать
+    instance._tag_ids = list(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Question)
+def unindex_question_on_delete(sender, instance, **kwargs):
+    search.publish_changes(question_ids=[instance.pk], tag_ids=getattr(instance, '_tag_ids', []))
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def reindex_question_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # При очистке pk_set не передаётся — запоминаем другую сторону связи заранее
+        if reverse:
+            instance._question_ids = list(instance.question_set.values_list('id', flat=True))
+        else:
+            instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        question_ids = [instance.pk]
+        tag_ids = getattr(instance, '_cleared_tag_ids', []) if action == 'post_clear' else list(pk_set or [])
+    else:
+        question_ids = getattr(instance, '_question_ids', []) if action == 'post_clear' else list(pk_set or [])
+        tag_ids = [instance.pk]
+    # Веса тегов в подсказках — число опубликованных вопросов с тегом
+    search.publish_changes(question_ids=question_ids, tag_ids=tag_ids)
+    similarity.schedule_refresh(question_ids)
+
+
+@receiver(post_save, sender=Tag)
+def reindex_tag_on_save(sender, instance, created, **kwargs):
+    if created:
+        search.publish_changes(tag_ids=[instance.pk])
+    else:
+        question_ids = list(instance.question_set.values_list('id', flat=True))
+        search.publish_changes(question_ids=question_ids, tag_ids=[instance.pk])
+        similarity.schedule_refresh(question_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_questions(sender, instance, **kwargs):
+    instance._question_ids = list(instance.question_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_tag_on_delete(sender, instance, **kwargs):
+    question_ids = getattr(instance, '_question_ids', [])
+    search.publish_changes(question_ids=question_ids, tag_ids=[instance.pk])
+    similarity.schedule_refresh(question_ids)
+
+
+# ----------------------------
+# Похожие вопросы (qa_app.similarity)
+# ----------------------------
+
+@receiver(post_save, sender=Question)
+def refresh_similar_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'title', 'content', 'is_published'} & set(update_fields):
+        return
+    similarity.schedule_refresh([instance.pk])
+
+
+@receiver(pre_delete, sender=Question)
+def remember_similar_links(sender, instance, **kwargs):
+    # Ссылки на вопрос удалятся каскадом — запоминаем, чьи списки пересчитать
+    instance._similar_to = list(SimilarQuestion.objects.filter(similar=instance).values_list('question_id', flat=True))
+
+
+@receiver(post_delete, sender=Question)
+def refresh_similar_on_delete(sender, instance, **kwargs):
+    similarity.schedule_refresh(getattr(instance, '_similar_to', []))
+
+
+# ----------------------------
+# Счётчики вопросов по категориям и тегам (qa_app.counters)
+# ----------------------------
+
+@receiver(pre_save, sender=Question)
+def remember_question_counters(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        instance._counter_state = None
+        return
+    if update_fields is not None and not counters.COUNTED_FIELDS & set(update_fields):
+        instance._counter_state = counters.question_state(instance)  # счётчики не меняются
+        return
+    instance._counter_state = counters.stored_question_state(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def update_question_counters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = getattr(instance, '_counter_state', None)
+    new_state = counters.question_state(instance)
+    if old_state == new_state:
+        return
+    # Теги влияют на счётчики, только если изменилась публикация
+    tag_ids = ()
+    if old_state is not None and old_state[0] != new_state[0]:
+        tag_ids = list(instance.tags.values_list('id', flat=True))
+    counters.apply_deltas(counters.state_deltas(old_state, new_state, tag_ids))
+    instance._counter_state = new_state
+
+
+@receiver(pre_delete, sender=Question)
+def remember_deleted_question_counters(sender, instance, **kwargs):
+    # Связи с тегами удаляются каскадом без m2m_changed — запоминаем их заранее
+    state = counters.stored_question_state(instance.pk)
+    tag_ids = list(instance.tags.values_list('id', flat=True)) if state and state[0] else ()
+    instance._counter_deltas = counters.state_deltas(state, None, tag_ids)
+
+
+@receiver(post_delete, sender=Question)
+def update_deleted_question_counters(sender, instance, **kwargs):
+    counters.apply_deltas(getattr(instance, '_counter_deltas', {}))
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def update_tag_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if not reverse:
+        # instance — вопрос, pk_set — теги
+        if not instance.is_published:
+            return
+        tag_ids = pk_set if action != 'pre_clear' else instance.tags.values_list('id', flat=True)
+        counters.apply_deltas(counters.tag_deltas(list(tag_ids), sign))
+        return
+    # instance — тег, pk_set — вопросы
+    questions = Question.objects.filter(is_published=True)
+    if action == 'pre_clear':
+        questions = questions.filter(tags=instance)
+    else:
+        questions = questions.filter(pk__in=pk_set or [])
+    count = questions.count()
+    if count:
+        counters.apply_deltas({(counters.KIND_TAG, instance.pk): sign * count})
+
+
+@receiver(post_delete, sender=Tag)
+def drop_tag_counter(sender, instance, **kwargs):
+    counters.drop(counters.KIND_TAG, instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def drop_category_counter(sender, instance, **kwargs):
+    # Вопросы остаются без категории (SET_NULL), общий счётчик не меняется
+    counters.drop(counters.KIND_CATEGORY, instance.pk)
+
+
+# ----------------------------
+# Версии сайдбара (блоки qa_app.sidebar и фрагменты qa_app.fragments);
+# изменения счётчиков увеличивают их в counters.apply_deltas
+# ----------------------------
+
+SIDEBAR_SOURCES = {
+    Category: SIDEBAR_CATEGORIES,
+    Tag: SIDEBAR_TAGS,
+    Task: SIDEBAR_TASKS,
+}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def bump_sidebar_version(sender, **kwargs):
+    bump_sidebar(SIDEBAR_SOURCES[sender])
+
+
+# ----------------------------
+# Файлы: извлечение текста и индекс файлов
+# ----------------------------
+
+@receiver(post_save, sender=AttachedFile)
+def extract_attachment_on_save(sender, instance, created, update_fields=None, **kwargs):
+    search.publish_changes(file_ids=[instance.pk])
+    if created or update_fields is None or 'file' in update_fields:
+        extraction.schedule_extraction(instance.pk)
+
+
+@receiver(post_delete, sender=AttachedFile)
+def unindex_attachment_on_delete(sender, instance, **kwargs):
+    search.publish_changes(file_ids=[instance.pk])
+
+
+# ----------------------------
+# Кэш страниц (qa_app.pagecache): сброс по суррогатным ключам после коммита
+# ----------------------------
+
+def question_page_keys(question_ids):
+    return [f'question:{question_id}' for question_id in question_ids if question_id is not None]
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def purge_question_pages(sender, instance, **kwargs):
+    pagecache.purge_on_commit('questions', *question_page_keys([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def purge_question_tag_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        question_ids = [instance.pk]
+    elif action == 'post_clear':
+        question_ids = getattr(instance, '_question_ids', [])
+    else:
+        question_ids = pk_set or []
+    pagecache.purge_on_commit('questions', *question_page_keys(question_ids))
+
+
+@receiver(post_save, sender=Tag)
+def purge_tag_pages_on_save(sender, instance, created, **kwargs):
+    if not created:
+        question_ids = instance.question_set.values_list('id', flat=True)
+        pagecache.purge_on_commit('questions', *question_page_keys(question_ids))
+
+
+@receiver(post_delete, sender=Tag)
+def purge_tag_pages_on_delete(sender, instance, **kwargs):
+    pagecache.purge_on_commit('questions', *question_page_keys(getattr(instance, '_question_ids', [])))
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_slug(sender, instance, **kwargs):
+    instance._old_slug = Category.objects.filter(pk=instance.pk).values_list('slug', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_old_slug', None)} - {None}
+    pagecache.purge_on_commit('questions', *(f'category:{slug}' for slug in slugs))
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_question(sender, instance, **kwargs):
+    instance._old_question_id = Task.objects.filter(pk=instance.pk).values_list('question_id', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def purge_task_pages(sender, instance, **kwargs):
+    # Связанные задачи показываются на странице вопроса
+    question_ids = {instance.question_id, getattr(instance, '_old_question_id', None)}
+    pagecache.purge_on_commit('tasks', f'task:{instance.pk}', *question_page_keys(question_ids))
+
+
+def task_question_id(task_id):
+    return Task.objects.filter(pk=task_id).values_list('question_id', flat=True).first()
+
+
+@receiver(post_save, sender=TaskNote)
+@receiver(post_delete, sender=TaskNote)
+def purge_note_pages(sender, instance, **kwargs):
+    keys = question_page_keys([task_question_id(instance.task_id)])
+    pagecache.purge_on_commit('tasks', f'task:{instance.task_id}', *keys)
+
+
+@receiver(post_save, sender=AttachedFile)
+@receiver(post_delete, sender=AttachedFile)
+def purge_file_pages(sender, instance, **kwargs):
+    model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+    if model is Question:
+        pagecache.purge_on_commit(*question_page_keys([instance.object_id]))
+        return
+    if model is Task:
+        task_id = instance.object_id
+    elif model is TaskNote:
+        task_id = TaskNote.objects.filter(pk=instance.object_id).values_list('task_id', flat=True).first()
+    else:
+        return
+    if task_id is not None:
+        # 'tasks' — число файлов задач на главной (qa_app.homepage)
+        pagecache.purge_on_commit('tasks', f'task:{task_id}', *question_page_keys([task_question_id(task_id)]))
@@ -0,0 +1,375 @@
+"""
+Похожие вопросы (MinHash).
+
+Вопрос описывается множеством признаков: слова заголовка и текста, пары
+соседних слов заголовка и теги. MinHash-сигнатура из NUM_PERM чисел
+сохраняет сходство Жаккара этих множеств: доля совпавших позиций двух
+сигнатур — его оценка. Сигнатуры считаются в NumPy пачками по BATCH_SIZE
+вопросов и хранятся в QuestionSignature (512 байт на вопрос), а для каждого
+вопроса — TOP_K ближайших соседей в SimilarQuestion. Страница вопроса
+читает их одним запросом по индексу (question, -score).
+
+Соседи ищутся не перебором всех сигнатур, а среди кандидатов LSH: сигнатура
+режется на полосы, хеш каждой полосы — корзина (SignatureBucket, индекс по
+bucket). Кандидаты вопроса — вопросы, с которыми у него есть общая корзина.
+
+При изменении вопроса или его тегов signals.py ставит его в очередь
+SimilarityRefresh в той же транзакции; запрос на это не тратит ничего,
+кроме INSERT. `manage.py refresh_similar` (по cron) разбирает очередь:
+refresh() пересчитывает сигнатуры и списки соседей только тех вопросов,
+на которые изменение может повлиять: его самого, ссылавшихся на него и
+кандидатов, для кого он теперь входит в top-k. Полный пересчёт —
+`manage.py rebuild_similar`.
+"""
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .pagecache import purge_on_commit
+from .search import tokenize
+
+
+DEFAULTS = {
+    'TOP_K': 10,
+    'MIN_SCORE': 0.05,
+    'BATCH_SIZE': 200,
+}
+
+NUM_PERM = 128
+MIN_TOKEN_LENGTH = 3  # короче — в основном предлоги и союзы
+
+# Хеш-функции вида (a * x + b) mod p; seed фиксирован, чтобы сигнатуры
+# совпадали во всех процессах и между запусками
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = np.random.default_rng(20261017)
+_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+# Сколько позиций сигнатур сравнивать за один шаг (ограничивает память)
+COMPARE_CELLS = 1 << 24
+
+# LSH: сигнатура режется на BANDS полос по BAND_ROWS позиций, хеш полосы —
+# корзина. Вопросы со сходством s делят хотя бы одну корзину с вероятностью
+# 1 - (1 - s ** BAND_ROWS) ** BANDS: 0.47 при s = 0.1, 0.93 при 0.2, 0.998 при 0.3
+BANDS = 64
+BAND_ROWS = NUM_PERM // BANDS
+# Вопросов на один запрос корзин (BANDS параметров на вопрос)
+LSH_QUERY_QUESTIONS = 50
+
+
+def get_setting(name):
+    return getattr(settings, 'QA_SIMILAR', {}).get(name, DEFAULTS[name])
+
+
+# ----------------------------
+# Признаки и сигнатуры
+# ----------------------------
+
+def features(title, content, tag_names=()):
+    """Множество признаков вопроса: слова, пары слов заголовка, теги."""
+    title_words = [word for word in tokenize(title) if len(word) >= MIN_TOKEN_LENGTH]
+    result = set(title_words)
+    result.update(word for word in tokenize(content) if len(word) >= MIN_TOKEN_LENGTH)
+    result.update(f'{first} {second}' for first, second in zip(title_words, title_words[1:]))
+    result.update(f'tag:{name.lower()}' for name in tag_names)
+    return result
+
+
+def signature(feature_set):
+    """MinHash-сигнатура множества признаков: массив uint32 длины NUM_PERM."""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'big') for value in feature_set),
+        dtype=np.uint64, count=len(feature_set),
+    )
+    permuted = ((hashes[:, None] * _A + _B) % _PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def to_bytes(row):
+    return row.astype('<u4').tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+def band_buckets(data):
+    """LSH-корзины сигнатуры в виде to_bytes(): по одной на каждую полосу (int64)."""
+    width = BAND_ROWS * 4
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + data[band * width:(band + 1) * width], digest_size=8).digest(),
+            'big', signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarities(rows, matrix):
+    """Оценки сходства Жаккара: строки rows (m × NUM_PERM) против matrix (n × NUM_PERM)."""
+    result = np.empty((len(rows), len(matrix)), dtype=np.float32)
+    step = max(1, COMPARE_CELLS // max(1, matrix.size))
+    for start in range(0, len(rows), step):
+        chunk = rows[start:start + step]
+        result[start:start + step] = (chunk[:, None, :] == matrix[None, :, :]).mean(axis=2)
+    return result
+
+
+def top_neighbors(scores, ids, own_id, k=None, min_score=None):
+    """[(id, сходство)] k лучших по scores, без own_id и ниже min_score."""
+    k = k or get_setting('TOP_K')
+    min_score = get_setting('MIN_SCORE') if min_score is None else min_score
+    scores = np.where(ids == own_id, -1.0, scores)
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return [(int(ids[i]), float(scores[i])) for i in best if scores[i] >= min_score]
+
+
+# ----------------------------
+# Загрузка из БД
+# ----------------------------
+
+def question_batches(question_ids=None):
+    """Пачки [(id, признаки)] опубликованных вопросов (всех или question_ids)."""
+    from .models import Question
+
+    questions = Question.objects.filter(is_published=True).order_by('pk')
+    if question_ids is not None:
+        questions = questions.filter(pk__in=question_ids)
+    batch_size = get_setting('BATCH_SIZE')
+    last_id = 0
+    while True:
+        rows = list(questions.filter(pk__gt=last_id).values_list('pk', 'title', 'content')[:batch_size])
+        if not rows:
+            return
+        tag_names = defaultdict(list)
+        tag_rows = Question.tags.through.objects.filter(
+            question_id__in=[pk for pk, _, _ in rows]
+        ).values_list('question_id', 'tag__name')
+        for question_id, name in tag_rows:
+            tag_names[question_id].append(name)
+        yield [(pk, features(title, content, tag_names[pk])) for pk, title, content in rows]
+        last_id = rows[-1][0]
+
+
+def batch_signatures(batch):
+    """{id: сигнатура} для пачки; вопросы без признаков пропускаются."""
+    return {pk: signature(feature_set) for pk, feature_set in batch if feature_set}
+
+
+def load_signatures(question_ids):
+    """{id: сигнатура} сохранённых сигнатур опубликованных вопросов из question_ids."""
+    from .models import QuestionSignature
+
+    signatures = {}
+    question_ids = sorted(question_ids)
+    batch_size = get_setting('BATCH_SIZE')
+    for start in range(0, len(question_ids), batch_size):
+        rows = QuestionSignature.objects.filter(
+            question_id__in=question_ids[start:start + batch_size], question__is_published=True
+        ).values_list('question_id', 'signature')
+        signatures.update((question_id, from_bytes(data)) for question_id, data in rows)
+    return signatures
+
+
+def bucket_candidates(question_ids):
+    """
+    {id: множество id вопросов с общей LSH-корзиной} для question_ids
+    (по сохранённым SignatureBucket; сам вопрос в множество входит).
+    """
+    from .models import SignatureBucket
+
+    candidates = defaultdict(set)
+    question_ids = sorted(question_ids)
+    for start in range(0, len(question_ids), LSH_QUERY_QUESTIONS):
+        own = defaultdict(set)
+        rows = SignatureBucket.objects.filter(
+            question_id__in=question_ids[start:start + LSH_QUERY_QUESTIONS]
+        ).values_list('bucket', 'question_id')
+        for bucket, question_id in rows:
+            own[bucket].add(question_id)
+        if not own:
+            continue
+        members = SignatureBucket.objects.filter(bucket__in=list(own)).values_list('bucket', 'question_id')
+        for bucket, member_id in members:
+            for question_id in own[bucket]:
+                candidates[question_id].add(member_id)
+    return candidates
+
+
+def _neighbor_links(question_ids, signatures, candidates):
+    """SimilarQuestion для question_ids: top-k среди кандидатов candidates по сигнатурам signatures."""
+    from .models import SimilarQuestion
+
+    links = []
+    for question_id in question_ids:
+        row = signatures.get(question_id)
+        others = sorted(other for other in candidates.get(question_id, ()) if other != question_id and other in signatures)
+        if row is None or not others:
+            continue
+        scores = similarities(row[None, :], np.vstack([signatures[other] for other in others]))[0]
+        links.extend(
+            SimilarQuestion(question_id=question_id, similar_id=similar_id, score=score)
+            for similar_id, score in top_neighbors(scores, np.array(others, dtype=np.int64), question_id)
+        )
+    return links
+
+
+def _store_signatures(signatures):
+    """Создаёт QuestionSignature и SignatureBucket для {id: сигнатура}."""
+    from .models import QuestionSignature, SignatureBucket
+
+    rows = {pk: to_bytes(row) for pk, row in signatures.items()}
+    QuestionSignature.objects.bulk_create([QuestionSignature(question_id=pk, signature=data) for pk, data in rows.items()])
+    SignatureBucket.objects.bulk_create(
+        [SignatureBucket(question_id=pk, bucket=bucket) for pk, data in rows.items() for bucket in band_buckets(data)],
+        batch_size=5000,
+    )
+
+
+# ----------------------------
+# Пересчёт
+# ----------------------------
+
+def rebuild():
+    """Пересчитывает все сигнатуры и списки соседей; возвращает (вопросов, связей)."""
+    from .models import QuestionSignature, SignatureBucket, SimilarityRefresh, SimilarQuestion
+
+    with transaction.atomic():
+        SignatureBucket.objects.all().delete()
+        QuestionSignature.objects.all().delete()
+        signatures = {}
+        for batch in question_batches():
+            fresh = batch_signatures(batch)
+            _store_signatures(fresh)
+            signatures.update(fresh)
+
+        # Кандидаты — по корзинам в памяти, без запросов на каждый вопрос
+        members = defaultdict(set)
+        own = {}
+        for pk, row in signatures.items():
+            own[pk] = band_buckets(to_bytes(row))
+            for bucket in own[pk]:
+                members[bucket].add(pk)
+        candidates = {pk: set().union(*(members[bucket] for bucket in buckets)) for pk, buckets in own.items()}
+
+        SimilarQuestion.objects.all().delete()
+        links = _neighbor_links(sorted(signatures), signatures, candidates)
+        SimilarQuestion.objects.bulk_create(links, batch_size=1000)
+        SimilarityRefresh.objects.all().delete()
+    return len(signatures), len(links)
+
+
+def refresh(question_ids):
+    """
+    Пересчитывает сигнатуры question_ids и списки соседей, которые они затрагивают.
+    Кандидаты в соседи выбираются по LSH-корзинам, а не перебором всех сигнатур.
+    Возвращает число вопросов, чьи списки пересчитаны.
+    """
+    from .models import QuestionSignature, SignatureBucket, SimilarQuestion
+
+    question_ids = set(question_ids)
+    if not question_ids:
+        return 0
+    k, min_score = get_setting('TOP_K'), get_setting('MIN_SCORE')
+
+    with transaction.atomic():
+        fresh = {}
+        for batch in question_batches(question_ids):
+            fresh.update(batch_signatures(batch))
+        SignatureBucket.objects.filter(question_id__in=question_ids).delete()
+        QuestionSignature.objects.filter(pk__in=question_ids).delete()
+        _store_signatures(fresh)
+
+        # Сами вопросы и те, у кого они были в соседях
+        affected = question_ids | set(
+            SimilarQuestion.objects.filter(similar_id__in=question_ids).values_list('question_id', flat=True)
+        )
+
+        # Те кандидаты, для кого изменённый вопрос теперь лучше k-го соседа
+        fresh_candidates = bucket_candidates(fresh)
+        near = set().union(*fresh_candidates.values()) - question_ids
+        signatures = load_signatures(near | set(fresh))
+        thresholds = dict.fromkeys(near, min_score)
+        full_lists = (
+            SimilarQuestion.objects.filter(question_id__in=near).values('question_id')
+            .annotate(n=Count('id'), low=Min('score')).filter(n__gte=k).order_by()
+        )
+        for row in full_lists:
+            thresholds[row['question_id']] = max(row['low'], min_score)
+        for pk, candidates in fresh_candidates.items():
+            others = sorted((candidates - question_ids) & signatures.keys())
+            if pk not in signatures or not others:
+                continue
+            scores = similarities(signatures[pk][None, :], np.vstack([signatures[other] for other in others]))[0]
+            affected.update(other for other, score in zip(others, scores) if score > thresholds[other])
+
+        candidates = bucket_candidates(affected)
+        signatures.update(load_signatures(set().union(*candidates.values()) - signatures.keys()))
+
+        SimilarQuestion.objects.filter(question_id__in=affected).delete()
+        SimilarQuestion.objects.bulk_create(_neighbor_links(sorted(affected), signatures, candidates), batch_size=1000)
+        # Списки похожих показываются на страницах вопросов
+        purge_on_commit(*(f'question:{question_id}' for question_id in affected))
+    return len(affected)
+
+
+# ----------------------------
+# Очередь пересчёта (signals.py -> manage.py refresh_similar)
+# ----------------------------
+
+def schedule_refresh(question_ids):
+    """
+    Ставит вопросы в очередь пересчёта (вызывается из signals.py). Строки
+    пишутся в той же транзакции, что и изменение, поэтому не теряются
+    и не видны обработчику до коммита.
+    """
+    from .models import SimilarityRefresh
+
+    question_ids = set(question_ids)
+    if question_ids:
+        SimilarityRefresh.objects.bulk_create([SimilarityRefresh(question_id=pk) for pk in sorted(question_ids)])
+
+
+def process_queue(batch_size=None):
+    """
+    Обрабатывает очередь пачками по batch_size вопросов до опустошения.
+    Возвращает (обработано вопросов, пересчитано списков).
+    """
+    from .models import SimilarityRefresh
+
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    processed = recomputed = 0
+    while True:
+        rows = list(SimilarityRefresh.objects.order_by('pk').values_list('pk', 'question_id')[:batch_size])
+        if not rows:
+            return processed, recomputed
+        question_ids = {question_id for _, question_id in rows}
+        with transaction.atomic():
+            recomputed += refresh(question_ids)
+            # Удаляются только взятые строки: вопрос, изменённый во время пересчёта,
+            # останется в очереди до следующего прохода
+            SimilarityRefresh.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        processed += len(question_ids)
+
+
+# ----------------------------
+# Чтение
+# ----------------------------
+
+def similar_questions(question, limit=5):
+    """Похожие опубликованные вопросы из заранее посчитанного списка (один запрос)."""
+    from .models import SimilarQuestion
+
+    links = SimilarQuestion.objects.filter(
+        question=question, similar__is_published=True
+    ).select_related('similar').order_by('-score')[:limit]
+    return [link.similar for link in links]
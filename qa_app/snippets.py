@@ -0,0 +1,151 @@
+"""
+Фрагменты (сниппеты) с подсветкой для страницы результатов поиска.
+
+Для каждого документа текст проходится регулярным выражением один раз:
+собираются позиции совпадений со словами запроса, выбирается окно
+фиксированной длины с наибольшим числом разных слов запроса, и только
+оно экранируется и размечается <mark>. Регулярное выражение строится
+один раз на запрос, а фрагменты всей страницы готовятся одним вызовом
+build_snippets().
+"""
+import html
+import re
+from functools import lru_cache
+
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .search import tokenize
+
+
+CONTENT_WINDOW = 240
+ANSWER_WINDOW = 160
+MARK_OPEN = '<mark class="highlight">'
+MARK_CLOSE = '</mark>'
+ELLIPSIS = '…'
+
+# Для фрагментов достаточно грубого удаления тегов: оно в разы быстрее
+# strip_tags(), который разбирает HTML полноценным парсером
+TAG_RE = re.compile(r'<[^>]*>')
+
+
+def term_pattern(term):
+    """Шаблон слова запроса: tokenize() заменяет ё на е, поэтому е совпадает с обеими."""
+    return re.escape(term).replace('е', '[её]')
+
+
+@lru_cache(maxsize=256)
+def query_pattern(query):
+    """Регулярное выражение для слов запроса (слово совпадает по началу)."""
+    terms = sorted(set(tokenize(query)), key=len, reverse=True)
+    if not terms:
+        return None
+    alternatives = '|'.join(term_pattern(term) for term in terms)
+    return re.compile(rf'(?<!\w)(?:{alternatives})\w*', re.IGNORECASE)
+
+
+def plain_text(value):
+    """HTML -> простой текст с одиночными пробелами."""
+    if not value:
+        return ''
+    return ' '.join(html.unescape(TAG_RE.sub(' ', value)).split())
+
+
+def _normalized(word):
+    return word.lower().replace('ё', 'е')
+
+
+def best_window(matches, width):
+    """
+    Выбирает окно [start, end) шириной не более width, покрывающее
+    максимум разных слов запроса (при равенстве — больше совпадений).
+    matches — список (start, end, слово) в порядке следования.
+    """
+    best = (0, 0, 0, 0)  # (разных слов, совпадений, start, end)
+    left = 0
+    counts = {}
+    for right, (start, end, word) in enumerate(matches):
+        counts[word] = counts.get(word, 0) + 1
+        while end - matches[left][0] > width:
+            left_word = matches[left][2]
+            counts[left_word] -= 1
+            if not counts[left_word]:
+                del counts[left_word]
+            left += 1
+        candidate = (len(counts), right - left + 1, matches[left][0], end)
+        if candidate[:2] > best[:2]:
+            best = candidate
+    return best[2], best[3]
+
+
+def highlight(text, matches):
+    """Экранирует text и оборачивает совпадения (смещения относительно text) в <mark>."""
+    parts = []
+    position = 0
+    for start, end in matches:
+        parts.append(escape(text[position:start]))
+        parts.append(MARK_OPEN + escape(text[start:end]) + MARK_CLOSE)
+        position = end
+    parts.append(escape(text[position:]))
+    return ''.join(parts)
+
+
+def make_snippet(text, pattern, width=CONTENT_WINDOW, require_match=False):
+    """
+    Возвращает экранированный фрагмент text длиной около width символов
+    вокруг лучшего скопления совпадений, с подсветкой. Если совпадений
+    нет — начало текста (или None при require_match).
+    """
+    if not text:
+        return None if require_match else ''
+    matches = [
+        (match.start(), match.end(), _normalized(match.group()))
+        for match in pattern.finditer(text)
+    ] if pattern else []
+    if not matches:
+        if require_match:
+            return None
+        if len(text) <= width:
+            return mark_safe(escape(text))
+        cut = text.rfind(' ', 0, width)
+        return mark_safe(escape(text[:cut if cut > 0 else width]) + ELLIPSIS)
+
+    match_start, match_end = best_window(matches, width)
+    # Расширяем окно до width, центрируя совпадения, и выравниваем по словам
+    slack = max(width - (match_end - match_start), 0)
+    start = max(match_start - slack // 2, 0)
+    end = min(start + width, len(text))
+    start = max(min(start, end - width), 0)
+    if start > 0:
+        space = text.find(' ', start, match_start)
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(' ', match_end, end)
+        end = space if space != -1 else end
+
+    window = text[start:end]
+    inside = [(s - start, e - start) for s, e, _ in matches if s >= start and e <= end]
+    prefix = ELLIPSIS if start > 0 else ''
+    suffix = ELLIPSIS if end < len(text) else ''
+    return mark_safe(prefix + highlight(window, inside) + suffix)
+
+
+def build_snippets(questions, query, content_width=CONTENT_WINDOW, answer_width=ANSWER_WINDOW):
+    """
+    Готовит фрагменты для страницы результатов одним проходом по каждому полю.
+    Текст берётся из сохранённых Question.content_text / answer_text, поэтому
+    HTML-колонки content и answer можно не загружать.
+    Возвращает {pk: {'title': ..., 'content': ..., 'answer': ... | None}};
+    'answer' заполнен, только если в ответе есть слова запроса.
+    """
+    pattern = query_pattern(query)
+    snippets = {}
+    for question in questions:
+        title = question.title or ''
+        title_matches = [(m.start(), m.end()) for m in pattern.finditer(title)] if pattern else []
+        snippets[question.pk] = {
+            'title': mark_safe(highlight(title, title_matches)),
+            'content': make_snippet(question.content_text, pattern, content_width),
+            'answer': make_snippet(question.answer_text, pattern, answer_width, require_match=True),
+        }
+    return snippets
@@ -0,0 +1,388 @@
+"""
+Автодополнение поискового запроса по заголовкам вопросов и названиям тегов.
+
+Словарь слов хранится в префиксном дереве (trie), а для исправления
+опечаток — в индексе триграмм: слово запроса с одной ошибкой
+(замена, вставка, удаление или перестановка соседних символов)
+находится через общие триграммы и проверку расстояния в одну правку.
+
+Индекс живёт в памяти процесса, строится лениво и перед ответом
+дочитывает изменения из журнала версий содержимого, который сигналы
+публикуют после коммита (см. search.publish_changes и signals.py).
+"""
+import sys
+import threading
+import time
+
+from .search import is_synced, pending_changes, tokenize
+from .versioning import CONTENT, get_version
+
+
+DEFAULT_LIMIT = 8
+MAX_PREFIX_WORDS = 200
+MAX_FUZZY_CANDIDATES = 500
+MIN_FUZZY_LENGTH = 3
+
+# Виды подсказок: тег выше вопроса при равной релевантности
+KIND_QUESTION = 'question'
+KIND_TAG = 'tag'
+KIND_BOOST = {KIND_TAG: 1.0, KIND_QUESTION: 0.0}
+
+
+def within_one_edit(a, b):
+    """
+    True, если строки отличаются не более чем на одну правку:
+    замену, вставку, удаление или перестановку соседних символов.
+    """
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return (
+            i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i]
+            and a[i + 2:] == b[i + 2:]
+        )
+    return a[i:] == b[i + 1:]
+
+
+def trigrams(word, tail=True):
+    """Триграммы слова; без хвостовой триграммы — для поиска по началу слова."""
+    padded = f'  {word} ' if tail else f'  {word}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrieNode:
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+
+class Trie:
+    """Префиксное дерево слов."""
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.node_count = 1
+
+    def insert(self, word):
+        node = self.root
+        for char in word:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = TrieNode()
+                self.node_count += 1
+            node = child
+        node.terminal = True
+
+    def remove(self, word):
+        path = [self.root]
+        for char in word:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].terminal = False
+        # Удаляем опустевшие узлы снизу вверх
+        for depth in range(len(word), 0, -1):
+            node = path[depth]
+            if node.terminal or node.children:
+                break
+            del path[depth - 1].children[word[depth - 1]]
+            self.node_count -= 1
+
+    def words_with_prefix(self, prefix, limit=MAX_PREFIX_WORDS):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        words = []
+        stack = [(node, prefix)]
+        while stack and len(words) < limit:
+            node, word = stack.pop()
+            if node.terminal:
+                words.append(word)
+            for char, child in node.children.items():
+                stack.append((child, word + char))
+        return words
+
+
+class SuggestIndex:
+    """
+    Индекс подсказок.
+
+    entries[key] -> (kind, object_id, text, weight), key = (kind, object_id)
+    word_entries[word] -> множество key, в тексте которых есть слово
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.entries = {}
+        self.entry_words = {}
+        self.word_entries = {}
+        self.trie = Trie()
+        self.trigram_words = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    # ----------------------------
+    # Обновление
+    # ----------------------------
+
+    def add(self, kind, object_id, text, weight=0):
+        key = (kind, object_id)
+        with self._lock:
+            self._remove(key)
+            words = set(tokenize(text))
+            if not words:
+                return
+            self.entries[key] = (kind, object_id, text, weight)
+            self.entry_words[key] = words
+            for word in words:
+                keys = self.word_entries.get(word)
+                if keys is None:
+                    keys = self.word_entries[word] = set()
+                    self.trie.insert(word)
+                    for gram in trigrams(word):
+                        self.trigram_words.setdefault(gram, set()).add(word)
+                keys.add(key)
+
+    def remove(self, kind, object_id):
+        with self._lock:
+            self._remove((kind, object_id))
+
+    def _remove(self, key):
+        if self.entries.pop(key, None) is None:
+            return
+        for word in self.entry_words.pop(key, ()):
+            keys = self.word_entries.get(word)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self.word_entries[word]
+                self.trie.remove(word)
+                for gram in trigrams(word):
+                    words = self.trigram_words.get(gram)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self.trigram_words[gram]
+
+    # ----------------------------
+    # Поиск
+    # ----------------------------
+
+    def _fuzzy_words(self, word, prefix):
+        """Слова словаря на расстоянии одной правки (для prefix — от начала слова)."""
+        if len(word) < MIN_FUZZY_LENGTH:
+            return []
+        grams = trigrams(word, tail=not prefix)
+        counts = {}
+        for gram in grams:
+            for candidate in self.trigram_words.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        # Одна правка (перестановка) портит не более четырёх триграмм
+        needed = max(1, len(grams) - 4)
+        candidates = sorted(
+            (candidate for candidate, count in counts.items() if count >= needed),
+            key=lambda candidate: -counts[candidate]
+        )[:MAX_FUZZY_CANDIDATES]
+        matches = []
+        for candidate in candidates:
+            if prefix:
+                heads = {candidate[:len(word) - 1], candidate[:len(word)], candidate[:len(word) + 1]}
+                if any(within_one_edit(word, head) for head in heads):
+                    matches.append(candidate)
+            elif within_one_edit(word, candidate):
+                matches.append(candidate)
+        return matches
+
+    def _match_word(self, word, prefix):
+        """{key: оценка} для одного слова запроса; точное совпадение ценится выше опечатки."""
+        scores = {}
+        exact = self.trie.words_with_prefix(word) if prefix else (
+            [word] if word in self.word_entries else []
+        )
+        for matched in exact:
+            bonus = 2.0 if matched == word else 1.5
+            for key in self.word_entries.get(matched, ()):
+                scores[key] = max(scores.get(key, 0.0), bonus)
+        if not scores:
+            for matched in self._fuzzy_words(word, prefix):
+                for key in self.word_entries.get(matched, ()):
+                    scores[key] = max(scores.get(key, 0.0), 1.0)
+        return scores
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            scores = None
+            for position, word in enumerate(words):
+                word_scores = self._match_word(word, prefix=position == len(words) - 1)
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {
+                        key: score + word_scores[key]
+                        for key, score in scores.items()
+                        if key in word_scores
+                    }
+                if not scores:
+                    return []
+            ranked = sorted(
+                scores.items(),
+                key=lambda item: (
+                    -(item[1] + KIND_BOOST[item[0][0]]),
+                    -self.entries[item[0]][3],
+                    len(self.entries[item[0]][2]),
+                )
+            )[:limit]
+            return [self.entries[key] for key, _ in ranked]
+
+    # ----------------------------
+    # Статистика
+    # ----------------------------
+
+    def memory_usage(self):
+        """Приблизительный объём памяти структур индекса в байтах."""
+        with self._lock:
+            total = sys.getsizeof(self.entries) + sys.getsizeof(self.entry_words)
+            total += sys.getsizeof(self.word_entries) + sys.getsizeof(self.trigram_words)
+            for key, entry in self.entries.items():
+                total += sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(entry[2])
+            for words in self.entry_words.values():
+                total += sys.getsizeof(words)
+            for word, keys in self.word_entries.items():
+                total += sys.getsizeof(word) + sys.getsizeof(keys)
+            for gram, words in self.trigram_words.items():
+                total += sys.getsizeof(gram) + sys.getsizeof(words)
+            stack = [self.trie.root]
+            while stack:
+                node = stack.pop()
+                total += sys.getsizeof(node) + sys.getsizeof(node.children)
+                stack.extend(node.children.values())
+            return total
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'words': len(self.word_entries),
+            'trie_nodes': self.trie.node_count,
+            'trigrams': len(self.trigram_words),
+            'memory_bytes': self.memory_usage(),
+        }
+
+
+# ----------------------------
+# Индекс процесса
+# ----------------------------
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def build_index():
+    index = SuggestIndex()
+    _add_questions(index, None)
+    _add_tags(index, None)
+    return index
+
+
+def _add_questions(index, question_ids):
+    """Загружает вопросы (все или question_ids); снятые с публикации и удалённые убирает."""
+    from .models import Question
+
+    questions = Question.objects.filter(is_published=True).values_list('id', 'title', 'views')
+    if question_ids is not None:
+        questions = questions.filter(pk__in=question_ids)
+    found = set()
+    for pk, title, views in questions.iterator(chunk_size=5000):
+        index.add(KIND_QUESTION, pk, title, views)
+        found.add(pk)
+    for question_id in set(question_ids or ()) - found:
+        index.remove(KIND_QUESTION, question_id)
+
+
+def _add_tags(index, tag_ids):
+    """Загружает теги (все или tag_ids) с весом — числом опубликованных вопросов."""
+    from django.db.models import Count, Q
+    from .models import Tag
+
+    tags = Tag.objects.all()
+    if tag_ids is not None:
+        tags = tags.filter(pk__in=tag_ids)
+    tags = tags.annotate(
+        usage=Count('question', filter=Q(question__is_published=True))
+    ).values_list('id', 'name', 'usage')
+    found = set()
+    for pk, name, usage in tags.iterator(chunk_size=5000):
+        index.add(KIND_TAG, pk, name, usage)
+        found.add(pk)
+    for tag_id in set(tag_ids or ()) - found:
+        index.remove(KIND_TAG, tag_id)
+
+
+def apply_changes(index, changes):
+    """
+    Дочитывает изменённые вопросы и теги. Вес тега зависит от его вопросов,
+    поэтому пересчитываются и теги изменённых вопросов.
+    """
+    from .models import Question
+
+    tag_ids = set(changes['tags'])
+    if changes['questions']:
+        _add_questions(index, changes['questions'])
+        tag_ids.update(Question.tags.through.objects.filter(
+            question_id__in=changes['questions']
+        ).values_list('tag_id', flat=True))
+    if tag_ids:
+        _add_tags(index, tag_ids)
+
+
+def get_index(version=None):
+    """Индекс процесса, синхронизированный с версией содержимого (как search.get_index)."""
+    global _index, _index_version
+    version = get_version(CONTENT) if version is None else version
+    if _index is not None and is_synced(_index_version, version):
+        return _index
+    with _index_lock:
+        if _index is not None and not is_synced(_index_version, version):
+            changes = pending_changes(_index_version, version)
+            if changes is None:
+                _index = None
+            else:
+                apply_changes(_index, changes)
+            _index_version = version
+        if _index is None:
+            _index = build_index()
+            _index_version = version
+    return _index
+
+
+def reset_index():
+    global _index, _index_version
+    with _index_lock:
+        _index = _index_version = None
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    """Возвращает (подсказки, время в мс)."""
+    started = time.perf_counter()
+    entries = get_index().suggest(query, limit)
+    return entries, (time.perf_counter() - started) * 1000
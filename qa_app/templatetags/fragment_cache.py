@@ -0,0 +1,44 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from qa_app.fragments import cached_fragment
+
+register = template.Library()
+
+
+class CachedIncludeNode(template.Node):
+
+    def __init__(self, template_name, vary_on):
+        self.template_name = template_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.template_name.resolve(context)
+        vary_on = [value.resolve(context) for value in self.vary_on]
+
+        def render_include():
+            included = context.template.engine.get_template(name)
+            with context.push():
+                return included.render(context)
+
+        return mark_safe(cached_fragment(name, vary_on, render_include))
+
+
+@register.tag
+def cached_include(parser, token):
+    """
+    Подключает шаблон как {% include %}, но кэширует готовый HTML.
+
+    {% cached_include 'qa_app/includes/categories_sidebar.html' current_category.slug %}
+
+    После имени шаблона перечисляются значения, от которых зависит разметка
+    фрагмента; версия содержимого добавляется в ключ автоматически
+    (см. qa_app.fragments).
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' требует имя шаблона")
+    return CachedIncludeNode(
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
@@ -139,4 +139,16 @@ def highlight_search(text, query):
     # Ищем с учётом регистра, оборачиваем в <mark>
     regex = re.compile(f'({escaped_query})', re.IGNORECASE)
     highlighted = regex.sub(r'<mark class="highlight">\1</mark>', text)
-    return mark_safe(highlighted)
\ No newline at end of file
+    return mark_safe(highlighted)
+
+
+@register.filter
+def approx_count(value):
+    """
+    Число строк из qa_app.counting: приблизительное выводится со знаком ≈.
+    """
+    if value is None or value == '':
+        return ''
+    if getattr(value, 'is_exact', True):
+        return value
+    return f'≈ {value}'
@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import io
+import math
+import tempfile
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    caching, counters, counting, extraction, homepage, pagecache, search, search_log, similarity, snippets, suggest,
+    trending, view_counter, visitors,
+)
+from .fragments import fragment_stats
+from .models import (
+    AttachedFile, Category, Question, QuestionViewsDaily, SearchQuery, SearchTermDaily, SimilarityRefresh,
+    SimilarQuestion, StatCounter, Tag, Task, TaskNote,
+)
+from .pagination import CursorPaginator, keyset_filter
+from .sidebar import BLOCKS, SidebarProvider
+from .versioning import CONTENT, get_version
+from .views import QuestionDetailView
+
+
+# Сессия и пользователь для авторизованного запроса
+AUTH_QUERIES = 2
+
+
+@override_settings(MEDIA_ROOT='/tmp/qa_app_test_media', QA_PAGE_CACHE={'ENABLED': False})
+class QuestionDetailQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        category = Category.objects.create(name='Категория', slug='category')
+        cls.question = Question.objects.create(
+            title='Вопрос', content='Текст', answer='Ответ', author=cls.staff, category=category
+        )
+        cls.question.tags.add(*[Tag.objects.create(name=f'тег {i}') for i in range(3)])
+        for i in range(3):
+            Question.objects.create(title=f'Похожий {i}', content='Текст', author=cls.staff, category=category)
+        for i in range(3):
+            task = Task.objects.create(title=f'Задача {i}', description='Описание', author=cls.staff, question=cls.question)
+            TaskNote.objects.create(task=task, title='Заметка', content='Текст', author=cls.staff)
+            AttachedFile.objects.create(
+                content_object=task, file=ContentFile(b'data', name=f'task{i}.txt'), uploaded_by=cls.staff, name=f'task{i}'
+            )
+        for i in range(2):
+            AttachedFile.objects.create(
+                content_object=cls.question, file=ContentFile(b'data', name=f'q{i}.txt'), uploaded_by=cls.staff, name=f'q{i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('qa_app:question_detail', args=[self.question.pk])
+
+    def assertWithinBudget(self, budget):
+        self.client.get(self.url)  # прогрев кэша сайдбара и фрагментов
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+        return response
+
+    def test_anonymous(self):
+        self.assertWithinBudget(QuestionDetailView.query_budget)
+
+    def test_staff(self):
+        self.client.force_login(self.staff)
+        self.assertWithinBudget(QuestionDetailView.query_budget + AUTH_QUERIES)
+
+    def test_budget_does_not_grow_with_tasks(self):
+        for i in range(5):
+            task = Task.objects.create(title=f'Ещё {i}', description='Описание', author=self.staff, question=self.question)
+            TaskNote.objects.create(task=task, title='Заметка', content='Текст', author=self.staff)
+        self.assertWithinBudget(QuestionDetailView.query_budget)
+
+
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user', password='secret', is_staff=True)
+        cls.category = Category.objects.create(name='Категория', slug='category')
+        cls.question = Question.objects.create(title='Вопрос', content='Текст', author=cls.user, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('qa_app:question_detail', args=[self.question.pk])
+
+    def test_anonymous_pages_are_cached_until_purged(self):
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.title = 'Новый заголовок'
+            self.question.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Новый заголовок')
+
+    def test_purge_is_limited_to_affected_keys(self):
+        other = Question.objects.create(title='Другой', content='Текст', author=self.user)
+        other_url = reverse('qa_app:question_detail', args=[other.pk])
+        self.client.get(self.url)
+        self.client.get(other_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(title='Задача', author=self.user, question=self.question)
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        # Задачи меняют и сайдбар — он общий для всех страниц
+        self.assertEqual(self.client.get(other_url)['X-Page-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskNote.objects.create(task=Task.objects.get(), content='Текст', author=self.user)
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(other_url)['X-Page-Cache'], 'HIT')
+
+    def test_csrf_token_is_not_shared(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        first = client.get(self.url)
+        second = self.client_class().get(self.url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertNotIn(b'{qa:csrf-token}', second.content)
+        self.assertIn('csrftoken', second.cookies)
+        self.assertNotEqual(first.cookies['csrftoken'].value, second.cookies['csrftoken'].value)
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+
+@override_settings(QA_PAGE_CACHE={'ENABLED': False})
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user', password='secret')
+        cls.question = Question.objects.create(title='Вопрос', content='Текст', author=cls.user)
+        cls.task = Task.objects.create(title='Задача', author=cls.user, question=cls.question)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModifiedUntilChange(self, url, change):
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_question_detail(self):
+        url = reverse('qa_app:question_detail', args=[self.question.pk])
+        self.assertNotModifiedUntilChange(
+            url, lambda: TaskNote.objects.create(task=self.task, content='Текст', author=self.user)
+        )
+
+    def test_question_list(self):
+        self.assertNotModifiedUntilChange(
+            reverse('qa_app:question_list'),
+            lambda: Question.objects.create(title='Ещё вопрос', content='Текст', author=self.user),
+        )
+
+    def test_task_detail(self):
+        url = reverse('qa_app:task_detail', args=[self.task.pk])
+        note = TaskNote.objects.create(task=self.task, content='Текст', author=self.user)
+        self.assertNotModifiedUntilChange(url, note.delete)
+
+
+    def test_no_last_modified(self):
+        # Новая запись задачи не меняет updated_at вопроса — по дате страница казалась бы неизменной
+        url = reverse('qa_app:question_detail', args=[self.question.pk])
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        since = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+class AnsweredFlagTests(TestCase):
+
+    def test_flag_follows_answer_text(self):
+        author = User.objects.create_user(username='author')
+        category = Category.objects.create(name='Категория', slug='category')
+        question = Question.objects.create(title='Вопрос', content='Текст', answer='<p>&nbsp;</p>', author=author, category=category)
+        self.assertFalse(question.is_answered)
+        self.assertIsNone(question.answered_at)
+
+        question.answer = '<p>Ответ</p>'
+        question.save(update_fields=['answer'])
+        question.refresh_from_db()
+        self.assertTrue(question.is_answered)
+        self.assertIsNotNone(question.answered_at)
+        self.assertTrue(Question.objects.filter(pk=question.pk, is_answered=True).exists())
+
+        question.answer = ''
+        question.save()
+        question.refresh_from_db()
+        self.assertFalse(question.is_answered)
+        self.assertIsNone(question.answered_at)
+
+
+class StatCounterTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.category = Category.objects.create(name='Категория', slug='category')
+        self.physics = Tag.objects.create(name='физика')
+        self.optics = Tag.objects.create(name='оптика')
+        self.question = Question.objects.create(
+            title='Вопрос', content='Текст', answer='Ответ', author=self.author, category=self.category
+        )
+        self.draft = Question.objects.create(title='Черновик', content='Текст', author=self.author, is_published=False)
+
+    def assertMatchesRecount(self):
+        stored = {
+            (kind, object_id): value
+            for kind, object_id, value in StatCounter.objects.values_list('kind', 'object_id', 'value')
+            if value
+        }
+        recounted = {key: value for key, value in counters.compute_all().items() if value}
+        self.assertEqual(stored, recounted)
+
+    def test_tags_changed_from_question_side(self):
+        self.question.tags.add(self.physics, self.optics)
+        self.draft.tags.add(self.physics)
+        self.assertMatchesRecount()
+        self.question.tags.remove(self.optics)
+        self.assertMatchesRecount()
+        self.question.tags.clear()
+        self.assertMatchesRecount()
+        self.assertEqual(counters.compute_all()[(counters.KIND_TOTAL, 0)], 1)
+
+    def test_tags_changed_from_tag_side(self):
+        self.physics.question_set.add(self.question, self.draft)
+        self.optics.question_set.add(self.question)
+        self.assertMatchesRecount()
+        self.physics.question_set.remove(self.question)
+        self.assertMatchesRecount()
+        self.optics.question_set.clear()
+        self.assertMatchesRecount()
+
+    def test_publish_toggle(self):
+        self.question.tags.add(self.physics)
+        self.draft.tags.add(self.optics)
+        self.question.is_published = False
+        self.question.save()
+        self.assertMatchesRecount()
+        self.draft.is_published = True
+        self.draft.save()
+        self.assertMatchesRecount()
+        self.question.is_published = True
+        self.question.answer = ''
+        self.question.save()
+        self.assertMatchesRecount()
+
+    def test_delete_question(self):
+        self.question.tags.add(self.physics, self.optics)
+        self.draft.tags.add(self.physics)
+        self.question.delete()
+        self.assertMatchesRecount()
+        self.draft.delete()
+        self.assertMatchesRecount()
+
+    def test_rolled_back_transaction(self):
+        self.question.tags.add(self.physics)
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self.question.tags.add(self.optics)
+                self.draft.is_published = True
+                self.draft.save()
+                Question.objects.get(pk=self.question.pk).delete()
+                raise DatabaseError('rollback')
+        self.assertMatchesRecount()
+        self.assertEqual(counters.question_totals(), {'total': 1, 'answered': 1, 'unanswered': 0})
+
+
+class SidebarTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        category = Category.objects.create(name='Категория', slug='category')
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(title='Вопрос', content='Текст', author=self.author, category=category)
+            question.tags.add(Tag.objects.create(name='физика'))
+        Task.objects.create(title='Задача', author=self.author, question=question)
+
+    def read_all(self):
+        provider = SidebarProvider()
+        for name in BLOCKS:
+            provider.block(name)
+        return provider
+
+    def test_warm_cache_costs_no_queries(self):
+        self.read_all()
+        with self.assertNumQueries(0):
+            provider = self.read_all()
+        self.assertEqual(provider.question_count(), 1)
+        self.assertEqual(provider.popular_tags(), [{'name': 'физика', 'count': 1}])
+        self.assertEqual(provider.total_tasks(), 1)
+
+    def test_block_is_computed_once_per_request(self):
+        provider = SidebarProvider()
+        # total и recent — один блок 'tasks'
+        with self.assertNumQueries(2):
+            provider.total_tasks()
+            provider.recent_tasks()
+            provider.total_tasks()
+
+    def test_unaffected_blocks_are_not_recomputed(self):
+        self.read_all()
+        Task.objects.create(title='Ещё задача', author=self.author)
+        provider = SidebarProvider()
+        with self.assertNumQueries(0):
+            provider.categories()
+            provider.question_count()
+            provider.popular_tags()
+            provider.popular_searches()
+        with self.assertNumQueries(2):
+            self.assertEqual(provider.total_tasks(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(title='Второй', content='Текст', author=self.author)
+        provider = SidebarProvider()
+        with self.assertNumQueries(0):
+            provider.total_tasks()
+            provider.popular_searches()
+        with self.assertNumQueries(1):
+            self.assertEqual(provider.question_count(), 2)
+
+
+@override_settings(QA_PAGE_CACHE={'ENABLED': False})
+class FragmentCacheTests(TestCase):
+
+    SIDEBAR = 'qa_app/includes/question_list_sidebar.html'
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        self.category = Category.objects.create(name='Оптика', slug='optics')
+        Question.objects.create(title='Вопрос', content='Текст', author=author, category=self.category)
+
+    def stats(self):
+        return fragment_stats()[self.SIDEBAR]
+
+    def test_question_list_sidebar_is_reused(self):
+        url = reverse('qa_app:question_list')
+        first = self.client.get(url)
+        self.assertEqual((self.stats()['hits'], self.stats()['misses']), (0, 1))
+        second = self.client.get(url)
+        self.assertEqual((self.stats()['hits'], self.stats()['misses']), (1, 1))
+        self.assertContains(second, 'filter-sidebar')
+        self.assertEqual(first.content, second.content)
+
+        # Другая сортировка — другой фрагмент со своим активным пунктом
+        response = self.client.get(url, {'sort': 'views'})
+        self.assertEqual(self.stats()['misses'], 2)
+        self.assertRegex(response.content.decode(), r'\?sort=views"\s+class="[^"]*active')
+
+        # Изменение категории увеличивает версию SIDEBAR — фрагмент перерисовывается
+        self.category.name = 'Астрономия'
+        self.category.save()
+        response = self.client.get(url)
+        self.assertEqual(self.stats()['misses'], 3)
+        self.assertContains(response, 'Астрономия')
+
+
+class GetOrComputeTests(TestCase):
+
+    KEY = 'qa:test:value'
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='новое'):
+        def compute():
+            self.calls += 1
+            return value
+        return compute
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60), 'новое')
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_only_lock_owner_computes(self):
+        caching.refresh(self.KEY, self.compute('старое'), 60, version=1)
+        # Блокировку держит другой процесс: значение прежней версии отдаётся без пересчёта
+        cache.add(caching.lock_key(self.KEY), 1, caching.LOCK_TIMEOUT)
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60, version=2), 'старое')
+        self.assertEqual(self.calls, 1)
+
+        cache.delete(caching.lock_key(self.KEY))
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60, version=2), 'новое')
+        self.assertEqual(self.calls, 2)
+        self.assertIsNone(cache.get(caching.lock_key(self.KEY)))
+
+    def test_expired_value_is_served_while_recomputed(self):
+        caching.refresh(self.KEY, self.compute('старое'), 60)
+        envelope = cache.get(self.KEY)
+        envelope['expires'] -= 120
+        cache.set(self.KEY, envelope, caching.STALE_GRACE)
+        cache.add(caching.lock_key(self.KEY), 1, caching.LOCK_TIMEOUT)
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60), 'старое')
+
+        cache.delete(caching.lock_key(self.KEY))
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60), 'новое')
+        self.assertEqual(self.calls, 2)
+
+    def test_version_change_forces_recompute(self):
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute('первое'), 60, version=1), 'первое')
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute('второе'), 60, version=1), 'первое')
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute('второе'), 60, version=2), 'второе')
+        self.assertEqual(cache.get(self.KEY)['version'], 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_should_refresh_early_near_expiry(self):
+        envelope = {'value': 1, 'delta': 1.0, 'expires': timezone.now().timestamp() + 3600, 'version': None}
+        self.assertFalse(caching.should_refresh(envelope, None))
+        self.assertTrue(caching.should_refresh(envelope, 'другая'))
+        with mock.patch('qa_app.caching.random.random', return_value=1e-9):
+            # -ln(1e-9) * delta ≈ 20 с: за 10 с до срока значение уже обновляется
+            envelope['expires'] = timezone.now().timestamp() + 10
+            self.assertTrue(caching.should_refresh(envelope, None))
+
+    @mock.patch.object(caching, 'WAIT_STEP', 0.01)
+    @mock.patch.object(caching, 'WAIT_TIMEOUT', 0.05)
+    def test_empty_cache_waits_then_computes_itself(self):
+        # Владелец блокировки так и не записал значение — по истечении ожидания считаем сами
+        cache.add(caching.lock_key(self.KEY), 1, caching.LOCK_TIMEOUT)
+        self.assertIs(caching._wait_for(self.KEY, None), caching._MISSING)
+        self.assertEqual(caching.get_or_compute(self.KEY, self.compute(), 60), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_wait_returns_value_of_lock_owner(self):
+        cache.add(caching.lock_key(self.KEY), 1, caching.LOCK_TIMEOUT)
+        caching.refresh(self.KEY, self.compute('владельца'), 60, version=3)
+        self.assertEqual(caching._wait_for(self.KEY, 3), 'владельца')
+        # Значение другой версии не подходит; блокировка снята — ждать нечего
+        cache.delete(caching.lock_key(self.KEY))
+        self.assertIs(caching._wait_for(self.KEY, 4), caching._MISSING)
+
+
+class ExcerptTests(TestCase):
+
+    def test_excerpt_is_stored_and_lists_skip_html(self):
+        author = User.objects.create_user(username='author')
+        category = Category.objects.create(name='Категория', slug='category')
+        content = '<p>Первое&nbsp;слово</p>' + '<p>текст абзаца</p>' * 100
+        question = Question.objects.create(title='Вопрос', content=content, author=author, category=category)
+        self.assertTrue(question.excerpt.startswith('Первое слово текст абзаца'))
+        self.assertLessEqual(len(question.excerpt), 300)
+        self.assertTrue(question.excerpt.endswith('…'))
+        self.assertEqual(question.word_count, 202)
+
+        question.content = '<b>Новый</b> текст'
+        question.save(update_fields=['content'])
+        question.refresh_from_db()
+        self.assertEqual((question.excerpt, question.word_count), ('Новый текст', 2))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('qa_app:question_list'))
+        self.assertContains(response, 'Новый текст')
+        page_query = next(query['sql'] for query in queries.captured_queries if '"excerpt"' in query['sql'])
+        self.assertNotIn('"content"', page_query)
+
+
+@override_settings(QA_PAGE_CACHE={'ENABLED': False})
+class SnippetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        search.reset_index()
+        self.addCleanup(search.reset_index)
+
+    def test_yo_is_highlighted_as_ye(self):
+        pattern = snippets.query_pattern('ёлка зеленая')
+        self.assertEqual(
+            snippets.make_snippet('Ёлка зелёная, ель зеленее', pattern),
+            '<mark class="highlight">Ёлка</mark> <mark class="highlight">зелёная</mark>, ель зеленее',
+        )
+        self.assertEqual(snippets.make_snippet('Елка', snippets.query_pattern('ёлка')), '<mark class="highlight">Елка</mark>')
+
+    def test_search_builds_snippets_from_stored_text(self):
+        author = User.objects.create_user(username='author')
+        question = Question.objects.create(
+            title='Вопрос', content='<p>Про&nbsp;<b>кванты</b></p>', answer='<p>Кванты &lt;везде&gt;</p>', author=author
+        )
+        self.assertEqual((question.content_text, question.answer_text), ('Про кванты', 'Кванты <везде>'))
+        question.answer = ''
+        question.save(update_fields=['answer'])
+        question.refresh_from_db()
+        self.assertEqual(question.answer_text, '')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('qa_app:search_questions'), {'query': 'кванты'})
+        self.assertContains(response, 'Про <mark class="highlight">кванты</mark>', html=True)
+        page_query = next(query['sql'] for query in queries.captured_queries if '"content_text"' in query['sql'])
+        self.assertNotIn('"content"', page_query)
+        self.assertNotIn('"answer"', page_query)
+
+
+@override_settings(QA_PAGE_CACHE={'ENABLED': False})
+class TrendingTests(TestCase):
+
+    def test_recent_views_outrank_old_ones(self):
+        author = User.objects.create_user(username='author')
+        old = Question.objects.create(title='Старый', content='Текст', answer='Ответ', author=author, views=1000)
+        fresh = Question.objects.create(title='Свежий', content='Текст', answer='Ответ', author=author)
+        today = timezone.localdate()
+        QuestionViewsDaily.objects.create(question=old, date=today - timedelta(days=9), views=100)
+        QuestionViewsDaily.objects.create(question=old, date=today - timedelta(days=30), views=1000)
+        trending.store_daily_views({fresh.pk: 10})
+        trending.store_daily_views({fresh.pk: 10, old.pk: 1})
+
+        self.assertEqual(trending.update_scores(), 2)
+        old.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertAlmostEqual(fresh.trending_score, 20)
+        self.assertAlmostEqual(old.trending_score, 1 + 100 * 0.5 ** 3, places=3)
+        # Счётчики старше окна удалены
+        self.assertFalse(QuestionViewsDaily.objects.filter(date__lt=today - timedelta(days=13)).exists())
+        self.assertEqual(trending.update_scores(), 0)
+
+        response = self.client.get(reverse('qa_app:question_list') + '?sort=trending')
+        self.assertEqual([question.pk for question in response.context['questions']], [fresh.pk, old.pk])
+        response = self.client.get(reverse('qa_app:home'))
+        self.assertEqual([question['pk'] for question in response.context['answered_questions']], [fresh.pk, old.pk])
+
+
+@override_settings(MEDIA_ROOT='/tmp/qa_app_test_media', QA_PAGE_CACHE={'ENABLED': False})
+class HomeSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_home_reads_snapshot_without_queries(self):
+        author = User.objects.create_user(username='author')
+        Question.objects.create(title='Вопрос', content='Текст', author=author)
+        task = Task.objects.create(title='Задача', author=author)
+        url = reverse('qa_app:home')
+
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context['recent_tasks'][0]['notes'], 0)
+
+        # Запись по задаче меняет версию снимка — он пересобирается
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskNote.objects.create(task=task, content='Запись', author=author)
+        response = self.client.get(url)
+        self.assertEqual(response.context['recent_tasks'][0]['notes'], 1)
+        self.assertContains(response, 'Вопрос')
+
+    def test_recent_task_counts_use_subqueries(self):
+        author = User.objects.create_user(username='author')
+        task = Task.objects.create(title='Задача', author=author)
+        for i in range(3):
+            TaskNote.objects.create(task=task, content=f'Запись {i}', author=author)
+        for i in range(2):
+            AttachedFile.objects.create(
+                content_object=task, file=ContentFile(b'data', name=f'file{i}.txt'), uploaded_by=author, name=f'file{i}'
+            )
+        Task.objects.create(title='Пустая', author=author)
+
+        with CaptureQueriesContext(connection) as queries:
+            snapshot = homepage.build_snapshot()
+        self.assertEqual(
+            [(row['title'], row['notes'], row['files']) for row in snapshot['recent_tasks']],
+            [('Пустая', 0, 0), ('Задача', 3, 2)],
+        )
+        tasks_query = next(
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "qa_app_task"' in query['sql'] and 'LIMIT' in query['sql']
+        )
+        # Счётчики — подзапросы, а не JOIN с группировкой по всем задачам
+        self.assertNotIn('JOIN "qa_app_tasknote"', tasks_query)
+        self.assertNotIn('JOIN "qa_app_attachedfile"', tasks_query)
+
+
+@override_settings(MEDIA_ROOT='/tmp/qa_app_test_media', QA_PAGE_CACHE={'ENABLED': False})
+class TaskListQueryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.question = Question.objects.create(title='Связанный вопрос', content='Текст', author=self.author)
+
+    def add_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(title=f'Задача {i}', author=self.author, question=self.question)
+            TaskNote.objects.create(task=task, content='Запись', author=self.author)
+            TaskNote.objects.create(task=task, content='Запись', author=self.author)
+            AttachedFile.objects.create(
+                content_object=task, file=ContentFile(b'data', name=f'task{i}.txt'), uploaded_by=self.author
+            )
+        # Сигналы сбрасывают ключ 'tasks' после коммита, которого в TestCase нет
+        pagecache.purge('tasks')
+
+    def get_page(self):
+        url = reverse('qa_app:task_list')
+        self.client.get(url)  # прогрев сайдбара и статистики
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, len(queries)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.add_tasks(2)
+        response, few = self.get_page()
+        task = response.context['tasks'][0]
+        self.assertEqual((task.notes_count, task.files_count, task.question_title), (2, 1, 'Связанный вопрос'))
+
+        self.add_tasks(8)
+        response, many = self.get_page()
+        self.assertEqual(len(response.context['tasks']), 10)
+        self.assertEqual(response.context['total_tasks'], 10)
+        self.assertEqual(few, many)
+
+
+class SearchIndexSyncTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        search.reset_index()
+        self.addCleanup(search.reset_index)
+        self.author = User.objects.create_user(username='author')
+
+    def test_index_follows_changes_published_by_other_processes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(title='Квантовый компьютер', content='Текст', author=self.author)
+        self.assertEqual(search.memory_search_ids('квантовый'), [question.pk])
+
+        # Изменение из другого процесса видно только через журнал в общем кэше
+        Question.objects.filter(pk=question.pk).update(title='Классический компьютер')
+        search._publish([question.pk], [])
+        self.assertEqual(search.memory_search_ids('квантовый'), [])
+        self.assertEqual(search.memory_search_ids('классический'), [question.pk])
+
+        # Журнал вытеснен — индекс перестраивается целиком
+        Question.objects.filter(pk=question.pk).update(is_published=False)
+        search._publish([question.pk], [])
+        cache.delete(search.changes_key(get_version(CONTENT)))
+        self.assertEqual(search.memory_search_ids('классический'), [])
+
+    def test_cached_results_match_index_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(title='Квантовый компьютер', content='Текст', author=self.author)
+        self.assertEqual(search.cached_search_question_ids('квантовый'), [question.pk])
+
+        # Индекс процесса отстал: под новой версией кэшируется результат уже синхронизированного индекса
+        Question.objects.filter(pk=question.pk).update(title='Классический компьютер')
+        search._publish([question.pk], [])
+        self.assertEqual(search.cached_search_question_ids('квантовый'), [])
+        self.assertEqual(search.cached_search_question_ids('классический'), [question.pk])
+
+    def test_is_synced(self):
+        self.assertTrue(search.is_synced(10, 10))
+        self.assertTrue(search.is_synced(11, 10))
+        self.assertFalse(search.is_synced(9, 10))
+        self.assertFalse(search.is_synced(None, 10))
+        self.assertFalse(search.is_synced(10 + search.MAX_CATCHUP + 1, 10))
+
+    def test_changes_are_published_after_commit(self):
+        version = get_version(CONTENT)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Question.objects.create(title='Вопрос', content='Текст', author=self.author)
+            self.assertEqual(get_version(CONTENT), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_version(CONTENT), version)
+
+
+class SearchVectorTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+
+    def test_build_tsquery(self):
+        self.assertEqual(search.build_tsquery(''), '')
+        self.assertEqual(search.build_tsquery('Квантовый комп'), 'квантовый & комп:*')
+        self.assertEqual(search.build_tsquery('ёлка', 'title'), 'елка:*A')
+        self.assertEqual(search.build_tsquery('кубит сверхпровод', 'answer'), 'кубит:D & сверхпровод:*D')
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsvector есть только в PostgreSQL')
+    def test_vector_is_filled_after_commit_and_searched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(
+                title='Квантовый компьютер', content='<p>Кубиты</p>', answer='Сверхпроводники', author=self.author
+            )
+            question.tags.add(Tag.objects.create(name='физика'))
+        question.refresh_from_db(fields=['search_vector'])
+        self.assertIsNotNone(question.search_vector)
+        self.assertEqual(search.postgres_search_ids('кубиты'), [question.pk])
+        self.assertEqual(search.postgres_search_ids('физика', 'tags'), [question.pk])
+        self.assertEqual(search.postgres_search_ids('сверхпроводники', 'answer'), [question.pk])
+        self.assertEqual(search.postgres_search_ids('сверхпроводники', 'content'), [question.pk])
+        self.assertEqual(search.postgres_search_ids('кубиты', 'answer'), [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsvector есть только в PostgreSQL')
+    def test_update_search_vectors_refreshes_stale_vector(self):
+        question = Question.objects.create(title='Вопрос', content='Текст', author=self.author)
+        Question.objects.filter(pk=question.pk).update(title='Телескоп', search_vector=None)
+        search.update_search_vectors([question.pk])
+        self.assertEqual(search.postgres_search_ids('телескоп'), [question.pk])
+
+
+class SuggestTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        suggest.reset_index()
+        self.addCleanup(suggest.reset_index)
+        self.author = User.objects.create_user(username='author')
+
+    def texts(self, query):
+        entries, _ = suggest.suggest(query)
+        return [text for kind, object_id, text, weight in entries]
+
+    def test_within_one_edit(self):
+        self.assertTrue(suggest.within_one_edit('квант', 'квнат'))
+        self.assertTrue(suggest.within_one_edit('квант', 'кван'))
+        self.assertTrue(suggest.within_one_edit('квант', 'кванта'))
+        self.assertTrue(suggest.within_one_edit('квант', 'квонт'))
+        self.assertFalse(suggest.within_one_edit('квант', 'кнвта'))
+
+    def test_prefix_with_typo(self):
+        index = suggest.SuggestIndex()
+        index.add(suggest.KIND_QUESTION, 1, 'Квантовый компьютер', 10)
+        index.add(suggest.KIND_QUESTION, 2, 'Классическая механика', 5)
+        index.add(suggest.KIND_TAG, 3, 'квантовая физика', 1)
+
+        self.assertEqual([entry[2] for entry in index.suggest('квант')], ['квантовая физика', 'Квантовый компьютер'])
+        # Перестановка букв в начале последнего (незаконченного) слова
+        self.assertEqual([entry[2] for entry in index.suggest('квнато')], ['квантовая физика', 'Квантовый компьютер'])
+        # Опечатка в законченном слове, префикс во втором
+        self.assertEqual([entry[2] for entry in index.suggest('квантовый копм')], ['Квантовый компьютер'])
+        self.assertEqual(index.suggest('механека классич'), [(suggest.KIND_QUESTION, 2, 'Классическая механика', 5)])
+        self.assertEqual(index.suggest('физика компьютер'), [])
+
+    def test_index_follows_question_and_tag_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(title='Квантовый компьютер', content='Текст', author=self.author)
+        self.assertEqual(self.texts('квант'), ['Квантовый компьютер'])
+
+        question.title = 'Телескоп'
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertEqual(self.texts('квант'), [])
+        self.assertEqual(self.texts('телес'), ['Телескоп'])
+
+        question.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertEqual(self.texts('телес'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='оптика')
+        self.assertEqual(self.texts('опт'), ['оптика'])
+        tag.name = 'астрономия'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertEqual(self.texts('опт'), [])
+        self.assertEqual(self.texts('астр'), ['астрономия'])
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertEqual(self.texts('астр'), [])
+
+        question.is_published = True
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+            question.delete()
+        self.assertEqual(self.texts('телес'), [])
+        self.assertEqual(len(suggest.get_index()), 0)
+
+    def test_changes_are_applied_after_commit_only(self):
+        self.assertEqual(self.texts('квант'), [])
+        with self.captureOnCommitCallbacks(execute=False):
+            Question.objects.create(title='Квантовый компьютер', content='Текст', author=self.author)
+        # Транзакция не закоммичена (или откатилась) — версия не менялась, индекс прежний
+        self.assertEqual(self.texts('квант'), [])
+
+    def test_other_process_replays_change_log(self):
+        self.assertEqual(self.texts('квант'), [])
+        version = suggest._index_version
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(title='Квантовый компьютер', content='Текст', author=self.author)
+        # Журнал дочитывается без перестроения индекса
+        index = suggest.get_index()
+        self.assertIs(index, suggest._index)
+        self.assertEqual(suggest._index_version, version + 1)
+        self.assertEqual(self.texts('квант'), ['Квантовый компьютер'])
+
+    def test_tag_weight_follows_usage(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            physics = Tag.objects.create(name='физика')
+            philosophy = Tag.objects.create(name='философия')
+            question = Question.objects.create(title='Вопрос', content='Текст', author=self.author)
+        weights = lambda: {text: weight for kind, object_id, text, weight in suggest.suggest('фи')[0]}
+        self.assertEqual(weights(), {'физика': 0, 'философия': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.tags.add(physics)
+        self.assertEqual(weights(), {'физика': 1, 'философия': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            philosophy.question_set.add(question)
+        self.assertEqual(weights(), {'физика': 1, 'философия': 1})
+
+        question.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertEqual(weights(), {'физика': 0, 'философия': 0})
+
+        question.is_published = True
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            question.tags.clear()
+        self.assertEqual(weights(), {'физика': 0, 'философия': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.tags.add(physics)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.delete()
+        self.assertEqual(weights(), {'физика': 0, 'философия': 0})
+
+    def test_suggest_view(self):
+        question = Question.objects.create(title='Квантовый компьютер', content='Текст', author=self.author)
+        response = self.client.get(reverse('qa_app:search_suggest'), {'q': 'квнат'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['suggestions'], [{
+            'type': suggest.KIND_QUESTION,
+            'id': question.pk,
+            'text': 'Квантовый компьютер',
+            'url': reverse('qa_app:question_detail', kwargs={'pk': question.pk}),
+        }])
+
+
+class SearchLogBufferTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool = Path(spool_dir.name) / 'search_queries.spool'
+        settings_override = override_settings(QA_SEARCH_LOG={'SPOOL_PATH': self.spool})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Фоновый поток не просыпается сам: сбрасываем вручную
+        self.buffer = search_log.SearchLogBuffer(capacity=3, batch_size=100, flush_interval=3600)
+        self.addCleanup(self.buffer._stopped.set)
+
+    def record(self, term):
+        return {'term': term, 'user_id': None, 'ip_address': None, 'user_agent': '', 'created_at': timezone.now()}
+
+    def test_flush_writes_rows_and_daily_counts(self):
+        for term in ('кванты', 'кванты', 'оптика'):
+            self.buffer.add(self.record(term))
+        self.assertEqual(SearchQuery.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(sorted(SearchQuery.objects.values_list('term', flat=True)), ['кванты', 'кванты', 'оптика'])
+        self.assertEqual(dict(SearchTermDaily.objects.values_list('term', 'count')), {'кванты': 2, 'оптика': 1})
+        self.assertEqual(self.buffer.stats(), {'buffered': 0, 'flushed': 3, 'dropped': 0, 'spilled': 0, 'replayed': 0})
+        self.assertEqual(search_log.shared_stats()['flushed'], 3)
+
+    def test_overflow_drops_oldest(self):
+        for term in ('первый', 'второй', 'третий', 'четвёртый'):
+            self.buffer.add(self.record(term))
+        self.buffer.flush()
+        self.assertEqual(
+            sorted(SearchQuery.objects.values_list('term', flat=True)), ['второй', 'третий', 'четвёртый']
+        )
+        self.assertEqual(self.buffer.stats()['dropped'], 1)
+
+    def test_database_down_spills_to_spool_and_replays(self):
+        self.buffer.add(self.record('кванты'))
+        self.buffer.add(self.record('оптика'))
+        with mock.patch.object(search_log.SearchLogBuffer, '_write', side_effect=DatabaseError('down')):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(SearchQuery.objects.count(), 0)
+        self.assertEqual(len(self.spool.read_text(encoding='utf-8').splitlines()), 2)
+        self.assertEqual(self.buffer.stats()['spilled'], 2)
+
+        # БД снова доступна: следующий сброс сначала переигрывает spool
+        self.buffer.add(self.record('кванты'))
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertFalse(self.spool.exists())
+        self.assertEqual(SearchQuery.objects.count(), 3)
+        self.assertEqual(dict(SearchTermDaily.objects.values_list('term', 'count')), {'кванты': 2, 'оптика': 1})
+        self.assertEqual(self.buffer.stats()['replayed'], 2)
+
+    def test_replay_keeps_spool_while_database_is_down(self):
+        self.buffer._spill([self.record('кванты')])
+        with mock.patch.object(search_log.SearchLogBuffer, '_write', side_effect=DatabaseError('down')):
+            self.assertEqual(search_log.replay_spool(self.buffer), 0)
+        self.assertEqual(len(self.spool.read_text(encoding='utf-8').splitlines()), 1)
+        self.assertEqual(search_log.replay_spool(self.buffer), 1)
+        self.assertEqual(SearchQuery.objects.get().term, 'кванты')
+
+    def test_daily_counts_are_added_to_existing_rows(self):
+        today = timezone.localdate()
+        SearchTermDaily.objects.create(term='кванты', date=today, count=5)
+        yesterday = self.record('кванты')
+        yesterday['created_at'] -= timedelta(days=1)
+        search_log.record_term_counts([self.record('кванты'), self.record('кванты'), self.record('оптика'), yesterday])
+        search_log.record_term_counts([self.record('оптика')])
+        self.assertEqual(
+            set(SearchTermDaily.objects.values_list('term', 'date', 'count')),
+            {('кванты', today, 7), ('оптика', today, 2), ('кванты', today - timedelta(days=1), 1)},
+        )
+
+    def test_replayed_spool_is_added_to_daily_counts(self):
+        today = timezone.localdate()
+        earlier = self.record('оптика')
+        earlier['created_at'] -= timedelta(days=3)
+        self.buffer._spill([self.record('кванты'), self.record('кванты'), earlier])
+        SearchTermDaily.objects.create(term='кванты', date=today, count=1)
+
+        self.assertEqual(search_log.replay_spool(self.buffer), 3)
+        self.assertFalse(self.spool.exists())
+        self.assertEqual(
+            set(SearchTermDaily.objects.values_list('term', 'date', 'count')),
+            {('кванты', today, 3), ('оптика', today - timedelta(days=3), 1)},
+        )
+        # Повторный вызов ничего не дописывает
+        self.assertEqual(search_log.replay_spool(self.buffer), 0)
+        self.assertEqual(SearchQuery.objects.count(), 3)
+
+    def test_popular_searches_window_and_limit(self):
+        today = timezone.localdate()
+        SearchTermDaily.objects.bulk_create([
+            SearchTermDaily(term='кванты', date=today, count=3),
+            SearchTermDaily(term='кванты', date=today - timedelta(days=6), count=2),
+            SearchTermDaily(term='оптика', date=today - timedelta(days=1), count=5),
+            SearchTermDaily(term='атомы', date=today - timedelta(days=2), count=1),
+            # Вне окна из 7 дней
+            SearchTermDaily(term='атомы', date=today - timedelta(days=7), count=100),
+        ])
+        self.assertEqual(search_log.popular_searches(days=7, limit=10), [
+            {'term': 'кванты', 'count': 5},
+            {'term': 'оптика', 'count': 5},
+            {'term': 'атомы', 'count': 1},
+        ])
+        self.assertEqual(search_log.popular_searches(days=7, limit=1), [{'term': 'кванты', 'count': 5}])
+        self.assertEqual(search_log.popular_searches(days=1), [{'term': 'кванты', 'count': 3}])
+
+
+class ExtractionTests(TestCase):
+
+    def docx(self, text):
+        document = (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:body></w:document>'
+        )
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('word/document.xml', document)
+        data.seek(0)
+        return data
+
+    def test_txt_cut_inside_multibyte_character(self):
+        for prefix in ('', 'x'):
+            data = (prefix + 'привет ' * extraction.MAX_TEXT_LENGTH).encode('utf-8')
+            text = extraction.extract_txt(io.BytesIO(data))
+            self.assertTrue(text.startswith(prefix + 'привет привет'))
+            self.assertLessEqual(set(text), set(prefix + 'привет '))
+
+    def test_txt_cp1251(self):
+        self.assertEqual(extraction.extract_txt(io.BytesIO('Квантовый компьютер'.encode('cp1251'))), 'Квантовый компьютер')
+
+    def test_docx_text(self):
+        self.assertEqual(extraction.extract_docx(self.docx('Квантовый компьютер')), 'Квантовый компьютер')
+
+    def test_oversized_member_is_not_read(self):
+        with mock.patch.object(extraction, 'MAX_MEMBER_SIZE', 1000):
+            with self.assertRaises(ValueError):
+                extraction.extract_docx(self.docx('а' * 1000))
+
+
+class CursorPaginationTests(TestCase):
+
+    def test_keyset_filter_has_leading_range_bound(self):
+        queryset = Question.objects.filter(keyset_filter(('-views', '-id'), [5, 10]))
+        where = str(queryset.query).split('WHERE', 1)[1]
+        self.assertRegex(where, r'^ \("qa_app_question"."views" <= 5 AND \(')
+
+        queryset = Question.objects.filter(keyset_filter(('views', 'id'), [5, 10], forward=False))
+        self.assertIn('"qa_app_question"."views" <= 5', str(queryset.query))
+
+    def test_pages_walk_ties_in_both_directions(self):
+        author = User.objects.create_user(username='author')
+        for i in range(7):
+            Question.objects.create(title=f'Вопрос {i}', content='Текст', author=author, views=i // 3)
+        expected = list(Question.objects.order_by('-views', '-id').values_list('pk', flat=True))
+        paginator = CursorPaginator(Question.objects.all(), 3, ('-views', '-id'))
+
+        pages = [paginator.page()]
+        while pages[-1].next_cursor:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([question.pk for page in pages for question in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual([question.pk for question in previous], expected[3:6])
+
+
+class ViewCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = view_counter.ViewCounterBuffer(flush_interval=3600)
+        self.addCleanup(self.buffer._stopped.set)
+        author = User.objects.create_user(username='author')
+        self.questions = [
+            Question.objects.create(title=f'Вопрос {i}', content='Текст', author=author, views=10) for i in range(3)
+        ]
+
+    def test_views_are_buffered_and_written_in_one_flush(self):
+        first, second, third = self.questions
+        for question, count in ((first, 3), (second, 3), (third, 1)):
+            for _ in range(count):
+                self.buffer.add(question.pk)
+        self.assertEqual(list(Question.objects.order_by('pk').values_list('views', flat=True)), [10, 10, 10])
+        self.assertEqual(view_counter.pending_views([first.pk, third.pk]), {first.pk: 3, third.pk: 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 3)
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "qa_app_question"')
+        ]
+        # Одинаковый прирост (3) — один запрос на два вопроса
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(list(Question.objects.order_by('pk').values_list('views', flat=True)), [13, 13, 11])
+        self.assertEqual(
+            dict(QuestionViewsDaily.objects.values_list('question_id', 'views')),
+            {first.pk: 3, second.pk: 3, third.pk: 1},
+        )
+        self.assertEqual(view_counter.pending_views([question.pk for question in self.questions]), {})
+        self.assertEqual(self.buffer.stats()['flushed'], 7)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_keeps_views(self):
+        question = self.questions[0]
+        self.buffer.add(question.pk)
+        with mock.patch('qa_app.trending.store_daily_views', side_effect=DatabaseError('down')):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.stats()['pending_views'], 1)
+        self.assertEqual(self.buffer.flush(), 1)
+        question.refresh_from_db()
+        self.assertEqual(question.views, 11)
+
+
+    @override_settings(QA_VIEW_COUNTER={'FLUSH_INTERVAL': 10})
+    def test_pending_mirror_expires(self):
+        question = self.questions[0]
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            self.buffer.add(question.pk)
+        add.assert_called_once_with(view_counter.pending_key(question.pk), 0, timeout=60)
+
+        other = view_counter.ViewCounterBuffer(flush_interval=3600)
+        self.addCleanup(other._stopped.set)
+        other.add(question.pk)
+        with mock.patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            self.buffer.flush()
+        # Просмотр другого процесса ещё не записан — зеркало продлевается
+        touch.assert_called_once_with(view_counter.pending_key(question.pk), 60)
+        self.assertEqual(view_counter.pending_views([question.pk]), {question.pk: 1})
+
+class UniqueVisitorsTests(TestCase):
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        self.first = Question.objects.create(title='Первый', content='Текст', author=author)
+        self.second = Question.objects.create(title='Второй', content='Текст', author=author)
+
+    def sketches(self, visits):
+        buffer = view_counter.ViewCounterBuffer(flush_interval=3600)
+        self.addCleanup(buffer._stopped.set)
+        for question, visitor in visits:
+            buffer.add(question.pk, visitor=visitor)
+        return buffer._sketches
+
+    def test_flush_only_merges_daily_sketches(self):
+        with CaptureQueriesContext(connection) as queries:
+            stored = visitors.store_sketches(self.sketches([
+                (self.first, 'user:1'), (self.first, 'user:2'), (self.second, 'user:1'),
+            ]))
+        self.assertEqual(stored, 2)
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('UPDATE "qa_app_question"')])
+        self.assertEqual(visitors.unique_visitors(self.first.pk), 2)
+
+        # Те же посетители в другом процессе: скетчи сливаются, оценка не растёт
+        visitors.store_sketches(self.sketches([(self.first, 'user:2'), (self.second, 'user:1')]))
+        self.assertEqual(visitors.unique_visitors_many([self.first.pk, self.second.pk]), {self.first.pk: 2, self.second.pk: 1})
+
+    def test_batch_update_writes_only_changed_estimates(self):
+        visitors.store_sketches(self.sketches([
+            (self.first, 'user:1'), (self.first, 'user:2'), (self.second, 'user:1'),
+        ]))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(visitors.update_unique_visitors(batch_size=1), 2)
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "qa_app_question"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            dict(Question.objects.values_list('pk', 'unique_visitors')), {self.first.pk: 2, self.second.pk: 1}
+        )
+        self.assertEqual(visitors.update_unique_visitors(), 0)
+
+        # Скетчи вышли из окна — оценка обнуляется
+        visitors.prune(keep_days=-1)
+        self.assertEqual(visitors.update_unique_visitors(), 2)
+        self.assertEqual(set(Question.objects.values_list('unique_visitors', flat=True)), {0})
+
+
+class SimilarQuestionsTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+
+    def ask(self, title, content):
+        return Question.objects.create(title=title, content=content, author=self.author)
+
+    def links(self):
+        return set(SimilarQuestion.objects.values_list('question_id', 'similar_id'))
+
+    def test_changes_are_queued_and_processed_by_command_job(self):
+        python = self.ask('Как установить пакет python', 'Установка пакета python через pip в виртуальное окружение')
+        pip = self.ask('Установка пакета python через pip', 'Как установить пакет python в виртуальное окружение')
+        other = self.ask('Рецепт борща', 'Свекла капуста морковь картофель говядина')
+        # Запрос только ставит вопросы в очередь
+        self.assertEqual(set(SimilarityRefresh.objects.values_list('question_id', flat=True)), {python.pk, pip.pk, other.pk})
+        self.assertFalse(SimilarQuestion.objects.exists())
+
+        self.assertEqual(similarity.process_queue(), (3, 3))
+        self.assertFalse(SimilarityRefresh.objects.exists())
+        self.assertEqual(self.links(), {(python.pk, pip.pk), (pip.pk, python.pk)})
+
+        # Полный пересчёт даёт те же списки
+        self.assertEqual(similarity.rebuild(), (3, 2))
+        self.assertEqual(self.links(), {(python.pk, pip.pk), (pip.pk, python.pk)})
+
+        # Снятый с публикации вопрос уходит из чужих списков
+        pip.is_published = False
+        pip.save()
+        similarity.process_queue()
+        self.assertEqual(self.links(), set())
+
+    def test_band_buckets_are_stable(self):
+        row = similarity.signature(similarity.features('Установка пакета python', 'через pip'))
+        buckets = similarity.band_buckets(similarity.to_bytes(row))
+        self.assertEqual(len(buckets), similarity.BANDS)
+        self.assertEqual(buckets, similarity.band_buckets(similarity.to_bytes(row.copy())))
+        other = similarity.signature(similarity.features('Рецепт борща', 'Свекла капуста'))
+        self.assertFalse(set(buckets) & set(similarity.band_buckets(similarity.to_bytes(other))))
+
+
+@override_settings(QA_COUNTS={'EXACT_THRESHOLD': 5, 'STRATEGY': 'cached', 'CACHE_TIMEOUT': 60})
+class CountingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+
+    def ask(self, n):
+        for i in range(n):
+            Question.objects.create(title=f'Вопрос {i}', content='Текст', author=self.author)
+
+    def test_exact_below_threshold(self):
+        self.ask(5)
+        result = counting.count(Question.objects.all())
+        self.assertEqual((result, result.is_exact), (5, True))
+        self.assertIsNone(cache.get(counting.count_key(Question.objects.all())))
+
+    def test_cached_above_threshold(self):
+        self.ask(7)
+        queryset = Question.objects.all()
+        first = counting.count(queryset)
+        self.assertEqual(first, 7)
+
+        # Новые строки не видны, пока значение в кэше свежее
+        self.ask(2)
+        second = counting.count(queryset)
+        self.assertEqual((second, second.is_exact), (7, False))
+
+        # Истёкшее значение отдаётся сразу; пересчёт уже идёт в другом процессе (блокировка занята)
+        key = counting.count_key(queryset.order_by())
+        cache.set(key, {**cache.get(key), 'expires': 0})
+        cache.add(counting.lock_key(key), 1)
+        self.assertEqual(counting.count(queryset), 7)
+
+        counting._store(queryset.order_by(), key)
+        self.assertEqual(counting.count(queryset), 9)
+
+    def test_paginator_marks_approximate_count(self):
+        self.ask(7)
+        with override_settings(QA_PAGINATION_MODE='offset', QA_PAGE_CACHE={'ENABLED': False}):
+            self.client.get(reverse('qa_app:question_list'))
+            response = self.client.get(reverse('qa_app:question_list'))
+        self.assertEqual(response.context['paginator'].count, 7)
+        self.assertFalse(response.context['paginator'].count.is_exact)
+        self.assertContains(response, '≈ 7')
+
+    @skipUnless(connection.vendor == 'postgresql', 'оценка планировщика есть только в PostgreSQL')
+    @override_settings(QA_COUNTS={'EXACT_THRESHOLD': 5, 'STRATEGY': 'estimate'})
+    def test_planner_estimate_above_threshold(self):
+        self.ask(7)
+        result = counting.count(Question.objects.all())
+        self.assertFalse(result.is_exact)
+        self.assertGreaterEqual(result, 6)
+
+
+class InvertedIndexTests(TestCase):
+
+    def index(self, docs):
+        index = search.InvertedIndex()
+        for doc_id, fields in docs.items():
+            index.add(doc_id, {field: search.tokenize(text) for field, text in fields.items()})
+        return index
+
+    def test_title_match_outranks_body_only_match(self):
+        index = self.index({
+            1: {'title': 'Настройка сервера', 'content': 'Про кэширование ответов'},
+            2: {'title': 'Кэширование в Django', 'content': 'Настройка сервера'},
+            3: {'title': 'Другое', 'content': 'Совсем другое'},
+        })
+        self.assertEqual(index.search('кэширование'), [2, 1])
+        self.assertEqual(index.search('кэширование', 'title'), [2])
+        self.assertEqual(index.search('кэширование', 'content'), [1])
+
+    def test_term_frequency_saturates(self):
+        padding = ' '.join(f'слово{i}' for i in range(20))
+        index = self.index({
+            doc_id: {'content': ' '.join(['кэш'] * tf + [padding])}
+            for doc_id, tf in ((1, 1), (2, 2), (3, 20), (4, 40))
+        })
+        scores = {}
+        index._score_term('кэш', 'content', scores)
+        self.assertEqual(index.search('кэш'), [4, 3, 2, 1])
+        # Прирост от повторов убывает: второе вхождение даёт больше, чем двадцать следующих после двадцатого
+        self.assertGreater(scores[2] - scores[1], scores[4] - scores[3])
+        idf = math.log(1 + (4 - 4 + 0.5) / (4 + 0.5))
+        self.assertLess(scores[4], idf * (search.BM25_K1 + 1))
+
+    def test_last_word_matches_by_prefix(self):
+        index = self.index({
+            1: {'title': 'Кэширование страниц'},
+            2: {'title': 'Кэш запросов'},
+            3: {'title': 'Страницы ошибок'},
+        })
+        self.assertEqual(sorted(index.search('кэш')), [1, 2])
+        self.assertEqual(index.search('кэш страниц'), [])  # не последнее слово — только целиком
+        self.assertEqual(index.search('кэширование стр'), [1])
+        self.assertEqual(sorted(index.search('стр')), [1, 3])
+
+        index.remove(1)
+        self.assertEqual(index.search('стр'), [3])
+        self.assertEqual(index.expand_prefix('кэш'), ['кэш'])
@@ -0,0 +1,120 @@
+"""
+Популярность "сейчас" (Question.trending_score).
+
+Буфер просмотров (qa_app.view_counter) при сбросе прибавляет их к дневным
+счётчикам QuestionViewsDaily. Раз в несколько минут `manage.py
+update_trending` (cron) пересчитывает для каждого вопроса сумму просмотров
+за последние WINDOW_DAYS дней с экспоненциальным затуханием: просмотры
+HALF_LIFE_DAYS дней назад весят вдвое меньше сегодняшних. Результат
+записывается в индексированную колонку, поэтому сортировка "Популярные
+сейчас" и блок популярных отвеченных вопросов на главной — один проход
+по индексу (-trending_score, -id).
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .pagecache import purge_on_commit
+
+
+DEFAULTS = {
+    'HALF_LIFE_DAYS': 3,
+    'WINDOW_DAYS': 14,
+    'BATCH_SIZE': 500,
+}
+
+# Изменения оценки меньше этого не записываются (меньше строк в UPDATE)
+SCORE_EPSILON = 0.01
+
+
+def get_setting(name):
+    return getattr(settings, 'QA_TRENDING', {}).get(name, DEFAULTS[name])
+
+
+def decay(age_days, half_life=None):
+    """Вес просмотров age_days дней назад."""
+    return math.pow(0.5, age_days / (half_life or get_setting('HALF_LIFE_DAYS')))
+
+
+# ----------------------------
+# Дневные просмотры (из view_counter)
+# ----------------------------
+
+def store_daily_views(counts, date=None):
+    """Прибавляет просмотры {question_id: n} к счётчикам QuestionViewsDaily за date."""
+    from .models import Question, QuestionViewsDaily
+
+    date = date or timezone.localdate()
+    # Вопросы могли удалить, пока просмотры копились в процессе
+    existing = set(Question.objects.filter(pk__in=counts).values_list('pk', flat=True))
+    stored = set(
+        QuestionViewsDaily.objects.filter(question_id__in=existing, date=date).values_list('question_id', flat=True)
+    )
+
+    groups = defaultdict(list)
+    for question_id in stored:
+        groups[counts[question_id]].append(question_id)
+    for count, question_ids in groups.items():
+        QuestionViewsDaily.objects.filter(question_id__in=question_ids, date=date).update(views=F('views') + count)
+
+    for question_id in existing - stored:
+        count = counts[question_id]
+        try:
+            with transaction.atomic():
+                QuestionViewsDaily.objects.create(question_id=question_id, date=date, views=count)
+        except IntegrityError:
+            # Строку успел создать другой процесс
+            QuestionViewsDaily.objects.filter(question_id=question_id, date=date).update(views=F('views') + count)
+
+
+# ----------------------------
+# Пересчёт оценок
+# ----------------------------
+
+def compute_scores(today=None):
+    """{question_id: оценка} по просмотрам за окно (вопросы без просмотров не входят)."""
+    from .models import QuestionViewsDaily
+
+    today = today or timezone.localdate()
+    since = today - timedelta(days=get_setting('WINDOW_DAYS') - 1)
+    half_life = get_setting('HALF_LIFE_DAYS')
+    scores = defaultdict(float)
+    rows = QuestionViewsDaily.objects.filter(date__gte=since, date__lte=today).values_list('question_id', 'date', 'views')
+    for question_id, date, views in rows.iterator(chunk_size=get_setting('BATCH_SIZE')):
+        scores[question_id] += views * decay((today - date).days, half_life)
+    return scores
+
+
+def update_scores(today=None):
+    """
+    Записывает оценки в Question.trending_score (только изменившиеся),
+    удаляет дневные счётчики старше окна. Возвращает число обновлённых вопросов.
+    """
+    from .models import Question, QuestionViewsDaily
+
+    today = today or timezone.localdate()
+    scores = compute_scores(today)
+    batch_size = get_setting('BATCH_SIZE')
+
+    # Сейчас ненулевые оценки — только у вопросов, просмотренных за окно
+    current = dict(Question.objects.filter(trending_score__gt=0).values_list('pk', 'trending_score'))
+    changed = []
+    for pk in sorted(current.keys() | scores.keys()):
+        score = round(scores.get(pk, 0.0), 4)
+        old = current.get(pk, 0.0)
+        if abs(score - old) >= SCORE_EPSILON or (score == 0) != (old == 0):
+            changed.append(Question(pk=pk, trending_score=score))
+
+    with transaction.atomic():
+        Question.objects.bulk_update(changed, ['trending_score'], batch_size=batch_size)
+        since = today - timedelta(days=get_setting('WINDOW_DAYS') - 1)
+        QuestionViewsDaily.objects.filter(date__lt=since).delete()
+        if changed:
+            # Порядок в списках и на главной изменился
+            purge_on_commit('questions')
+    return len(changed)
@@ -20,6 +20,7 @@ urlpatterns = [
 
     # Поиск
     path('search/', views.search_questions, name='search_questions'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
 
     # Ответы (AJAX)
     path('questions/<int:pk>/add-answer-ajax/', views.add_answer_ajax, name='add_answer_ajax'),
@@ -0,0 +1,55 @@
+"""
+Версии содержимого для точной инвалидации кэша.
+
+Версия — счётчик в общем кэше, который увеличивается из сигналов
+при изменении данных. Ключи кэша включают текущую версию, поэтому
+после изменения старые записи просто перестают читаться (и со временем
+вытесняются), а TTL не нужен для корректности.
+"""
+import time
+
+from django.core.cache import cache
+
+
+CONTENT = 'content'  # вопросы, теги, файлы — кэш поиска
+SIDEBAR = 'sidebar'  # категории, теги, счётчики, задачи — фрагменты сайдбара и страницы
+
+# Источники блоков сайдбара: блок пересчитывается только после изменения своих
+SIDEBAR_CATEGORIES = 'sidebar:categories'
+SIDEBAR_TAGS = 'sidebar:tags'
+SIDEBAR_COUNTERS = 'sidebar:counters'
+SIDEBAR_TASKS = 'sidebar:tasks'
+
+
+def version_key(namespace):
+    return f'qa:version:{namespace}'
+
+
+def _initial_version():
+    # Если счётчик вытеснен из кэша, начинаем с метки времени,
+    # чтобы не совпасть со старыми версиями, ключи которых ещё живы
+    return int(time.time() * 1000)
+
+
+def get_version(namespace=CONTENT):
+    key = version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace=CONTENT):
+    key = version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def bump_sidebar(source):
+    """Увеличивает версию источника блоков сайдбара и общую версию SIDEBAR."""
+    bump_version(source)
+    return bump_version(SIDEBAR)
@@ -0,0 +1,232 @@
+"""
+Буферизованный счётчик просмотров вопросов.
+
+Просмотр не пишет в таблицу вопросов: он увеличивает счётчик процесса
+и его зеркало в общем кэше. Фоновый поток раз в FLUSH_INTERVAL секунд
+(и при завершении процесса) переносит накопленное в БД одним
+UPDATE ... SET views = views + n на каждую группу вопросов с одинаковым n.
+Так нет ни потерянных инкрементов (read-modify-write), ни новой версии
+строки вопроса на каждый просмотр.
+
+Зеркало в кэше (qa:views:pending:<id>) содержит ещё не записанные
+просмотры всех процессов; pending_views() и apply_pending_views() добавляют
+их к отображаемому числу, поэтому счётчик на странице не отстаёт. Зеркало
+живёт PENDING_FLUSHES интервалов сброса и продлевается при каждом сбросе:
+если процесс упал, не записав просмотры, они перестают показываться.
+
+Вместе с просмотрами копятся скетчи уникальных посетителей (вопрос, день),
+которые при сбросе сливаются с сохранёнными (qa_app.visitors). Тем же
+сбросом просмотры прибавляются к дневным счётчикам, из которых считается
+популярность "сейчас" (qa_app.trending).
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .hll import HyperLogLog
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'FLUSH_INTERVAL': 10.0,
+}
+
+PENDING_FLUSHES = 6  # время жизни зеркала в интервалах сброса
+
+
+def get_setting(name):
+    return getattr(settings, 'QA_VIEW_COUNTER', {}).get(name, DEFAULTS[name])
+
+
+def pending_key(question_id):
+    return f'qa:views:pending:{question_id}'
+
+
+def pending_timeout():
+    return int(get_setting('FLUSH_INTERVAL') * PENDING_FLUSHES)
+
+
+class ViewCounterBuffer:
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval or get_setting('FLUSH_INTERVAL')
+        self._counts = Counter()
+        self._sketches = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.counters = {'recorded': 0, 'flushed': 0, 'updates': 0}
+
+    def add(self, question_id, count=1, visitor=None):
+        self._ensure_started()
+        with self._lock:
+            self._counts[question_id] += count
+            self.counters['recorded'] += count
+            if visitor is not None:
+                key = (question_id, timezone.localdate())
+                sketch = self._sketches.get(key)
+                if sketch is None:
+                    sketch = self._sketches[key] = HyperLogLog()
+                sketch.add(visitor)
+        _shared_incr(pending_key(question_id), count)
+
+    def _ensure_started(self):
+        # После fork() поток родителя в дочернем процессе не существует
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Это просмотры родителя, их сбросит он сам
+                self._counts.clear()
+                self._sketches.clear()
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='view-counter-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('View counter flush failed')
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Записывает накопленные просмотры в БД; возвращает число затронутых вопросов."""
+        from .models import Question
+        from .trending import store_daily_views
+        from .visitors import store_sketches
+
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+                sketches, self._sketches = self._sketches, {}
+
+            if sketches:
+                try:
+                    store_sketches(sketches)
+                except DatabaseError as e:
+                    logger.warning('View counter: скетчи посетителей не записаны (%s)', e)
+                    with self._lock:
+                        for key, sketch in sketches.items():
+                            current = self._sketches.get(key)
+                            self._sketches[key] = sketch.merge(current) if current is not None else sketch
+
+            if not counts:
+                return 0
+
+            # Вопросы с одинаковым приростом обновляются одним запросом
+            groups = defaultdict(list)
+            for question_id, count in counts.items():
+                groups[count].append(question_id)
+            try:
+                with transaction.atomic():
+                    for count, question_ids in groups.items():
+                        Question.objects.filter(pk__in=question_ids).update(views=F('views') + count)
+                    store_daily_views(counts)
+            except DatabaseError as e:
+                logger.warning('View counter: БД недоступна (%s), %d вопросов ждут следующего сброса', e, len(counts))
+                with self._lock:
+                    self._counts.update(counts)
+                return 0
+
+            for question_id, count in counts.items():
+                _shared_decr(pending_key(question_id), count)
+            self.counters['flushed'] += sum(counts.values())
+            self.counters['updates'] += len(groups)
+            return len(counts)
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_questions': len(self._counts),
+                'pending_views': sum(self._counts.values()),
+                'pending_sketches': len(self._sketches),
+                **self.counters,
+            }
+
+
+def _shared_incr(key, value):
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.add(key, 0, timeout=pending_timeout())
+        cache.incr(key, value)
+
+
+def _shared_decr(key, value):
+    try:
+        remaining = cache.decr(key, value)
+    except ValueError:
+        return  # зеркало истекло или вытеснено — показываем просмотры из БД
+    if remaining < 0:
+        cache.set(key, 0, timeout=pending_timeout())
+    elif remaining:
+        # Остались просмотры других процессов — они ещё сбрасываются
+        cache.touch(key, pending_timeout())
+
+
+# ----------------------------
+# Буфер процесса
+# ----------------------------
+
+_buffer = ViewCounterBuffer()
+
+
+def record_view(question_id, visitor=None):
+    """
+    Засчитывает просмотр вопроса (запись в БД — в фоне, пачкой).
+    visitor — идентификатор посетителя для оценки уникальных (visitors.visitor_id).
+    """
+    _buffer.add(question_id, visitor=visitor)
+
+
+def pending_views(question_ids):
+    """{id: ещё не записанные в БД просмотры} для вопросов question_ids."""
+    keys = {pending_key(question_id): question_id for question_id in question_ids}
+    values = cache.get_many(list(keys))
+    return {keys[key]: max(value, 0) for key, value in values.items() if value}
+
+
+def apply_pending_views(questions):
+    """Добавляет к question.views ещё не записанные просмотры (для отображения)."""
+    questions = list(questions)
+    pending = pending_views([question.pk for question in questions])
+    for question in questions:
+        question.views += pending.get(question.pk, 0)
+    return questions
+
+
+def flush():
+    return _buffer.flush()
+
+
+def stats():
+    return _buffer.stats()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        _buffer.stop()
+    except Exception:
+        logger.exception('View counter flush on shutdown failed')
@@ -1,7 +1,8 @@
 from venv import logger
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Count
+from django.db.models import Q, Count, F, Max, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.core.paginator import Paginator
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -11,15 +12,27 @@ from django.urls import reverse, reverse_lazy
 from django.http import JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from datetime import timedelta
-from django.utils.decorators import method_decorator
+from urllib.parse import urlencode
 import json
 import os
 from django.contrib.contenttypes.models import ContentType
-from .models import Question, Category, AttachedFile, Tag, Task, TaskNote, SearchQuery
+from .models import Question, Category, AttachedFile, Task, TaskNote
 from .forms import QuestionForm, SearchForm, LoginForm
+from .search import cached_search_question_ids, search_file_owners
+from . import homepage, similarity, suggest
+from .search_log import log_search
+from .snippets import build_snippets
+from .conditional import ConditionalGetMixin, latest
+from .caching import get_or_compute
+from .pagecache import add_surrogate_keys, count_view_on_hit, key_namespace
+from .pagination import CursorPaginationMixin, elided_page_range
+from .sidebar import get_sidebar
+from .versioning import get_version
+from .view_counter import apply_pending_views, record_view
+from .visitors import visitor_id
 from django.template.defaulttags import register
 from django.utils import timezone
-from django.db import models
+from django.db import DatabaseError
 
 
 @register.filter
@@ -40,48 +53,6 @@ def multiply(value, arg):
         return 0
 
 
-def get_sidebar_context():
-    """Получает контекст для сайдбара"""
-    categories = Category.objects.annotate(
-        question_count=Count('question', filter=Q(question__is_published=True))
-    ).order_by('name')
-
-    total_questions = Question.objects.filter(is_published=True).count()
-    answered_count = Question.objects.filter(is_published=True).exclude(answer='').count()
-    unanswered_count = total_questions - answered_count
-
-    # Популярные теги
-    questions_with_tags = Question.objects.filter(
-        is_published=True
-    ).prefetch_related('tags')
-
-    tag_counts = {}
-    for question in questions_with_tags:
-        for tag in question.tags.all():
-            tag_name = tag.name.lower().strip()
-            tag_counts[tag_name] = tag_counts.get(tag_name, 0) + 1
-
-    popular_tags = sorted(
-        [{'name': tag, 'count': count} for tag, count in tag_counts.items()],
-        key=lambda x: x['count'],
-        reverse=True
-    )[:10]
-
-    # Добавлено: количество задач и последние задачи
-    total_tasks = Task.objects.count()
-    recent_tasks = Task.objects.select_related('author').order_by('-created_at')[:5]
-
-    return {
-        'categories': categories,
-        'question_count': total_questions,
-        'answered_count': answered_count,
-        'unanswered_count': unanswered_count,
-        'popular_tags': popular_tags,
-        'sidebar_total_tasks': total_tasks,
-        'sidebar_recent_tasks': recent_tasks,
-    }
-
-
 class CustomLoginView(LoginView):
     template_name = 'qa_app/login.html'
     authentication_form = LoginForm
@@ -89,7 +60,7 @@ class CustomLoginView(LoginView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context.update(get_sidebar_context())
+        context.update(get_sidebar(self.request).context())
         return context
 
     def form_valid(self, form):
@@ -106,23 +77,64 @@ def logout_view(request):
 
 
 class SidebarMixin:
-    """Миксин для добавления контекста сайдбара"""
+    """Миксин для добавления контекста сайдбара (ленивые блоки, см. qa_app.sidebar)"""
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        sidebar_context = get_sidebar_context()
-        context.update(sidebar_context)
+        context.update(get_sidebar(self.request).context())
         return context
 
 
-class QuestionListView(SidebarMixin, ListView):
+# Сортировки списка вопросов: параметр ?sort= -> порядок для курсорной
+# пагинации (последний ключ id делает порядок однозначным)
+QUESTION_SORTS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    'views': ('-views', '-id'),
+    'trending': ('-trending_score', '-id'),
+    'visitors': ('-unique_visitors', '-id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+}
+
+# Тяжёлые колонки, которые спискам не нужны: карточки выводят Question.excerpt
+LIST_DEFERRED_FIELDS = ('content', 'answer', 'content_text', 'answer_text', 'search_vector')
+# Фрагменты в поиске строятся по content_text / answer_text, HTML не нужен
+SEARCH_DEFERRED_FIELDS = ('content', 'answer', 'search_vector')
+
+
+class QuestionListView(ConditionalGetMixin, CursorPaginationMixin, SidebarMixin, ListView):
     model = Question
     template_name = 'qa_app/question_list.html'
     context_object_name = 'questions'
     paginate_by = 12
 
+    def get_sort(self):
+        # Раньше сортировка читалась из ?schedule=, оставляем его как запасной вариант
+        sort_by = self.request.GET.get('sort') or self.request.GET.get('schedule') or '-created_at'
+        return sort_by if sort_by in QUESTION_SORTS else '-created_at'
+
+    def get_cursor_ordering(self):
+        return QUESTION_SORTS[self.get_sort()]
+
+    def get(self, request, *args, **kwargs):
+        # Ключи кэша страниц (qa_app.pagecache) — до чтения данных
+        add_surrogate_keys(request, 'questions')
+        if kwargs.get('slug'):
+            add_surrogate_keys(request, f"category:{kwargs['slug']}")
+        return super().get(request, *args, **kwargs)
+
+    def get_validators(self):
+        questions = Question.objects.filter(is_published=True)
+        keys = ['questions']
+        slug = self.kwargs.get('slug')
+        if slug:
+            questions = questions.filter(category__slug=slug)
+            keys.append(f'category:{slug}')
+        return questions.aggregate(last=Max('updated_at'))['last'], keys
+
     def get_queryset(self):
-        queryset = Question.objects.filter(is_published=True).select_related('category')
+        queryset = Question.objects.filter(is_published=True).select_related('category').defer(*LIST_DEFERRED_FIELDS)
 
         category_slug = self.kwargs.get('slug')
         if category_slug:
@@ -137,56 +149,79 @@ class QuestionListView(SidebarMixin, ListView):
 
         answered = self.request.GET.get('answered')
         if answered == 'yes':
-            queryset = queryset.exclude(answer='')
+            queryset = queryset.filter(is_answered=True)
         elif answered == 'no':
-            queryset = queryset.filter(answer='')
+            queryset = queryset.filter(is_answered=False)
 
-        sort_by = self.request.GET.get('schedule', '-created_at')
-        if sort_by in ['created_at', '-created_at', 'title', '-title', 'views']:
-            queryset = queryset.order_by(sort_by)
-
-        return queryset
+        return queryset.order_by(*self.get_cursor_ordering())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        apply_pending_views(context['questions'])
         context['current_category'] = getattr(self, 'current_category', None)
-        context['sort_by'] = self.request.GET.get('sort', '-created_at')
+        context['sort_by'] = self.get_sort()
         context['answered_filter'] = self.request.GET.get('answered', '')
         context['form'] = SearchForm()
         context['today'] = timezone.now()
         return context
 
 
-class QuestionDetailView(SidebarMixin, DetailView):
+class QuestionDetailView(ConditionalGetMixin, SidebarMixin, DetailView):
     model = Question
     template_name = 'qa_app/question_detail.html'
     context_object_name = 'question'
 
+    # Запросов к БД на страницу при прогретом кэше сайдбара (проверяется в tests.py):
+    # валидаторы (qa_app.conditional), вопрос с категорией и автором, теги, файлы
+    # вопроса, задачи с авторами, заметки задач, файлы задач, похожие вопросы.
+    # Сессия и пользователь не входят.
+    query_budget = 8
+
     def get_queryset(self):
-        return Question.objects.filter(is_published=True)
+        # Всё, что шаблон берёт у вопроса, загружается здесь одним набором запросов
+        return Question.objects.filter(is_published=True).select_related(
+            'category', 'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch('attachedfile_set', queryset=AttachedFile.objects.select_related('uploaded_by')),
+            Prefetch('task_set', queryset=Task.objects.select_related('author').prefetch_related('notes', 'attachedfile_set')),
+        )
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        question = self.get_object()
-        question.increment_views()
+    def get(self, request, *args, **kwargs):
+        add_surrogate_keys(request, f"question:{kwargs['pk']}")
+        return super().get(request, *args, **kwargs)
+
+    def get_validators(self):
+        row = Question.objects.filter(pk=self.kwargs['pk'], is_published=True).values_list(
+            'updated_at', 'category__slug'
+        ).annotate(tasks_updated=Max('task__updated_at')).order_by('updated_at').first()
+        if row is None:
+            return None
+        updated_at, category_slug, tasks_updated = row
+        keys = [f"question:{self.kwargs['pk']}"]
+        if category_slug:
+            keys.append(f'category:{category_slug}')
+        return latest(updated_at, tasks_updated), keys
 
-        similar_questions = Question.objects.filter(
-            is_published=True
-        ).exclude(id=question.id)
+    def not_modified(self, request):
+        # Страница не отрисовывается, но просмотр засчитывается
+        record_view(self.kwargs['pk'], visitor=visitor_id(request))
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        question = self.object
+        question.increment_views(visitor=visitor_id(self.request))
+        apply_pending_views([question])
         if question.category:
-            similar_questions = similar_questions.filter(category=question.category)
-
-        similar_questions = similar_questions.order_by('-created_at')[:5]
+            add_surrogate_keys(self.request, f'category:{question.category.slug}')
+        count_view_on_hit(self.request, question.pk)
 
-        context['similar_questions'] = similar_questions
+        # Заранее посчитанные похожие вопросы (qa_app.similarity)
+        context['similar_questions'] = similarity.similar_questions(question)
         context['form'] = SearchForm()
 
-        # Добавляем все прикреплённые файлы
-        context['attached_files'] = AttachedFile.objects.filter(
-            content_type__model='question',
-            object_id=question.pk
-        )
+        # Прикреплённые файлы уже загружены вместе с вопросом
+        context['attached_files'] = question.attachedfile_set.all()
 
         # Для удобства в шаблоне
         context['today'] = timezone.now()
@@ -217,12 +252,10 @@ def create_question(request):
     else:
         form = QuestionForm()
 
-    sidebar_context = get_sidebar_context()
-
     return render(request, 'qa_app/question_form.html', {
         'form': form,
         'title': 'Задать новый вопрос',
-        **sidebar_context,
+        **get_sidebar(request).context(),
     })
 
 
@@ -240,10 +273,12 @@ def search_questions(request):
     """
     Представление для поиска по вопросам и ответам.
     Поддерживает поиск по заголовкам, содержанию, тегам и ответам.
-    Сохраняет каждый запрос в модель SearchQuery для анализа популярных тем.
+    Результаты ранжируются по релевантности (см. qa_app.search).
+    Сохраняет каждый запрос в модель SearchQuery для анализа популярных тем
+    (через буфер qa_app.search_log, без INSERT на каждый запрос).
     """
     query = request.GET.get('query', '').strip()
-    search_in = request.GET.get('search_in', 'all')  # all, title, content, tags
+    search_in = request.GET.get('search_in', 'all')  # all, title, content, answer, tags, files
 
     # Словарь для передачи в шаблон
     context = {
@@ -253,70 +288,87 @@ def search_questions(request):
         'popular_searches': [],
     }
 
-    # Если есть запрос — выполняем поиск
+    # Если есть запрос — выполняем поиск по индексу (ранжирование BM25)
     if query:
-        # Формируем Q-объекты для разных полей
-        q_objects = []
-
-        if search_in == 'title':
-            q_objects.append(Q(title__icontains=query))
-        elif search_in == 'content':
-            q_objects.append(Q(content__icontains=query) | Q(answer__icontains=query))
-        elif search_in == 'tags':
-            q_objects.append(Q(tags__name__icontains=query))
-        else:  # 'all' — поиск везде
-            q_objects.append(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(answer__icontains=query) |
-                Q(tags__name__icontains=query)
-            )
-
-        # Выполняем запрос
-        questions = Question.objects.filter(
-            is_published=True
-        ).filter(*q_objects).distinct().select_related(
-            'category', 'author'
-        ).prefetch_related('tags').order_by('-created_at')
+        question_ids = cached_search_question_ids(query, search_in)
 
-        # Пагинация
-        paginator = Paginator(questions, 10)
+        # Пагинация по списку id, объекты загружаются только для текущей страницы
+        paginator = Paginator(question_ids, 10)
         page_number = request.GET.get('page')
         page_obj = paginator.get_page(page_number)
 
+        questions = Question.objects.filter(
+            pk__in=page_obj.object_list
+        ).select_related('category', 'author').prefetch_related('tags').defer(*SEARCH_DEFERRED_FIELDS).in_bulk()
+        page_obj.object_list = [questions[pk] for pk in page_obj.object_list if pk in questions]
+
+        # Фрагменты с подсветкой — для всей страницы одним вызовом
+        snippets = build_snippets(page_obj.object_list, query)
+        for question in page_obj.object_list:
+            question.snippet = snippets[question.pk]
+        apply_pending_views(page_obj.object_list)
+
+        # Id результатов уже в кэше, поэтому срез списка дешёвый и номера
+        # страниц остаются; курсоры нужны только спискам из БД
         context['page_obj'] = page_obj
+        context['is_paginated'] = page_obj.has_other_pages()
+        context['page_window'] = elided_page_range(page_obj)
+
+        # Поиск по файлам находит и задачи (файлы задач и записей по задачам)
+        if search_in == 'files':
+            task_ids = search_file_owners(query)['task'][:10]
+            tasks = Task.objects.filter(pk__in=task_ids).in_bulk()
+            context['file_tasks'] = [tasks[pk] for pk in task_ids if pk in tasks]
+
+        # Ставим поисковый запрос в очередь на запись (пишется пачками в фоне)
+        log_search(
+            query,
+            user=request.user,
+            ip_address=get_client_ip(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
 
-        # Сохраняем поисковый запрос в базу
-        try:
-            SearchQuery.objects.create(
-                term=query,
-                user=request.user if request.user.is_authenticated else None,
-                ip_address=get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-            )
-        except Exception as e:
-            # Логируем ошибку, но не прерываем выполнение
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Failed to save search query '{query}': {e}")
-
-    # Добавляем популярные поисковые запросы (последние 30 дней)
+    # Популярные поисковые запросы (последние 30 дней) — блок сайдбара
     try:
-        from django.utils import timezone
-        thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        popular_searches = SearchQuery.objects.filter(
-            created_at__gte=thirty_days_ago
-        ).values('term').annotate(
-            count=Count('term')
-        ).order_by('-count')[:10]
-
-        context['popular_searches'] = popular_searches
-    except:
+        context['popular_searches'] = get_sidebar(request).popular_searches()
+    except DatabaseError:
         pass  # Игнорируем ошибки при получении популярных запросов
 
     return render(request, 'qa_app/search_results.html', context)
 
 
+def search_suggest(request):
+    """
+    JSON-подсказки для поля поиска: заголовки вопросов и теги.
+    Допускает одну опечатку в слове (см. qa_app.suggest).
+    """
+    query = request.GET.get('q', request.GET.get('query', '')).strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', suggest.DEFAULT_LIMIT)), 1), 20)
+    except ValueError:
+        limit = suggest.DEFAULT_LIMIT
+
+    entries, took_ms = suggest.suggest(query, limit) if query else ([], 0.0)
+
+    suggestions = []
+    search_url = reverse('qa_app:search_questions')
+    for kind, object_id, text, weight in entries:
+        if kind == suggest.KIND_TAG:
+            url = f'{search_url}?{urlencode({"query": text, "search_in": "tags"})}'
+        else:
+            url = reverse('qa_app:question_detail', kwargs={'pk': object_id})
+        suggestions.append({'type': kind, 'id': object_id, 'text': text, 'url': url})
+
+    data = {
+        'query': query,
+        'suggestions': suggestions,
+        'took_ms': round(took_ms, 3),
+    }
+    if request.user.is_staff and request.GET.get('stats'):
+        data['stats'] = suggest.get_index().stats()
+    return JsonResponse(data)
+
+
 def get_client_ip(request):
     """
     Получает реальный IP-адрес клиента из HTTP-заголовков.
@@ -484,44 +536,10 @@ def delete_file(request, file_id):
 
 
 def home(request):
-    recent_questions = Question.objects.filter(is_published=True) \
-        .select_related('author', 'category') \
-        .prefetch_related('tags')[:6]
-
-    answered_questions = Question.objects.filter(
-        is_published=True,
-        answer__isnull=False
-    ).exclude(answer__exact='') \
-        .order_by('-views')[:6]
-
-    categories = Category.objects.annotate(
-        question_count=models.Count('question', filter=models.Q(question__is_published=True))
-    ).order_by('name')
-
-    total_questions = Question.objects.filter(is_published=True).count()
-    answered_count = answered_questions.count()
-
-    # Добавляем актуальную статистику по задачам
-    total_tasks = Task.objects.count()
-    recent_tasks = Task.objects.select_related('author').order_by('-created_at')[:5]
-
-    context = {
-        'recent_questions': recent_questions,
-        'answered_questions': answered_questions,
-        'categories': categories,
-        'question_count': total_questions,
-        'answered_count': answered_count,
-        'popular_tags': Tag.objects.all()[:10],
-
-        # Передаём данные для сайдбара
-        'sidebar_total_tasks': total_tasks,
-        'sidebar_recent_tasks': recent_tasks,
-        'sidebar_question_count': total_questions,
-        'sidebar_answered_count': answered_count,
-        'sidebar_unanswered_count': total_questions - answered_count,
-        'sidebar_categories': categories,
-        'sidebar_popular_tags': Tag.objects.all()[:10],
-    }
+    add_surrogate_keys(request, 'questions', 'tasks')
+    # Все блоки главной — один снимок из кэша (qa_app.homepage); просмотры
+    # в нём обновляются вместе со снимком, не чаще раза в SNAPSHOT_TIMEOUT
+    context = homepage.get_snapshot()
 
     return render(request, 'qa_app/home.html', context)
 
@@ -530,35 +548,69 @@ def home(request):
 # ЗАДАЧИ (Task)
 # ----------------------------
 
-class TaskListView(SidebarMixin, ListView):
+class TaskListView(ConditionalGetMixin, CursorPaginationMixin, SidebarMixin, ListView):
     model = Task
     template_name = 'qa_app/task_list.html'
     context_object_name = 'tasks'
     paginate_by = 10
 
+    def get_validators(self):
+        return Task.objects.aggregate(last=Max('updated_at'))['last'], ['tasks']
+
     def get_queryset(self):
-        return Task.objects.select_related('author', 'question').all().order_by('-created_at')
+        # Всё, что выводит карточка задачи, — в одном запросе: число записей
+        # и файлов, последняя активность и заголовок вопроса считаются
+        # коррелированными подзапросами только для строк текущей страницы
+        notes = TaskNote.objects.filter(task=OuterRef('pk')).order_by().values('task')
+        files = AttachedFile.objects.filter(
+            content_type=ContentType.objects.get_for_model(Task), object_id=OuterRef('pk')
+        ).order_by().values('object_id')
+        return Task.objects.select_related('author').annotate(
+            notes_count=Coalesce(Subquery(notes.annotate(n=Count('pk')).values('n')), 0),
+            files_count=Coalesce(Subquery(files.annotate(n=Count('pk')).values('n')), 0),
+            last_activity=Greatest('updated_at', Coalesce(Subquery(notes.annotate(last=Max('updated_at')).values('last')), 'updated_at')),
+            question_title=F('question__title'),
+        ).order_by('-created_at')
+
+    def get_stats(self):
+        """Всего задач и за последние 7 дней — один агрегатный запрос, кэш до изменения задач."""
+        # Граница недели округлена до часа, чтобы значение кэшировалось
+        last_week = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=7)
+        return get_or_compute(
+            f'qa:tasks:stats:{last_week:%Y%m%d%H}',
+            lambda: Task.objects.aggregate(total=Count('pk'), recent=Count('pk', filter=Q(created_at__gte=last_week))),
+            60 * 5,
+            version=get_version(key_namespace('tasks')),
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        # Добавляем статистику по задачам
-        total_tasks = self.get_queryset().count()
-        last_week = timezone.now() - timedelta(days=7)
-        recent_count = self.get_queryset().filter(created_at__gte=last_week).count()
-
+        stats = self.get_stats()
         context.update({
-            'total_tasks': total_tasks,
-            'recent_count': recent_count,
+            'total_tasks': stats['total'],
+            'recent_count': stats['recent'],
         })
         return context
 
 
-class TaskDetailView(SidebarMixin, DetailView):
+class TaskDetailView(ConditionalGetMixin, SidebarMixin, DetailView):
     model = Task
     template_name = 'qa_app/task_detail.html'
     context_object_name = 'task'
 
+    def get_validators(self):
+        row = Task.objects.filter(pk=self.kwargs['pk']).values_list(
+            'updated_at', 'question_id'
+        ).annotate(notes_updated=Max('notes__updated_at')).order_by('updated_at').first()
+        if row is None:
+            return None
+        updated_at, question_id, notes_updated = row
+        # Удаление записей и файлы учитывает версия ключа task:<id> (signals.py)
+        keys = [f"task:{self.kwargs['pk']}"]
+        if question_id:
+            keys.append(f'question:{question_id}')
+        return latest(updated_at, notes_updated), keys
+
 
 class TaskCreateView(SidebarMixin, CreateView):
     model = Task
@@ -0,0 +1,169 @@
+"""
+Уникальные посетители вопросов (HyperLogLog).
+
+Каждый просмотр добавляет идентификатор посетителя в скетч процесса
+для пары (вопрос, день); буфер просмотров (qa_app.view_counter) при сбросе
+сливает их со скетчами в таблице QuestionVisitorsDaily. Скетч занимает
+4 КБ независимо от числа посетителей, а слияние — поэлементный максимум,
+поэтому скетчи разных процессов и повторные сбросы ничего не искажают.
+
+Сброс только сливает дневные скетчи. Question.unique_visitors — оценку
+объединения скетчей за последние QA_VISITORS_WINDOW_DAYS дней, по которой
+работает сортировка "Больше посетителей", — пересчитывает пачками команда
+`manage.py update_unique_visitors` (cron); в таблицу вопросов попадают
+только изменившиеся оценки.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .hll import HyperLogLog, merged
+from .pagecache import purge_on_commit
+
+
+BOT_RE = re.compile(r'bot|crawl|spider|slurp|preview|monitor|curl|wget|python-requests', re.IGNORECASE)
+
+
+def window_days():
+    return getattr(settings, 'QA_VISITORS_WINDOW_DAYS', 30)
+
+
+def visitor_id(request):
+    """
+    Идентификатор посетителя: пользователь или хеш IP + User-Agent.
+    Для ботов — None (их визиты не учитываются).
+    """
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    if BOT_RE.search(user_agent):
+        return None
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR', '')
+    return 'anon:' + hashlib.md5(f'{ip}|{user_agent}'.encode('utf-8')).hexdigest()
+
+
+# ----------------------------
+# Запись
+# ----------------------------
+
+def store_sketches(sketches):
+    """
+    Сливает скетчи процесса {(question_id, date): HyperLogLog} с сохранёнными.
+    Возвращает число записанных скетчей.
+    """
+    from .models import Question, QuestionVisitorsDaily
+
+    # Вопросы могли удалить, пока скетчи копились в процессе
+    existing = set(
+        Question.objects.filter(pk__in={question_id for question_id, _ in sketches}).values_list('pk', flat=True)
+    )
+    sketches = {key: sketch for key, sketch in sketches.items() if key[0] in existing}
+
+    with transaction.atomic():
+        for (question_id, date), sketch in sketches.items():
+            if _merge_into_stored(question_id, date, sketch):
+                continue
+            try:
+                with transaction.atomic():
+                    QuestionVisitorsDaily.objects.create(question_id=question_id, date=date, sketch=sketch.to_bytes())
+            except IntegrityError:
+                # Строку успел создать другой процесс
+                _merge_into_stored(question_id, date, sketch)
+    return len(sketches)
+
+
+def _merge_into_stored(question_id, date, sketch):
+    from .models import QuestionVisitorsDaily
+
+    row = QuestionVisitorsDaily.objects.select_for_update().filter(question_id=question_id, date=date).first()
+    if row is None:
+        return False
+    stored = HyperLogLog.from_bytes(row.sketch)
+    row.sketch = stored.merge(sketch).to_bytes()
+    row.save(update_fields=['sketch'])
+    return True
+
+
+# ----------------------------
+# Оценки
+# ----------------------------
+
+def unique_visitors(question_id, days=None):
+    """Оценка уникальных посетителей вопроса за последние days дней (по умолчанию — окно)."""
+    from .models import QuestionVisitorsDaily
+
+    since = timezone.localdate() - timedelta(days=(days or window_days()) - 1)
+    sketches = QuestionVisitorsDaily.objects.filter(
+        question_id=question_id, date__gte=since
+    ).values_list('sketch', flat=True)
+    return merged(sketches).count()
+
+
+def unique_visitors_many(question_ids, days=None):
+    """{question_id: оценка за последние days дней} для нескольких вопросов одним запросом."""
+    from .models import QuestionVisitorsDaily
+
+    since = timezone.localdate() - timedelta(days=(days or window_days()) - 1)
+    sketches = defaultdict(list)
+    rows = QuestionVisitorsDaily.objects.filter(
+        question_id__in=question_ids, date__gte=since
+    ).values_list('question_id', 'sketch')
+    for question_id, sketch in rows.iterator():
+        sketches[question_id].append(sketch)
+    return {question_id: merged(sketches[question_id]).count() for question_id in question_ids}
+
+
+def update_unique_visitors(batch_size=500):
+    """
+    Пересчитывает Question.unique_visitors по скетчам окна пачками по batch_size
+    вопросов и записывает только изменившиеся оценки. Возвращает их число.
+    """
+    from .models import Question, QuestionVisitorsDaily
+
+    since = timezone.localdate() - timedelta(days=window_days() - 1)
+    # Ненулевая оценка нужна только вопросам со скетчами в окне; остальные обнуляются
+    current = dict(Question.objects.filter(unique_visitors__gt=0).values_list('pk', 'unique_visitors'))
+    visited = set(
+        QuestionVisitorsDaily.objects.filter(date__gte=since).values_list('question_id', flat=True).distinct()
+    )
+    question_ids = sorted(current.keys() | visited)
+
+    updated = 0
+    for start in range(0, len(question_ids), batch_size):
+        estimates = unique_visitors_many(question_ids[start:start + batch_size])
+        changed = [
+            Question(pk=question_id, unique_visitors=estimate)
+            for question_id, estimate in estimates.items()
+            if estimate != current.get(question_id, 0)
+        ]
+        Question.objects.bulk_update(changed, ['unique_visitors'], batch_size=batch_size)
+        updated += len(changed)
+    if updated:
+        # Порядок "Больше посетителей" в списках изменился
+        purge_on_commit('questions')
+    return updated
+
+
+def daily_unique_visitors(question_id, days=7):
+    """[(дата, оценка за день)] за последние days дней, новые первыми."""
+    from .models import QuestionVisitorsDaily
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = QuestionVisitorsDaily.objects.filter(question_id=question_id, date__gte=since).order_by('-date')
+    return [(row.date, HyperLogLog.from_bytes(row.sketch).count()) for row in rows]
+
+
+def prune(keep_days):
+    """Удаляет скетчи старше keep_days дней; возвращает число удалённых строк."""
+    from .models import QuestionVisitorsDaily
+
+    since = timezone.localdate() - timedelta(days=keep_days)
+    deleted, _ = QuestionVisitorsDaily.objects.filter(date__lt=since).delete()
+    return deleted
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_ckeditor_5',
 
     # Local apps
@@ -33,6 +34,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'qa_app.middleware.PageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -68,6 +70,22 @@ DATABASES = {
     }
 }
 
+# Кэш: при заданном REDIS_URL — общий для всех воркеров (версии содержимого,
+# результаты поиска), иначе локальный кэш процесса
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -90,6 +108,70 @@ TIME_ZONE = 'Europe/Moscow'
 USE_I18N = True
 USE_TZ = True
 
+# Поиск: 'memory' — индекс в памяти процесса (BM25),
+# 'postgres' — полнотекстовый поиск PostgreSQL (tsvector + GIN)
+QA_SEARCH_BACKEND = os.getenv('QA_SEARCH_BACKEND', 'memory')
+QA_SEARCH_CONFIG = 'russian'
+
+# Число потоков для извлечения текста из загруженных файлов (qa_app.extraction)
+QA_EXTRACTION_WORKERS = 2
+
+# Буферизованная запись поисковых запросов (qa_app.search_log)
+QA_SEARCH_LOG = {
+    'BATCH_SIZE': 100,  # сброс в БД каждые N записей...
+    'FLUSH_INTERVAL': 5.0,  # ...или каждые T секунд
+    'CAPACITY': 10000,  # размер кольцевого буфера процесса
+    'SPOOL_PATH': os.getenv('QA_SEARCH_LOG_SPOOL', BASE_DIR / 'var' / 'search_queries.spool'),
+}
+
+# Буферизованный счётчик просмотров (qa_app.view_counter): просмотры
+# копятся в процессе и пишутся в БД пачкой раз в FLUSH_INTERVAL секунд
+QA_VIEW_COUNTER = {
+    'FLUSH_INTERVAL': 10.0,
+}
+
+# За сколько последних дней считать уникальных посетителей вопроса
+# (Question.unique_visitors, скетчи HyperLogLog — qa_app.visitors);
+# пересчёт — update_unique_visitors (cron)
+QA_VISITORS_WINDOW_DAYS = 30
+
+# Популярность "сейчас" (qa_app.trending): просмотры за WINDOW_DAYS дней,
+# вес которых падает вдвое каждые HALF_LIFE_DAYS; пересчёт — update_trending
+QA_TRENDING = {
+    'HALF_LIFE_DAYS': 3,
+    'WINDOW_DAYS': 14,
+    'BATCH_SIZE': 500,
+}
+
+# Похожие вопросы (qa_app.similarity): сколько соседей хранить на вопрос,
+# минимальное сходство и размер пачки при расчёте сигнатур. Изменённые
+# вопросы копятся в очереди; пересчёт — refresh_similar (cron)
+QA_SIMILAR = {
+    'TOP_K': 10,
+    'MIN_SCORE': 0.05,
+    'BATCH_SIZE': 200,
+}
+
+# Кэш страниц для анонимных посетителей (qa_app.pagecache): страницы
+# сбрасываются сигналами по суррогатным ключам, TIMEOUT — верхняя граница
+QA_PAGE_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 60 * 5,
+}
+
+# Пагинация списков вопросов и задач: 'cursor' — по ключу сортировки
+# (без OFFSET и COUNT), 'offset' — обычные номера страниц (qa_app.pagination)
+QA_PAGINATION_MODE = 'cursor'
+
+# Число строк в списках (qa_app.counting): точно до EXACT_THRESHOLD, дальше —
+# оценка планировщика PostgreSQL ('estimate') или COUNT из кэша ('cached'),
+# который пересчитывается в фоне раз в CACHE_TIMEOUT секунд
+QA_COUNTS = {
+    'EXACT_THRESHOLD': 1000,
+    'STRATEGY': 'estimate',
+    'CACHE_TIMEOUT': 60 * 5,
+}
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -0,0 +1,93 @@
+// Подсказки для полей поиска (input[data-suggest-url])
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-suggest-url]').forEach(function(input) {
+        const url = input.dataset.suggestUrl;
+        const form = input.closest('form');
+        const menu = document.createElement('div');
+        menu.className = 'dropdown-menu search-suggest-menu';
+        menu.style.cssText = 'position: absolute; z-index: 1060; max-width: 480px;';
+        document.body.appendChild(menu);
+
+        let timer = null;
+        let controller = null;
+        let active = -1;
+
+        function hide() {
+            menu.classList.remove('show');
+            active = -1;
+        }
+
+        function place() {
+            const rect = input.getBoundingClientRect();
+            menu.style.left = (rect.left + window.scrollX) + 'px';
+            menu.style.top = (rect.bottom + window.scrollY + 2) + 'px';
+            menu.style.minWidth = rect.width + 'px';
+        }
+
+        function render(suggestions) {
+            menu.innerHTML = '';
+            if (!suggestions.length) {
+                hide();
+                return;
+            }
+            suggestions.forEach(function(item) {
+                const link = document.createElement('a');
+                link.className = 'dropdown-item text-truncate';
+                link.href = item.url;
+                const icon = document.createElement('i');
+                icon.className = item.type === 'tag' ? 'fas fa-tag me-2 text-muted' : 'fas fa-question-circle me-2 text-muted';
+                link.appendChild(icon);
+                link.appendChild(document.createTextNode(item.text));
+                menu.appendChild(link);
+            });
+            place();
+            menu.classList.add('show');
+        }
+
+        function load() {
+            const query = input.value.trim();
+            if (query.length < 2) {
+                hide();
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(url + '?q=' + encodeURIComponent(query), {signal: controller.signal})
+                .then(response => response.json())
+                .then(data => render(data.suggestions || []))
+                .catch(() => {});
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(load, 120);
+        });
+
+        input.addEventListener('keydown', function(e) {
+            const items = menu.querySelectorAll('.dropdown-item');
+            if (!menu.classList.contains('show') || !items.length) {
+                return;
+            }
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault();
+                active = (active + (e.key === 'ArrowDown' ? 1 : -1) + items.length) % items.length;
+                items.forEach((item, i) => item.classList.toggle('active', i === active));
+            } else if (e.key === 'Enter' && active >= 0) {
+                e.preventDefault();
+                window.location.href = items[active].href;
+            } else if (e.key === 'Escape') {
+                hide();
+            }
+        });
+
+        input.addEventListener('blur', function() {
+            setTimeout(hide, 150);
+        });
+
+        if (form) {
+            form.addEventListener('submit', hide);
+        }
+    });
+});